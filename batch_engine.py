@@ -0,0 +1,245 @@
+"""Many games at once as stacked numpy arrays, one shot per game per step.
+Needs numpy.
+Classes: BatchGames
+Functions: random_policy
+           observation_view
+           observations
+           check_against_board
+
+Dot (x, y) has number x * size + y, like in placement. Rules are the rules of Board.shoot:
+shoot in the contour is a miss, shoot in the miss or in the hit dot is already shot,
+when all decks of the ship are hit, it's killed and gets contour.
+Observations of boards (Board.observation) are seen here as uint8 arrays without copies.
+
+Usage: python batch_engine.py --games 100000
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from battleship import (SEEN_CONTOUR, SEEN_HIT, SEEN_KILLED, SEEN_MISS, SEEN_UNKNOWN, Board, Dot, DotNames, Ship,
+                        ShotResult)
+from placement import PlacementIndex
+
+SHOT_MISS = 0
+SHOT_HIT = 1
+SHOT_KILL = 2
+SHOT_ALREADY = 3
+SHOT_CODES = {ShotResult.miss: SHOT_MISS, ShotResult.hit: SHOT_HIT,
+              ShotResult.kill: SHOT_KILL, ShotResult.already: SHOT_ALREADY}
+
+
+class BatchGames:
+    """
+    K boards with fleets of the placement index:
+    ship_id (K, dots) is the number of the ship in the dot or -1, hit and miss (K, dots) are shot dots,
+    contour (K, dots) is the contour of killed ships, lives (K, ships) are alive decks of every ship
+    """
+
+    def __init__(self, fleets, index=None):
+        """Create boards from array (K, ships) with numbers of positions of ships (rows of index.fleets())"""
+
+        self.index = index or PlacementIndex.get()
+        dots = self.index.size * self.index.size
+        fleets = np.asarray(fleets)
+        self.games = len(fleets)
+        self.rows = np.arange(self.games)
+
+        self.ship_id = np.full((self.games, dots), -1, dtype=np.int8)
+        self.ship_contour = np.zeros((self.games, len(self.index.fleet), dots), dtype=bool)
+        for ship, length in enumerate(self.index.fleet):
+            cells = np.array(self.index.dots[length])[fleets[:, ship]]
+            self.ship_id[self.rows[:, None], cells] = ship
+            self.ship_contour[:, ship] = self.contour_table(length)[fleets[:, ship]]
+
+        self.hit = np.zeros((self.games, dots), dtype=bool)
+        self.miss = np.zeros((self.games, dots), dtype=bool)
+        self.contour = np.zeros((self.games, dots), dtype=bool)
+        self.lives = np.tile(np.array(self.index.fleet, dtype=np.int8), (self.games, 1))
+        self.remaining = np.full(self.games, sum(self.index.fleet), dtype=np.int16)
+        self.shots = np.zeros(self.games, dtype=np.int16)
+
+    @classmethod
+    def random(cls, games: int, rng=None, index=None):
+        """Create boards with random legal fleets"""
+
+        index = index or PlacementIndex.get()
+        rng = rng or np.random.default_rng()
+        table = index.fleets()
+        table = np.frombuffer(table, dtype=np.dtype(table.typecode)).reshape(-1, len(index.fleet))
+        return cls(table[rng.integers(0, len(table), games)], index)
+
+    def contour_table(self, length: int):
+        """Array (positions, dots): contour of every position of the ship with given length"""
+
+        dots = self.index.size * self.index.size
+        return np.array([[exclusion >> number & 1 and not mask >> number & 1 for number in range(dots)]
+                         for mask, exclusion in zip(self.index.masks(length), self.index.exclusions(length))],
+                        dtype=bool)
+
+    def shoot(self, dots, games=None):
+        """
+        Shoot in one dot in every given game (all games by default),
+        return array with SHOT_MISS, SHOT_HIT, SHOT_KILL or SHOT_ALREADY for every shot
+        """
+
+        games = self.rows if games is None else np.asarray(games)
+        dots = np.asarray(dots)
+        ship = self.ship_id[games, dots]
+        on_ship = ship >= 0
+        already = self.hit[games, dots] | self.miss[games, dots]
+        result = np.where(already, SHOT_ALREADY, np.where(on_ship, SHOT_HIT, SHOT_MISS)).astype(np.int8)
+
+        missed = ~on_ship & ~already
+        self.miss[games[missed], dots[missed]] = True
+        self.contour[games[missed], dots[missed]] = False
+
+        hit = on_ship & ~already
+        hit_games, hit_dots, hit_ships = games[hit], dots[hit], ship[hit]
+        self.hit[hit_games, hit_dots] = True
+        self.lives[hit_games, hit_ships] -= 1
+        self.remaining[hit_games] -= 1
+
+        killed = self.lives[hit_games, hit_ships] == 0
+        killed_games, killed_ships = hit_games[killed], hit_ships[killed]
+        self.contour[killed_games] |= self.ship_contour[killed_games, killed_ships] & ~self.miss[killed_games]
+        result[np.flatnonzero(hit)[killed]] = SHOT_KILL
+
+        self.shots[games[~already]] += 1
+        return result
+
+    def available(self):
+        """Array (K, dots): dots which weren't shot and aren't contour"""
+
+        return ~(self.hit | self.miss | self.contour)
+
+    def observation(self):
+        """Array (K, dots) of SEEN_ codes, the same as observation grids of boards"""
+
+        killed = np.take_along_axis(self.lives, np.maximum(self.ship_id, 0).astype(np.intp), axis=1) == 0
+        seen = np.full(self.hit.shape, SEEN_UNKNOWN, dtype=np.uint8)
+        seen[self.contour] = SEEN_CONTOUR
+        seen[self.miss] = SEEN_MISS
+        seen[self.hit] = SEEN_HIT
+        seen[self.hit & killed] = SEEN_KILLED
+        return seen
+
+    def finished(self):
+        """Array (K,): all ships of the game are killed"""
+
+        return self.remaining == 0
+
+    def cell_states(self, game: int):
+        """Return list of DotNames of all dots of the game, like Board.cell_state"""
+
+        states = []
+        for number, ship in enumerate(self.ship_id[game]):
+            if ship >= 0:
+                if self.lives[game, ship] == 0:
+                    states.append(DotNames.killed)
+                elif self.hit[game, number]:
+                    states.append(DotNames.burn)
+                else:
+                    states.append(DotNames.ship)
+            elif self.miss[game, number]:
+                states.append(DotNames.miss)
+            elif self.contour[game, number]:
+                states.append(DotNames.contour)
+            else:
+                states.append(DotNames.empty)
+        return states
+
+    def play(self, policy, rng=None):
+        """Shoot by policy(batch, games, rng) -> dots until all fleets are killed, return shots of every game"""
+
+        rng = rng or np.random.default_rng()
+        games = np.flatnonzero(~self.finished())
+        while len(games):
+            self.shoot(policy(self, games, rng), games)
+            games = games[self.remaining[games] > 0]
+        return self.shots
+
+
+def random_policy(batch: BatchGames, games, rng):
+    """Random dot which wasn't shot and isn't contour, like PlayerComputer without hunting"""
+
+    scores = rng.random((len(games), batch.hit.shape[1]))
+    scores[~batch.available()[games]] = -1
+    return scores.argmax(axis=1)
+
+
+def observation_view(board: Board):
+    """Array (size, size) which is the observation grid of the board itself, not a copy"""
+
+    return np.frombuffer(board.observation, dtype=np.uint8).reshape(board.rules.size, board.rules.size)
+
+
+def observations(boards):
+    """
+    Array (K, size, size) of observation grids of K boards: grids are moved into the array
+    (Board.share_observation), so it changes with every shot and a batch AI reads all of them at once
+    """
+
+    size = boards[0].rules.size
+    grids = np.zeros((len(boards), size, size), dtype=np.uint8)
+    for board, grid in zip(boards, grids):
+        board.share_observation(grid)
+    return grids
+
+
+def check_against_board(games=300, shots=60, seed=0):
+    """
+    Play the same random shots on BatchGames and on Board objects with the same fleets,
+    raise AssertionError if any result or any dot differs
+    """
+
+    index = PlacementIndex.get()
+    rng = np.random.default_rng(seed)
+    batch = BatchGames.random(games, rng, index)
+    boards = []
+    for game in range(games):
+        board = Board(hidden=False)
+        for ship in range(len(index.fleet)):
+            cells = sorted(int(number) for number in np.flatnonzero(batch.ship_id[game] == ship))
+            begin, end = divmod(cells[0], index.size), divmod(cells[-1], index.size)
+            board.add_ship(Ship(Dot(*begin), Dot(*end)))
+        board.delete_contour()
+        boards.append(board)
+    grids = observations(boards).reshape(games, -1)
+
+    for _ in range(shots):
+        dots = rng.integers(0, index.size * index.size, games)
+        results = batch.shoot(dots)
+        for game, board in enumerate(boards):
+            x, y = divmod(int(dots[game]), index.size)
+            expected = SHOT_CODES[board.fire(Dot(x, y))[0]]
+            assert results[game] == expected, (game, x, y, results[game], expected)
+            assert batch.cell_states(game) == [board.cell_state(*divmod(number, index.size))
+                                               for number in range(index.size * index.size)], (game, x, y)
+        assert (grids == batch.observation()).all()
+    return games * shots
+
+
+def main():
+    """Check the rules against Board and measure games per minute of random policy"""
+
+    parser = argparse.ArgumentParser(description="Numpy engine for many games at once")
+    parser.add_argument("--games", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"rules match Board on {check_against_board(seed=args.seed)} shots")
+
+    rng = np.random.default_rng(args.seed)
+    start = time.perf_counter()
+    batch = BatchGames.random(args.games, rng)
+    shots = batch.play(random_policy, rng)
+    seconds = time.perf_counter() - start
+    print(f"{args.games} fleets sunk by random policy in {seconds:.2f} s, "
+          f"{args.games / seconds * 60:.0f} games per minute, mean shots {shots.mean():.2f}")
+
+
+if __name__ == '__main__':
+    main()
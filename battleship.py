@@ -1,17 +1,30 @@
 """Play the Battleship with your computer!
 Classes: DotNames(enum.Enum)
+         ShotResult(enum.Enum)
+         Rules
          Dot
+         CellDot(Dot)
          Ship
          Board
+         BitBoard(Board)
+         BoardRenderer
          Player
          PlayerHuman(Player)
          PlayerComputer(Player)
          Game
+
+Game and players show and ask everything through the transport (see transport.py),
+the console transport is the default one. With --record games are appended to the file of records (see records.py).
 """
 
+import argparse
 import enum
 import random
-from time import sleep
+import sys
+
+from metrics import METRICS, write_metrics
+from placement import PlacementIndex
+from transport import ConsoleTransport
 
 RULES = ["Hello! It's the Battleship! Glad to see you!\n"
          "Add your ships: one three-decker ship, two two-decker ships and four one-decker ship.\n"
@@ -61,8 +74,25 @@ class YouHitTheTarget(ActionWasNotDone):
 
 
 def main():
-    game = Game()
-    game.start()
+    parser = argparse.ArgumentParser(description="Play the Battleship with your computer")
+    parser.add_argument("--ansi", action="store_true", help="keep boards in place on the screen")
+    parser.add_argument("--metrics", default=None, help="write metrics of the engine to this file (.json or .prom)")
+    parser.add_argument("--record", default=None, help="append records of games to this file")
+    args = parser.parse_args()
+    if args.metrics:
+        METRICS.enable()
+    writer = None
+    if args.record:
+        from records import RecordWriter    # records uses this module
+        writer = RecordWriter(args.record)
+    try:
+        game = Game(transport=ConsoleTransport(ansi=args.ansi), records=writer)
+        game.start()
+    finally:
+        if writer is not None:
+            writer.close()
+        if args.metrics:
+            write_metrics(args.metrics)
 
 
 class DotNames(enum.Enum):
@@ -76,9 +106,140 @@ class DotNames(enum.Enum):
     miss = "M"
 
 
+class ShotResult(enum.Enum):
+    """What the shot did, Board.fire returns it with the ship which was hit or killed"""
+
+    miss = "miss"
+    hit = "hit"
+    kill = "kill"
+    already = "already"
+
+
+MISS = (ShotResult.miss, None)          # shots without the ship don't make new tuples
+ALREADY = (ShotResult.already, None)
+
+# codes of dots in the observation grid of the board, what the opponent sees:
+# ships which aren't hit are unknown like empty dots, SEEN_STATES are states to show for codes
+SEEN_UNKNOWN, SEEN_MISS, SEEN_HIT, SEEN_KILLED, SEEN_CONTOUR = range(5)
+SEEN_STATES = (DotNames.empty, DotNames.miss, DotNames.burn, DotNames.killed, DotNames.contour)
+
+
+class Rules:
+    """
+    Size of the board and lengths of ships in the fleet; every class reads them from here.
+    Lines of the board are named A, B, ..., Z, AA, AB, ..., columns are numbered from 1
+    """
+
+    numbers = ["zero", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten"]
+
+    def __init__(self, size=6, fleet=(3, 2, 2, 1, 1, 1, 1)):
+        """Check and remember the rules"""
+
+        if size < 1 or not fleet or min(fleet) < 1 or max(fleet) > size:
+            raise ValueError("Ships must be not longer than the board")
+        self.size = size
+        self.fleet = tuple(sorted(fleet, reverse=True))
+        self.fleet_counts = {length: self.fleet.count(length) for length in self.fleet}
+        self.ships_amount = len(self.fleet)
+        self.max_length = self.fleet[0]
+        self.line_names = [Rules.line_name(number) for number in range(size)]
+        # texts of the printed board are made once: names of lines and columns can be longer
+        # than one letter on big boards, so all of them are padded to the same width
+        width = len(str(size))
+        self.line_labels = [name.ljust(len(self.line_names[-1])) for name in self.line_names]
+        self.column_labels = [" " * len(self.line_labels[0])] + [str(number).ljust(width)
+                                                                  for number in range(1, size + 1)]
+        self.cell_texts = {state: state.value.ljust(width) for state in DotNames}
+        self.seen_texts = tuple(self.cell_texts[state] for state in SEEN_STATES)
+
+    def __eq__(self, other):
+        """Equal rules have equal board and fleet"""
+
+        return isinstance(other, Rules) and (self.size, self.fleet) == (other.size, other.fleet)
+
+    def __hash__(self):
+
+        return hash((self.size, self.fleet))
+
+    def __repr__(self):
+
+        return f"Rules(size={self.size}, fleet={self.fleet})"
+
+    @staticmethod
+    def line_name(number: int):
+        """Name of the line: A, B, ..., Z, AA, AB, ..."""
+
+        name = ""
+        number += 1
+        while number:
+            number, letter = divmod(number - 1, 26)
+            name = chr(65 + letter) + name  # because ord("A") is 65
+        return name
+
+    @staticmethod
+    def line_number(name: str):
+        """Number of the line with given name, the line can be out of board"""
+
+        number = 0
+        for letter in name:
+            number = number * 26 + ord(letter) - 64
+        return number - 1
+
+    def parse_dots(self, text: str):
+        """
+        Return list of dots from cleaned text like 'A1', 'B10C10', 'AA3';
+        raise InputRecognitionError if it isn't one or two dots
+        """
+
+        dots = []
+        position = 0
+        while position < len(text) and len(dots) < 2:
+            letters = position
+            while position < len(text) and text[position].isalpha():
+                position += 1
+            digits = position
+            while position < len(text) and text[position].isdigit():
+                position += 1
+            if letters == digits or digits == position:
+                break
+            dots.append(Dot(Rules.line_number(text[letters:digits]), int(text[digits:position]) - 1))
+        if not dots or position != len(text):
+            raise InputRecognitionError("Sorry, I don't understand")
+        return dots
+
+    def describe_fleet(self):
+        """Fleet in words, like 'one three-decker ship and two one-decker ships'"""
+
+        parts = []
+        for length in sorted(self.fleet_counts, reverse=True):
+            amount = self.fleet_counts[length]
+            parts.append(f"{self.number_name(amount)} {self.number_name(length)}-decker ship"
+                         + ("s" if amount > 1 else ""))
+        return parts[0] if len(parts) == 1 else ", ".join(parts[:-1]) + " and " + parts[-1]
+
+    def number_name(self, number: int):
+        """Number in words up to ten"""
+
+        return self.numbers[number] if number < len(self.numbers) else str(number)
+
+    def text(self):
+        """RULES for this board and fleet"""
+
+        if self == DEFAULT_RULES:
+            return RULES
+        return [RULES[0].replace("one three-decker ship, two two-decker ships and four one-decker ship",
+                                 self.describe_fleet()),
+                RULES[1]]
+
+
+DEFAULT_RULES = Rules()
+
+
 class Dot:
     """Class of dot's coordinates and state"""
 
+    __slots__ = ("x", "y", "state")
+
     def __init__(self, x: int, y: int, state=DotNames.empty):
         """Init the dot"""
         self.x = x
@@ -100,6 +261,42 @@ class Dot:
         return Dot(self.x, self.y, self.state)
 
 
+class CellDot(Dot):
+    """
+    Immutable dot of the board's cell. There is one object for every coordinates and state,
+    all boards share them, so the board only puts other dot in the cell when the state changes
+    """
+
+    __slots__ = ()
+    _interned = {}      # (x, y, state) -> the dot
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Dot of the cell can't be changed, put other dot in the cell")
+
+    def __reduce__(self):
+        """Copies and pickles of the dot are made by get, so they are the same shared dot"""
+
+        return CellDot.get, (self.x, self.y, self.state)
+
+    @classmethod
+    def get(cls, x: int, y: int, state=DotNames.empty):
+        """Return the dot with given coordinates and state"""
+
+        key = (x, y, state)
+        dot = cls._interned.get(key)
+        if dot is None:
+            dot = object.__new__(cls)
+            for name, value in zip(Dot.__slots__, key):
+                object.__setattr__(dot, name, value)
+            cls._interned[key] = dot
+        return dot
+
+    def copy(self):
+        """Copy the dot, the copy can be changed"""
+
+        return Dot(self.x, self.y, self.state)
+
+
 class Ship:
     """
     Class create ship, check the correctness of ship,
@@ -107,69 +304,98 @@ class Ship:
     ship's lives is quantity of alive decks
     """
 
-    def __init__(self, begin: Dot, end=None):
+    __slots__ = ("rules", "begin", "end", "length", "lives", "all_dots")
+
+    def __init__(self, begin: Dot, end=None, rules=DEFAULT_RULES):
         """Create new ship with begin and end if ship is correct"""
 
+        self.rules = rules
         self.begin = begin
         if end is None:
             self.end = begin
         else:
             self.end = end
+        self.length = max(abs(self.begin.x - self.end.x), abs(self.begin.y - self.end.y)) + 1
 
         try:
             self.check_correct_ship()
         except IncorrectShip as error:
-            print(error)
-            raise ActionWasNotDone("Please try again")
+            raise ActionWasNotDone(f"{error}\nPlease try again")
 
-        self.lives = self.__len__()
+        self.lives = self.length
         self.all_dots = []
         self.find_all_dots()
 
     def check_correct_ship(self):
-        """Ship must be located on one line and not longer 3"""
+        """Ship must be located on one line and not longer the longest ship of the rules"""
 
         if not ((self.begin.x == self.end.x
                 or self.begin.y == self.end.y)
-                and len(self) <= 3):
+                and self.length <= self.rules.max_length):
             raise IncorrectShip("This ship is incorrect")
 
     def __len__(self):
         """Return ship's length"""
 
-        return max(abs(self.begin.x - self.end.x), abs(self.begin.y - self.end.y)) + 1
+        return self.length
 
     def find_all_dots(self):
         """Create list with all ship's dots, make them ship state"""
 
-        if len(self) == 1:
+        if self.length == 1:
             self.all_dots = [self.begin]
-        elif len(self) == 2:
-            self.all_dots = [self.begin, self.end]
         else:
-            self.all_dots = [
-                self.begin,
-                # find middle dot:
-                Dot(x=(self.begin.x + self.end.x) // 2, y=(self.begin.y + self.end.y) // 2),
-                self.end]
+            # find middle dots, going from the beginning to the end:
+            step_x = (self.end.x > self.begin.x) - (self.end.x < self.begin.x)
+            step_y = (self.end.y > self.begin.y) - (self.end.y < self.begin.y)
+            self.all_dots = ([self.begin]
+                             + [Dot(x=self.begin.x + step_x * i, y=self.begin.y + step_y * i)
+                                for i in range(1, self.length - 1)]
+                             + [self.end])
 
         for dot in self.all_dots:
             dot.state = DotNames.ship
 
+    def dot(self, x: int, y: int):
+        """Return the ship's dot with given coordinates: dots go from the beginning, so it's the distance to it"""
+
+        return self.all_dots[max(abs(x - self.begin.x), abs(y - self.begin.y))]
+
 
 class Board:
     """
     Class create board, add ships if place is empty else raise error,
     add contour, delete contour, create list of all ships;
-    make shoot and raise error if this dot is already shoot
+    make shoot: fire returns ShotResult, shoot raises error if this dot is already shoot or hit;
+    snapshot returns the state of the board, restore brings it back
     """
 
-    def __init__(self, hidden=False):
-        """Create the board"""
+    _empty_lines = {}   # size of the board -> lines of empty dots to copy
+
+    def __init__(self, hidden=False, rules=DEFAULT_RULES):
+        """Create the board: lines of shared empty dots, ship's index replaces the dot where the ship is"""
 
-        self.board_list = [[Dot(x, y) for x in range(6)] for y in range(6)]
+        self.init_state(hidden, rules)
+        if rules.size not in Board._empty_lines:
+            Board._empty_lines[rules.size] = [tuple(CellDot.get(x, y) for y in range(rules.size))
+                                              for x in range(rules.size)]
+        self.board_list = [list(line) for line in Board._empty_lines[rules.size]]
+
+    def init_state(self, hidden: bool, rules):
+        """State of every kind of board besides its cells: ships, counters, observation grid, indexes, renderer"""
+
+        self.rules = rules
         self.ship_list = []
         self.hidden = hidden
+        self.lives_left = 0         # alive decks of all ships
+        self.ships_placed = {}      # length -> amount of added ships
+        self.ships_alive = {}       # length -> amount of ships which aren't killed
+        self.line_versions = [0] * rules.size   # grows when some dot of the line changes
+        self.renderer = None                    # BoardRenderer, created when the board is shown
+        self.available = None           # numbers x * size + y of dots without shot and contour, see available_dots
+        self.available_position = None  # number of the dot -> its place in available, -1 if it isn't there
+        self.last_shot = None           # the dot of the last fire, for records of games
+        self.observation = bytearray(rules.size * rules.size)   # SEEN_ code of every dot x * size + y
 
     def add_ship(self, ship: Ship):
         """
@@ -182,7 +408,7 @@ class Board:
             self.can_we_add_another_ship(ship)
 
             for dot in ship.all_dots:
-                if not Board.is_dot_on_board(dot):
+                if not self.is_dot_on_board(dot):
                     raise OutOfBoard("The dot(s) is out of board")
                 if not isinstance(self.board_list[dot.x][dot.y], Dot):
                     raise FieldIsOccupied("This field is occupied")
@@ -190,137 +416,544 @@ class Board:
                     raise OtherShipIsNear("Too close to other ship")
                 elif self.board_list[dot.x][dot.y].state == DotNames.empty:
                     self.board_list[dot.x][dot.y] = len(self.ship_list)
+                    self.line_versions[dot.x] += 1
         except (AllTheseShipsAreUsed, IncorrectShip, FieldIsOccupied, OtherShipIsNear, OutOfBoard) as error:
-            print(error)
-            raise ActionWasNotDone("Please try again")
+            raise ActionWasNotDone(f"{error}\nPlease try again")
         else:
             self.ship_list.append(ship)
+            self.count_new_ship(ship)
             self.add_contour(ship)
 
     def can_we_add_another_ship(self, ship: Ship):
         """Check the quantity of added ships with given length"""
 
-        if len(self.ship_list) == 0:
-            return
-        if (((len(ship) == 3 and                           # all 3-decker are used
-                max(len(some_ship) for some_ship in self.ship_list)) == 3)
-                or ((len(ship) == 2 and                    # all 2-decker are used
-                     len([some_ship for some_ship in self.ship_list if len(some_ship) == 2]) == 2))
-                or ((len(ship) == 1 and                    # all 1-decker are used
-                     len([some_ship for some_ship in self.ship_list if len(some_ship) == 1]) == 4))):
+        if self.ships_placed.get(ship.length, 0) >= self.rules.fleet_counts.get(ship.length, 0):
             raise AllTheseShipsAreUsed("All ships with this length are used")
 
+    def count_new_ship(self, ship: Ship):
+        """Add the ship to the counters of lives and ships"""
+
+        length = ship.length
+        self.lives_left += ship.lives
+        self.ships_placed[length] = self.ships_placed.get(length, 0) + 1
+        self.ships_alive[length] = self.ships_alive.get(length, 0) + 1
+
+    def lines_changed(self, ship: Ship):
+        """Mark lines of the ship and lines around it as changed"""
+
+        first = max(min(ship.begin.x, ship.end.x) - 1, 0)
+        last = min(max(ship.begin.x, ship.end.x) + 1, self.rules.size - 1)
+        for x in range(first, last + 1):
+            self.line_versions[x] += 1
+
     def add_contour(self, ship):
         """Create the contour of the ship, add it to the board"""
 
+        size = self.rules.size
+        self.lines_changed(ship)
         contour = []
         for dot in ship.all_dots:
-            contour.extend([Dot(i, j, state=DotNames.contour)
-                            for i in range(dot.x - 1, dot.x + 2)
-                            for j in range(dot.y - 1, dot.y + 2)])
-        contour = [dot for dot in contour if Board.is_dot_on_board(dot)]
-
-        for dot in contour:
-            if (isinstance(self.board_list[dot.x][dot.y], Dot)
-                    and self.board_list[dot.x][dot.y].state == DotNames.empty):
-                self.board_list[dot.x][dot.y] = dot
+            for i in range(max(dot.x - 1, 0), min(dot.x + 2, size)):
+                line = self.board_list[i]
+                for j in range(max(dot.y - 1, 0), min(dot.y + 2, size)):
+                    if not isinstance(line[j], int) and line[j].state == DotNames.empty:
+                        line[j] = CellDot.get(i, j, DotNames.contour)
+                        self.observation[i * size + j] = SEEN_CONTOUR
+                        contour.append(i * size + j)
+        if self.available is not None:
+            for number in sorted(contour):     # in the same order as BitBoard, so games are the same
+                self.make_unavailable(number)
 
     def delete_contour(self):
         """Delete contour from the board"""
 
-        for line in self.board_list:
-            for dot in line:
-                if isinstance(dot, Dot) and dot.state == DotNames.contour:
-                    dot.state = DotNames.empty
+        for x, line in enumerate(self.board_list):
+            for j, dot in enumerate(line):
+                if not isinstance(dot, int) and dot.state == DotNames.contour:
+                    line[j] = CellDot.get(dot.x, dot.y)
+                    self.observation[x * self.rules.size + j] = SEEN_UNKNOWN
+                    self.line_versions[x] += 1
+        self.available = self.available_position = None
 
     def shoot(self, dot: Dot):
-        """Make a shoot"""
+        """Make a shoot, raise AlreadyShot or YouHitTheTarget like before Board.fire"""
 
-        if isinstance(self.board_list[dot.x][dot.y], int):
-            self.shoot_at_ship(dot, index=self.board_list[dot.x][dot.y])
-        elif self.board_list[dot.x][dot.y].state == DotNames.miss:
+        result = self.fire(dot)[0]
+        if result is ShotResult.already:
             raise AlreadyShot("You already shot in this dot")
-        elif (self.board_list[dot.x][dot.y].state == DotNames.empty or
-              self.board_list[dot.x][dot.y].state == DotNames.contour):
-            self.board_list[dot.x][dot.y].state = DotNames.miss
+        if result is not ShotResult.miss:
+            raise YouHitTheTarget("You hit the target! Shoot again")
 
-    def shoot_at_ship(self, dot: Dot, index: int):
+    def fire(self, dot: Dot):
+        """Make a shoot, return (ShotResult, ship which was hit or killed, else None); it doesn't raise"""
+
+        self.last_shot = dot
+        cell = self.board_list[dot.x][dot.y]
+        if isinstance(cell, int):
+            return self.fire_at_ship(dot, index=cell)
+        if cell.state == DotNames.miss:
+            return ALREADY
+        self.board_list[dot.x][dot.y] = CellDot.get(dot.x, dot.y, DotNames.miss)
+        self.line_versions[dot.x] += 1
+        self.observation[dot.x * self.rules.size + dot.y] = SEEN_MISS
+        self.make_unavailable(dot.x * self.rules.size + dot.y)
+        return MISS
+
+    def fire_at_ship(self, dot: Dot, index: int):
         """Make a shoot in ship. If ship's lives is gone, make ship killed"""
 
         ship = self.ship_list[index]
-        if ship.lives == 0:
-            raise AlreadyShot("You already shot in this dot")
+        dot_in_ship = ship.dot(dot.x, dot.y)
+        if dot_in_ship.state != DotNames.ship:
+            return ALREADY
+        dot_in_ship.state = DotNames.burn
+        ship.lives -= 1
+        self.lives_left -= 1
+        self.line_versions[dot.x] += 1
+        size = self.rules.size
+        self.observation[dot.x * size + dot.y] = SEEN_HIT
+        self.make_unavailable(dot.x * size + dot.y)
+        if ship.lives:
+            return ShotResult.hit, ship
+        self.ships_alive[ship.length] -= 1
+        for dot_in_ship in ship.all_dots:
+            dot_in_ship.state = DotNames.killed
+            self.observation[dot_in_ship.x * size + dot_in_ship.y] = SEEN_KILLED
+        self.add_contour(ship)
+        return ShotResult.kill, ship
+
+    def apply_shots(self, numbers):
+        """Make shots in dots with given numbers x * size + y, results aren't returned"""
+
+        for number in numbers:
+            self.fire(Dot(*divmod(number, self.rules.size)))
+
+    def snapshot(self):
+        """
+        Return the state of the board as a tuple, restore(state) makes the board the same as it was.
+        For search: make shots, look at the board, restore it. Lines of cells are tuples of shared dots,
+        ships aren't copied, only their lives and states of their dots are kept
+        """
+
+        return tuple(map(tuple, self.board_list)), self.fleet_state()
+
+    def restore(self, state: tuple):
+        """Bring the board back to the snapshot, ships added after it are removed"""
+
+        cells, fleet = state
+        self.board_list = list(map(list, cells))
+        self.restore_fleet(fleet)
+
+    def fleet_state(self):
+        """State of ships, counters, the last shot, the observation and the index of available dots of every board"""
+
+        ship_list = self.ship_list
+        return (len(ship_list), tuple([ship.lives for ship in ship_list]),
+                tuple([dot.state for ship in ship_list for dot in ship.all_dots]),
+                self.lives_left, tuple(self.ships_placed.items()), tuple(self.ships_alive.items()),
+                self.available if self.available is None else (tuple(self.available), tuple(self.available_position)),
+                self.last_shot, bytes(self.observation))
+
+    def restore_fleet(self, fleet: tuple):
+        """
+        Put back the state made by fleet_state. Lines aren't put back to their old versions,
+        every line gets a new one, so renderers draw the restored board again.
+        The observation is copied into the same grid, views of it stay valid
+        """
+
+        ships, lives, states, self.lives_left, placed, alive, available, self.last_shot, seen = fleet
+        self.observation[:] = seen
+        del self.ship_list[ships:]
+        for ship, ship_lives in zip(self.ship_list, lives):
+            ship.lives = ship_lives
+        for dot, state in zip([dot for ship in self.ship_list for dot in ship.all_dots], states):
+            dot.state = state
+        self.ships_placed = dict(placed)
+        self.ships_alive = dict(alive)
+        if available is None:
+            self.available = self.available_position = None
         else:
-            for dot_in_ship in ship.all_dots:
-
-                if dot_in_ship == dot:
-                    if dot_in_ship.state == DotNames.ship:
-                        dot_in_ship.state = DotNames.burn
-                        ship.lives -= 1
-                    else:
-                        raise AlreadyShot("You already shot in this dot")
-            if ship.lives == 0:
-                for dot_in_ship in ship.all_dots:
-                    dot_in_ship.state = DotNames.killed
-                self.add_contour(ship)
-            raise YouHitTheTarget("You hit the target! Shoot again")
+            self.available, self.available_position = list(available[0]), list(available[1])
+        self.line_versions = [version + 1 for version in self.line_versions]
+
+    def cell_state(self, x: int, y: int):
+        """Return the state of the dot with given coordinates"""
+
+        cell = self.board_list[x][y]
+        if isinstance(cell, int):
+            return self.ship_list[cell].dot(x, y).state
+        return cell.state
+
+    def shots_amount(self):
+        """Count dots which were shot"""
+
+        return sum(1 for x in range(self.rules.size) for y in range(self.rules.size)
+                   if self.cell_state(x, y) in (DotNames.miss, DotNames.burn, DotNames.killed))
+
+    def available_dots(self):
+        """
+        Return the list of numbers x * size + y of dots which aren't shot and aren't contour.
+        The index is made on the first call, then shots and contour remove dots from it
+        """
+
+        if self.available is None:
+            size = self.rules.size
+            self.available = [number for number, seen in enumerate(self.observation) if seen == SEEN_UNKNOWN]
+            self.available_position = [-1] * (size * size)
+            for position, number in enumerate(self.available):
+                self.available_position[number] = position
+        return self.available
+
+    def make_unavailable(self, number: int):
+        """Remove the dot from the index of available dots: the last dot takes its place"""
+
+        if self.available_position is None or self.available_position[number] < 0:
+            return
+        position = self.available_position[number]
+        last = self.available.pop()
+        if last != number:
+            self.available[position] = last
+            self.available_position[last] = position
+        self.available_position[number] = -1
+
+    def is_available(self, x: int, y: int):
+        """Check the dot isn't shot and isn't contour"""
+
+        return self.observation[x * self.rules.size + y] == SEEN_UNKNOWN
+
+    def share_observation(self, buffer):
+        """
+        Keep the observation grid in given writable buffer of size * size bytes, for example
+        in a line of a numpy array of many boards (see batch_engine.observations); the grid is copied there
+        """
+
+        view = memoryview(buffer).cast("B")
+        view[:] = self.observation
+        self.observation = view
+
+    def random_available(self, rng=random):
+        """Return coordinates of random dot which isn't shot and isn't contour, None if there are no such dots"""
+
+        available = self.available_dots()
+        if not available:
+            return None
+        return divmod(available[rng.randrange(len(available))], self.rules.size)
 
     def show_board(self):
         """Print the board. Hide ships if hidden (for computer) else show its"""
 
-        __sep = " | "
-        strings = ["A", "B", "C", "D", "E", "F"]
-        columns = [" "] + [f"{_num}" for _num in range(1, 7)]
-        print(__sep.join(columns), end=__sep + "\n")
+        if self.renderer is None:
+            self.renderer = BoardRenderer(self)
+        sys.stdout.write(self.renderer.frame())
 
-        if self.hidden:
-            self.show_board_hidden(strings, __sep)
-        else:
-            for i in range(6):
-                print(strings[i], end=__sep)
-                for j in range(6):
-                    if isinstance(self.board_list[i][j], int):
-                        ship = self.ship_list[self.board_list[i][j]]
-                        new_dot = None
-                        for dot in ship.all_dots:
-                            if dot == Dot(i, j):
-                                new_dot = dot
-                        print(new_dot, end=__sep)
-                    else:
-                        print(self.board_list[i][j], end=__sep)
-                print("")
-
-    def show_board_hidden(self, strings, __sep):
-        """Print the board. Hide ships if hidden (for computer)"""
-
-        for i in range(6):
-            print(strings[i], end=__sep)
-            for j in range(6):
-                if isinstance(self.board_list[i][j], int):
-                    ship = self.ship_list[self.board_list[i][j]]
-                    new_dot = None
-                    for dot in ship.all_dots:
-                        if dot == Dot(i, j):
-                            if dot.state == DotNames.ship:
-                                new_dot = dot.copy()
-                                new_dot.state = DotNames.empty
-                            else:
-                                new_dot = dot.copy()
-                    print(new_dot, end=__sep)
-                else:
-                    print(self.board_list[i][j], end=__sep)
-            print("")
+    def text(self):
+        """Return the board as text, the same show_board prints"""
 
-    @staticmethod
-    def is_dot_on_board(dot):
+        if self.renderer is None:
+            self.renderer = BoardRenderer(self)
+        return self.renderer.text()
+
+    def is_dot_on_board(self, dot):
         """Check dot is on the board"""
 
-        if (0 <= dot.x < 6) and (0 <= dot.y < 6):
+        if (0 <= dot.x < self.rules.size) and (0 <= dot.y < self.rules.size):
             return True
         else:
             return False
 
 
+class BitBoard(Board):
+    """
+    Board with the same interface as Board, but ships, hits, misses and contour
+    are kept as integer bitmasks: dot (x, y) is the bit x * size + y.
+    Contour is found by shifts of the ship's mask, not dot by dot
+    """
+
+    _masks = {}     # size of the board -> (full mask, mask without first column, mask without last column)
+
+    def __init__(self, hidden=False, rules=DEFAULT_RULES):
+        """Create the board: the state of Board without its cells, and the masks"""
+
+        self.init_state(hidden, rules)
+        self.size = rules.size
+        self.ships = 0          # all ships' dots
+        self.hits = 0           # burn and killed ships' dots
+        self.killed = 0         # killed ships' dots
+        self.misses = 0
+        self.contour = 0
+        self.ship_masks = []    # mask of every ship, same order as ship_list
+        self.cell_ship = [-1] * (self.size * self.size)  # index of the ship in every dot
+        if self.size not in BitBoard._masks:
+            full_mask = (1 << self.size * self.size) - 1
+            # shifting by one bit moves the first and the last dots of the line
+            # to the neighbouring line, these masks cut them off
+            BitBoard._masks[self.size] = (
+                full_mask,
+                full_mask & ~sum(1 << (x * self.size) for x in range(self.size)),
+                full_mask & ~sum(1 << (x * self.size + self.size - 1) for x in range(self.size)))
+        self.full_mask, self.not_first_column, self.not_last_column = BitBoard._masks[self.size]
+
+    def neighbourhood(self, mask: int):
+        """Return the mask with given dots and all dots around them"""
+
+        line = mask | (mask << 1) & self.not_first_column | (mask >> 1) & self.not_last_column
+        return (line | line << self.size | line >> self.size) & self.full_mask
+
+    def add_ship(self, ship: Ship):
+        """
+        Check the correctness of ship's location
+        and add it on the board and in the ships list,
+        also add contour on the board
+        """
+
+        mask = 0
+        try:
+            self.can_we_add_another_ship(ship)
+
+            for dot in ship.all_dots:
+                if not self.is_dot_on_board(dot):
+                    raise OutOfBoard("The dot(s) is out of board")
+                bit = 1 << (dot.x * self.size + dot.y)
+                if self.ships & bit:
+                    raise FieldIsOccupied("This field is occupied")
+                elif self.contour & bit:
+                    raise OtherShipIsNear("Too close to other ship")
+                mask |= bit
+        except (AllTheseShipsAreUsed, IncorrectShip, FieldIsOccupied, OtherShipIsNear, OutOfBoard) as error:
+            raise ActionWasNotDone(f"{error}\nPlease try again")
+        else:
+            for dot in ship.all_dots:
+                self.cell_ship[dot.x * self.size + dot.y] = len(self.ship_list)
+            self.ships |= mask
+            self.ship_masks.append(mask)
+            self.ship_list.append(ship)
+            self.count_new_ship(ship)
+            self.add_contour(ship)
+
+    def add_contour(self, ship):
+        """Create the contour of the ship, add it to the board"""
+
+        self.add_contour_mask(self.ship_masks[self.ship_list.index(ship)])
+        self.lines_changed(ship)
+
+    def add_contour_mask(self, mask: int):
+        """Add the contour of the ship with given mask, its dots aren't available any more"""
+
+        new = self.neighbourhood(mask) & ~(self.ships | self.misses | self.contour)
+        self.contour |= new
+        available = self.available is not None
+        while new:
+            bit = new & -new
+            number = bit.bit_length() - 1
+            self.observation[number] = SEEN_CONTOUR
+            if available:
+                self.make_unavailable(number)
+            new ^= bit
+
+    def mark(self, mask: int, seen: int):
+        """Put the code in the observation grid for every dot of the mask"""
+
+        while mask:
+            bit = mask & -mask
+            self.observation[bit.bit_length() - 1] = seen
+            mask ^= bit
+
+    def delete_contour(self):
+        """Delete contour from the board"""
+
+        self.mark(self.contour, SEEN_UNKNOWN)
+        self.contour = 0
+        self.line_versions = [version + 1 for version in self.line_versions]
+        self.available = self.available_position = None
+
+    def fire(self, dot: Dot):
+        """Make a shoot, return (ShotResult, ship which was hit or killed, else None); it doesn't raise"""
+
+        self.last_shot = dot
+        index = dot.x * self.size + dot.y
+        if self.cell_ship[index] >= 0:
+            return self.fire_at_ship(dot, index=self.cell_ship[index])
+        if self.misses >> index & 1:
+            return ALREADY
+        self.misses |= 1 << index
+        self.contour &= ~(1 << index)
+        self.line_versions[dot.x] += 1
+        self.observation[index] = SEEN_MISS
+        self.make_unavailable(index)
+        return MISS
+
+    def fire_at_ship(self, dot: Dot, index: int):
+        """Make a shoot in ship. If ship's lives is gone, make ship killed"""
+
+        ship = self.ship_list[index]
+        bit = 1 << (dot.x * self.size + dot.y)
+        if self.hits & bit:
+            return ALREADY
+
+        self.hits |= bit
+        ship.lives -= 1
+        self.lives_left -= 1
+        self.line_versions[dot.x] += 1
+        self.observation[bit.bit_length() - 1] = SEEN_HIT
+        self.make_unavailable(bit.bit_length() - 1)
+        ship.dot(dot.x, dot.y).state = DotNames.burn
+        if ship.lives:
+            return ShotResult.hit, ship
+        self.ships_alive[ship.length] -= 1
+        self.lines_changed(ship)
+        self.killed |= self.ship_masks[index]
+        for dot_in_ship in ship.all_dots:
+            dot_in_ship.state = DotNames.killed
+        self.mark(self.ship_masks[index], SEEN_KILLED)
+        self.add_contour_mask(self.ship_masks[index])
+        return ShotResult.kill, ship
+
+    def apply_shots(self, numbers):
+        """
+        Make shots in dots with given numbers x * size + y at once by masks:
+        the board is the same as after fire of them one by one, results aren't returned
+        """
+
+        shot = 0
+        for number in numbers:
+            shot |= 1 << number
+        if not shot:
+            return
+        new_hits = shot & self.ships & ~self.hits
+        self.misses |= shot & ~self.ships
+        self.hits |= new_hits
+        self.contour &= ~self.misses
+        self.mark(shot & ~self.ships, SEEN_MISS)
+        self.mark(new_hits, SEEN_HIT)
+        self.available = self.available_position = None
+        self.line_versions = [version + 1 for version in self.line_versions]
+        self.last_shot = Dot(*divmod(numbers[-1], self.size))
+        for index in {self.cell_ship[number] for number in numbers if new_hits >> number & 1}:
+            ship, mask = self.ship_list[index], self.ship_masks[index]
+            for dot in ship.all_dots:
+                if new_hits >> (dot.x * self.size + dot.y) & 1:
+                    dot.state = DotNames.burn
+                    ship.lives -= 1
+                    self.lives_left -= 1
+            if not ship.lives:
+                self.ships_alive[ship.length] -= 1
+                self.killed |= mask
+                for dot in ship.all_dots:
+                    dot.state = DotNames.killed
+                self.mark(mask, SEEN_KILLED)
+                self.add_contour_mask(mask)
+
+    def snapshot(self):
+        """Return the state of the board as a tuple: masks are ints, so they are kept as they are, see Board.snapshot"""
+
+        return self.ships, self.hits, self.killed, self.misses, self.contour, self.fleet_state()
+
+    def restore(self, state: tuple):
+        """Bring the board back to the snapshot, ships added after it are removed"""
+
+        self.ships, self.hits, self.killed, self.misses, self.contour, fleet = state
+        ships = fleet[0]
+        if len(self.ship_list) > ships:
+            del self.ship_masks[ships:]
+            self.cell_ship = [index if index < ships else -1 for index in self.cell_ship]
+        self.restore_fleet(fleet)
+
+    def cell_state(self, x: int, y: int):
+        """Return the state of the dot with given coordinates"""
+
+        bit = 1 << (x * self.size + y)
+        if self.ships & bit:
+            if self.killed & bit:
+                return DotNames.killed
+            if self.hits & bit:
+                return DotNames.burn
+            return DotNames.ship
+        if self.misses & bit:
+            return DotNames.miss
+        if self.contour & bit:
+            return DotNames.contour
+        return DotNames.empty
+
+    def shots_amount(self):
+        """Count dots which were shot"""
+
+        return bin(self.hits | self.misses).count("1")
+
+
+class BoardRenderer:
+    """
+    Text of the board for printing. Every line is rendered once and kept with the version
+    of this line on the board, so a new frame renders only changed lines and is written at once.
+    In ANSI mode the board stays on the screen from the line top
+    and the frame redraws only changed lines in place, the cursor goes back where it was.
+    Ships are hidden if the board is hidden, or if hidden is given, as it says
+    """
+
+    sep = " | "
+
+    def __init__(self, board: Board, ansi=False, top=1, hidden=None):
+        """Create the renderer of the board"""
+
+        self.board = board
+        self.ansi = ansi
+        self.top = top
+        self.header = BoardRenderer.sep.join(board.rules.column_labels) + BoardRenderer.sep + "\n"
+        self.lines = [""] * board.rules.size
+        self.versions = [None] * board.rules.size   # versions of board's lines which are rendered
+        self.fixed_hidden = hidden
+        self.hidden = board.hidden if hidden is None else hidden
+        self.drawn = False                          # ANSI mode: the board is on the screen
+
+    def update(self):
+        """Render changed lines, return their numbers"""
+
+        hidden = self.board.hidden if self.fixed_hidden is None else self.fixed_hidden
+        if self.hidden != hidden:
+            self.hidden = hidden
+            self.versions = [None] * len(self.versions)
+        changed = []
+        for x, version in enumerate(self.board.line_versions):
+            if self.versions[x] != version:
+                self.lines[x] = self.render_line(x)
+                self.versions[x] = version
+                changed.append(x)
+        return changed
+
+    def render_line(self, x: int):
+        """Text of the line of the board. If the board is hidden, it's the line of the observation grid"""
+
+        rules = self.board.rules
+        texts = [rules.line_labels[x]]
+        if self.hidden:
+            seen = self.board.observation
+            texts.extend([rules.seen_texts[seen[number]] for number in range(x * rules.size, (x + 1) * rules.size)])
+        else:
+            texts.extend([rules.cell_texts[self.board.cell_state(x, y)] for y in range(rules.size)])
+        return BoardRenderer.sep.join(texts) + BoardRenderer.sep + "\n"
+
+    def text(self):
+        """Whole board as text"""
+
+        self.update()
+        return self.header + "".join(self.lines)
+
+    def frame(self):
+        """Text to write: whole board, or in ANSI mode escape codes which redraw changed lines in place"""
+
+        if not self.ansi:
+            return self.text()
+        changed = self.update()
+        parts = ["\x1b7"]                                # save the cursor
+        if not self.drawn:
+            changed = range(len(self.lines))
+            parts.append(f"\x1b[{self.top};1H\x1b[2K{self.header[:-1]}")
+            self.drawn = True
+        for x in changed:
+            parts.append(f"\x1b[{self.top + 1 + x};1H\x1b[2K{self.lines[x][:-1]}")
+        parts.append("\x1b8")                            # restore the cursor
+        return "".join(parts)
+
+
 class Player:
     """Parent class for players"""
 
@@ -334,59 +967,55 @@ class PlayerHuman(Player):
     make shoot by input, raise an error if something wrong
     """
 
-    def __init__(self):
-        """Create a board and fill it with ships"""
+    def __init__(self, board_class=Board, rules=DEFAULT_RULES, transport=None):
+        """Create a board and fill it with ships, transport is ConsoleTransport by default"""
 
-        self.board = Board(hidden=False)
+        self.rules = rules
+        self.transport = transport or ConsoleTransport()
+        self.board = board_class(hidden=False, rules=rules)
         self.fill_board()
 
     def fill_board(self):
         """Fill the board with ships by input"""
 
-        global RULES
-        print(RULES[0])
+        self.transport.write(self.rules.text()[0])
         ships_amount = 0
 
-        while ships_amount < 7:
-            self.board.show_board()
-            coord = input("add your ship, enter 'AGAIN' if you want to start again\n")
+        while ships_amount < self.rules.ships_amount:
+            self.transport.show(self.board)
+            coord = self.transport.ask("add your ship, enter 'AGAIN' if you want to start again\n")
             coord = PlayerHuman.clean_input(coord)
             if coord == "AGAIN":
-                self.board = Board(hidden=False)
+                self.board = type(self.board)(hidden=False, rules=self.rules)
                 self.fill_board()
                 return
 
             try:
-                if len(coord) != 2 and len(coord) != 4:
-                    raise InputRecognitionError("Sorry, I don't understand\nPlease try again")
-                if len(coord) == 2:
-                    coord = coord * 2
-                if not(coord[0].isalpha() and coord[1].isdigit() and
-                       coord[2].isalpha() and coord[3].isdigit()):
-                    raise InputRecognitionError("Sorry, I don't understand\nPlease try again")
-                dot_1 = Dot(ord(coord[0]) - 65, int(coord[1]) - 1)  # because ord("A") is 65
-                dot_2 = Dot(ord(coord[2]) - 65, int(coord[3]) - 1)  # because ord("A") is 65
-                self.board.add_ship(Ship(dot_1, dot_2))
-            except (ActionWasNotDone, InputRecognitionError, IncorrectShip) as error:
-                print(error)
+                dots = self.rules.parse_dots(coord)
+                self.board.add_ship(Ship(dots[0], dots[-1], rules=self.rules))
+            except InputRecognitionError as error:
+                self.transport.write(f"{error}\nPlease try again")
+                continue
+            except (ActionWasNotDone, IncorrectShip) as error:
+                self.transport.write(str(error))
                 continue
             else:
                 ships_amount += 1
 
         self.board.delete_contour()
-        self.board.show_board()
+        self.transport.show(self.board)
 
-    @staticmethod
-    def human_shoot() -> Dot:
+    def human_shoot(self) -> Dot:
         """Make a shoot by input"""
 
-        move = input("Your turn\n")
+        move = self.transport.ask("Your turn\n")
         move = PlayerHuman.clean_input(move)
 
-        if len(move) != 2 and not (move[0].isalpha() and move[1].isdigit()):
+        dots = self.rules.parse_dots(move)
+        if len(dots) != 1:
             raise InputRecognitionError("Sorry, I don't understand")
-        dot = Dot(ord(move[0]) - 65, int(move[1]) - 1)  # because ord("A") is 65
-        if not Board.is_dot_on_board(dot):
+        dot = dots[0]
+        if not self.board.is_dot_on_board(dot):
             raise OutOfBoard("The dot(s) is out of board")
 
         return dot
@@ -409,158 +1038,210 @@ class PlayerComputer(Player):
         shoots in random dot, when hit, shoots near
     """
 
-    def __init__(self):
-        """Create the board with ships"""
+    def __init__(self, board_class=Board, rng=random, rules=DEFAULT_RULES, transport=None):
+        """
+        Create the board with ships, rng is random module or random.Random for repeatable games,
+        transport shows computer's hits, ConsoleTransport by default
+        """
 
-        self.board = Board(hidden=True)
+        self.board_class = board_class
+        self.rng = rng
+        self.rules = rules
+        self.transport = transport or ConsoleTransport()
+        self.board = board_class(hidden=True, rules=rules)
         self.fill_board()
         self.board.delete_contour()
-        self.next_shoot_dots = []   # need for shoot
+        self.reset_targets()
 
-    def fill_board(self):
-        """Fill the board with ships"""
-
-        free_dots = [(x, y) for x in range(6) for y in range(6)]
-        # add one 3-decker ship:
-        self.board.add_ship(Ship(*PlayerComputer.three_or_two_decker_ship(3, free_dots)))
-        free_dots = self.remove_occupied_dots(free_dots)
-        # add two 2-decker ship:
-        for i in range(2):
-            self.board.add_ship(Ship(*PlayerComputer.three_or_two_decker_ship(2, free_dots)))
-            free_dots = self.remove_occupied_dots(free_dots)
-        # add four 1-decker ship:67
-        for i in range(4):
-            if len(self.board.ship_list) == 7:
-                break
-            self.board.add_ship(Ship(PlayerComputer.one_decker_ship(free_dots)))
-            free_dots = self.remove_occupied_dots(free_dots)
+    def reset_targets(self):
+        """Forget damaged and killed ships of the opponent, before the game with a new opponent's board"""
 
-    def remove_occupied_dots(self, free_dots):
+        self.target = []    # coordinates (x, y) of hit dots of ships which aren't killed yet
+        self.afloat = dict(self.rules.fleet_counts)     # length -> amount of opponent's ships which aren't killed
+
+    def close(self):
+        """Free what the strategy holds after the game, the game calls it; nothing to free here"""
+
+    def fill_board(self):
         """
-        Recreate list with free dots for choose place to ship;
-        recreate whole board if free dots ran out and not all ships are in place
+        Fill the board with random legal fleet from the placement index (the table of fleets or the search),
+        FleetDoesNotFit if the fleet can't be placed on the board
         """
 
-        new_free_dots = free_dots.copy()
+        for begin, end in PlacementIndex.get(self.rules.size, self.rules.fleet).random_fleet(self.rng):
+            self.board.add_ship(Ship(Dot(*begin), Dot(*end), rules=self.rules))
 
-        for dot in free_dots:
-            same_dot_on_board = self.board.board_list[dot[0]][dot[1]]
-            if (isinstance(same_dot_on_board, int) or
-                    same_dot_on_board.state == DotNames.contour):
-                new_free_dots.remove(dot)
+    def comp_shoot(self, board: Board):
+        """Shoot by comp_fire, if hit, raise ActionWasNotDone to shoot again"""
 
-        if not new_free_dots and len(self.board.ship_list) < 7:
-            self.__init__()
+        if self.comp_fire(board)[0] is not ShotResult.miss:
+            raise ActionWasNotDone
 
-        return new_free_dots
+    def comp_fire(self, board: Board):
+        """
+        Hunt and target: if some ship is damaged, shoot next to it where the rest of it can be (see target_dot),
+        else in random dot which isn't shot and isn't contour, it's taken from the index of the board
+        without retries. Return (ShotResult, ship) of the shot, never ShotResult.already
+        """
 
-    @staticmethod
-    def three_or_two_decker_ship(deck_amount: int, free_dots: list):
-        """Random choose the beginning and the end of three- and two-decker ships"""
-
-        n = deck_amount - 1
-        coord_begin = random.choice(free_dots)
-        coord_end = None
-        list_coord_end = [(coord_begin[0] + n, coord_begin[1]), (coord_begin[0] - n, coord_begin[1]),
-                          (coord_begin[0], coord_begin[1] + n), (coord_begin[0], coord_begin[1] - n)]
-        list_coord_end = [item for item in list_coord_end if item in free_dots]
-
-        if not list_coord_end:
-            PlayerComputer.three_or_two_decker_ship(deck_amount, free_dots)
-        else:
-            coord_end = random.choice(list_coord_end)
-        dot_begin = Dot(x=coord_begin[0], y=coord_begin[1])
-        dot_end = Dot(x=coord_end[0], y=coord_end[1])
+        dot = self.target_dot(board) if self.target else None
+        if dot is None:
+            dot = Dot(*board.random_available(self.rng))
 
-        return [dot_begin, dot_end]
+        result = board.fire(dot)         # SHOOT
+        self.observe(board, dot, result[0])
+        if result[0] is not ShotResult.miss:
+            self.comp_hit_the_target(board)
+        return result
 
-    @staticmethod
-    def one_decker_ship(free_dots: list):
-        """Random choose the beginning of one-decker ships"""
+    def observe(self, board: Board, dot: Dot, result: ShotResult):
+        """
+        Learn the result of the shot in the board: the hit dot goes to the target,
+        the killed ship leaves the target and the ships afloat. Replay calls it for shots of the recorded game
+        """
 
-        coord_begin = random.choice(free_dots)
-        dot_begin = Dot(x=coord_begin[0], y=coord_begin[1])
-        return dot_begin
+        if result is ShotResult.hit:
+            self.target.append((dot.x, dot.y))
+        elif result is ShotResult.kill:
+            ship = self.damaged_ship(dot.x, dot.y)
+            if self.afloat.get(len(ship)):
+                self.afloat[len(ship)] -= 1
+            self.target = [hit for hit in self.target if hit not in ship]
 
-    def comp_shoot(self, board: Board):
-        """Almost random shoot
-        if hit, add dots in next_shoot_dots, raise ActionWasNotDone
+    def damaged_ship(self, x: int, y: int):
+        """
+        Coordinates of the dot and of hit dots of the target in line with it without gaps:
+        ships are straight and don't touch each other, so these are dots of one ship
         """
 
-        if self.next_shoot_dots:
-            dot = random.choice(self.next_shoot_dots)
-            try:
-                board.shoot(dot)         # SHOOT
-                self.next_shoot_dots.remove(dot)
-                self.clean_next_shoot_dots(board)
-            except YouHitTheTarget:
-                self.next_shoot_dots.remove(dot)
-                self.comp_hit_the_target(dot.x, dot.y, board)
-            except (AlreadyShot, ActionWasNotDone):
-                self.next_shoot_dots.remove(dot)
-                self.clean_next_shoot_dots(board)
-                raise
+        hits = set(self.target)
+        ship = [(x, y)]
+        for dx, dy in ((-1, 0), (1, 0), (0, -1), (0, 1)):
+            i, j = x + dx, y + dy
+            while (i, j) in hits:
+                ship.append((i, j))
+                i, j = i + dx, j + dy
+        return ship
+
+    def target_dot(self, board: Board):
+        """Dot next to the damaged ship with the most points of target_scores, None if no position fits"""
+
+        scores = self.target_scores(board)
+        if not scores:
+            if METRICS.enabled:
+                METRICS.count("target_lost", type(self).__name__)
+            return None
+        best = max(scores.values())
+        return Dot(*self.rng.choice(sorted(dot for dot, score in scores.items() if score == best)))
+
+    def target_scores(self, board: Board):
+        """
+        Points of dots next to the damaged ship (the one of the first hit of the target): where the rest
+        of it most probably is. The ship lies along both axes after one hit and along the line of hits
+        after two. Every position along the axis of every length afloat, longer than the damaged part,
+        which fits into dots not shot and not contour, gives the amount of such ships to the dots next
+        to the damaged part it covers; a contour of the killed ship stops positions at once, longer ships
+        than the longest afloat aren't counted. Return {(x, y): points}, empty if no position fits
+        """
 
+        ship = sorted(self.damaged_ship(*self.target[0]))
+        first, last = ship[0], ship[-1]
+        hit = len(ship)
+        if hit == 1:
+            axes = ((1, 0), (0, 1))
         else:
-            x, y = PlayerComputer.random_coord()
-            if (isinstance(board.board_list[x][y], Dot) and  # computer wouldn't shoot in the contour
-                    board.board_list[x][y].state == DotNames.contour):
-                raise ActionWasNotDone
-            try:
-                board.shoot(Dot(x, y))         # SHOOT
-            except YouHitTheTarget:
-                self.comp_hit_the_target(x, y, board)
-            except AlreadyShot:
-                raise ActionWasNotDone
-
-    def comp_hit_the_target(self, x, y, board):
-        """Add neighboring cells at self.next_shoot_dots"""
-
-        self.next_shoot_dots.extend([Dot(x + 1, y), Dot(x - 1, y), Dot(x, y + 1), Dot(x, y - 1)])
-        self.clean_next_shoot_dots(board)
-        print("Your board:")
-        board.show_board()
-        print("I hit the target! Let me think...")
-        raise ActionWasNotDone
-
-    def clean_next_shoot_dots(self, board):
-        """Delete from next_shoot_dots list dots out of board and contour-dots"""
-
-        self.next_shoot_dots = [dot for dot in self.next_shoot_dots
-                                if Board.is_dot_on_board(dot)
-                                and not ((isinstance(board.board_list[dot.x][dot.y], Dot) and
-                                         board.board_list[dot.x][dot.y].state == DotNames.contour))]
+            axes = ((1, 0),) if first[0] != last[0] else ((0, 1),)
+        longest = max((length for length, amount in self.afloat.items() if amount), default=0)
+        scores = {}
+        for dx, dy in axes:
+            before = self.free_run(board, first, -dx, -dy, longest - hit)
+            after = self.free_run(board, last, dx, dy, longest - hit)
+            for length, amount in self.afloat.items():
+                extra = length - hit
+                if not amount or extra < 1:
+                    continue
+                for shift in range(max(0, extra - after), min(before, extra) + 1):   # dots before the damaged part
+                    if shift:
+                        dot = (first[0] - dx, first[1] - dy)
+                        scores[dot] = scores.get(dot, 0) + amount
+                    if extra - shift:
+                        dot = (last[0] + dx, last[1] + dy)
+                        scores[dot] = scores.get(dot, 0) + amount
+        return scores
 
     @staticmethod
-    def random_coord():
-        """Return random coordinates"""
+    def free_run(board: Board, start: tuple, dx: int, dy: int, limit: int):
+        """
+        Amount of dots not shot and not contour in a row from the start (not counted) in the direction, up to limit
+        """
+
+        size = board.rules.size
+        seen = board.observation
+        x, y = start
+        run = 0
+        while run < limit:
+            x, y = x + dx, y + dy
+            if not (0 <= x < size and 0 <= y < size) or seen[x * size + y] != SEEN_UNKNOWN:
+                break
+            run += 1
+        return run
 
-        return random.randrange(6), random.randrange(6)
+    def comp_hit_the_target(self, board):
+        """Show the board after the hit"""
+
+        self.transport.write("Your board:")
+        self.transport.show(board)
+        self.transport.write("I hit the target! Let me think...")
 
 
 class Game:
     """Whole game"""
 
-    def __init__(self):
-        """New game"""
+    def __init__(self, board_class=Board, rng=random, rules=DEFAULT_RULES, transport=None,
+                 computer_class=PlayerComputer, records=None):
+        """
+        New game, board_class is Board or BitBoard, rng is random module or random.Random,
+        transport is ConsoleTransport by default; computer_class(board_class, rng, rules, transport)
+        makes the computer player, PlayerComputer or other strategy.
+        If records (RecordWriter or list) is given, GameRecord of every finished game is appended to it:
+        the human is player 1, the computer is player 2, the record isn't replayable from the seed
+        """
 
-        self.human_first = random.randrange(2)  # 1 if human is first, else 0
-        self.human = PlayerHuman()
-        sleep(2)
-        self.computer = PlayerComputer()
+        self.records = records
+        self.record = None
+        self.board_class = board_class
+        self.rng = rng
+        self.rules = rules
+        self.transport = transport or ConsoleTransport()
+        self.computer_class = computer_class
+        self.human_first = rng.randrange(2)  # 1 if human is first, else 0
+        self.human = PlayerHuman(board_class, rules, self.transport)
+        self.transport.pause(2)
+        self.computer = computer_class(board_class, rng, rules, self.transport)
 
     def start(self):
         """Start the game"""
 
-        global RULES
-        print("I'm ready too\nMy board:")
-        self.computer.board.show_board()
-        print(RULES[1])
+        self.transport.start(self.computer.board, self.human.board)
+        self.transport.write("I'm ready too\nMy board:")
+        self.transport.show(self.computer.board)
+        self.transport.write(self.rules.text()[1])
         if self.human_first:
-            print("You go first")
+            self.transport.write("You go first")
         else:
-            print("I go first")
-        self.game_moves()
+            self.transport.write("I go first")
+        if self.records is not None:
+            from records import GameRecord, fleet_mask    # records uses this module
+            self.record = GameRecord(first=0 if self.human_first else 1, replayable=False,
+                                     fleets=(fleet_mask(self.human.board), fleet_mask(self.computer.board)))
+        try:
+            self.game_moves()
+        finally:
+            self.computer.close()
+        if self.record is not None:
+            self.record.winner = 0 if Game.lives_amount(self.human) else 1
+            self.records.append(self.record)
+        self.transport.finish()
         self.play_again()
 
     def game_moves(self):
@@ -579,73 +1260,81 @@ class Game:
                 return
             player_2_shoot(self.human, self.computer)
 
-    @staticmethod
-    def human_move(human, computer):
+    def human_move(self, human, computer):
         """Human move"""
 
         while True:
             if not Game.lives_amount(computer):
-                print("You win!")
+                self.transport.result("You win!")
                 return
             try:
-                print("My board:")
-                computer.board.show_board()
+                self.transport.write("My board:")
+                self.transport.show(computer.board)
                 computer.board.shoot(human.human_shoot())
+                self.record_shot(computer.board, ShotResult.miss)
                 break
             except (ActionWasNotDone, AlreadyShot, InputRecognitionError, OutOfBoard, YouHitTheTarget) as error:
+                if isinstance(error, YouHitTheTarget):
+                    self.record_shot(computer.board)
                 if not Game.lives_amount(computer):
-                    computer.board.show_board()
-                    print("You win!")
+                    self.transport.show(computer.board)
+                    self.transport.result("You win!")
                     return
-                print(error)
+                self.transport.write(str(error))
                 continue
-        print("My board:")
-        computer.board.show_board()
+        self.transport.write("My board:")
+        self.transport.show(computer.board)
 
-    @staticmethod
-    def comp_move(human, computer):
+    def comp_move(self, human, computer):
         """Computer move"""
 
         while True:
-            sleep(1)
+            self.transport.pause(1)
             if not Game.lives_amount(human):
-                print("You loose")
+                self.transport.result("You loose")
                 return
-            try:
-                computer.comp_shoot(human.board)
+            result = computer.comp_fire(human.board)[0]
+            self.record_shot(human.board, result)
+            if result is ShotResult.miss:
                 break
-            except (ActionWasNotDone, AlreadyShot, YouHitTheTarget):
-                continue
-        print("My turn\nYour board:")
-        human.board.show_board()
+        self.transport.write("My turn\nYour board:")
+        self.transport.show(human.board)
         if not Game.lives_amount(human):
-            print("You loose")
+            self.transport.result("You loose")
+            return
+
+    def record_shot(self, board, result=None):
+        """Add the last shot in the board to the kept record of the game, no result: hit or kill by the board"""
+
+        if self.record is None:
             return
+        dot = board.last_shot
+        if result is None:
+            killed = board.observation[dot.x * self.rules.size + dot.y] == SEEN_KILLED
+            result = ShotResult.kill if killed else ShotResult.hit
+        self.record.add_shot(dot, self.rules.size, result)
 
     @staticmethod
     def lives_amount(player):
-        """Count amount of lives of all ships"""
+        """Amount of lives of all ships, the board counts them"""
 
-        return sum([ship.lives for ship in player.board.ship_list])
+        return player.board.lives_left
 
-    @staticmethod
-    def play_again():
+    def play_again(self):
         """Ask player about repeat and start new game or say goodbye"""
 
-        print("Maybe one more time?")
-        answer = input("YES or NO\n")
+        self.transport.write("Maybe one more time?")
+        answer = self.transport.ask("YES or NO\n")
         answer = PlayerHuman.clean_input(answer)
 
         if answer == "NO":
-            print("Ok, bye! Have a nice day")
+            self.transport.write("Ok, bye! Have a nice day")
         elif answer == "YES":
-            main()
+            Game(self.board_class, self.rng, self.rules, self.transport, self.computer_class, self.records).start()
         else:
-            print("Sorry, I don't understand")
-            Game.play_again()
+            self.transport.write("Sorry, I don't understand")
+            self.play_again()
 
 
 if __name__ == '__main__':
     main()
-else:
-    print('battleship loaded as a module')
@@ -0,0 +1,947 @@
+"""Benchmarks of the game engine, every benchmark prints its report.
+Usage: python benchmark.py placement [--number 10000]
+       python benchmark.py scaling [--number 10]
+       python benchmark.py memory [--number 100000]
+       python benchmark.py render [--number 200]
+       python benchmark.py shots [--number 2000]
+       python benchmark.py records [--number 20000]
+       python benchmark.py replay [--number 2000]
+       python benchmark.py metrics [--number 5000]
+       python benchmark.py density [--number 200]
+       python benchmark.py targets [--number 3000]
+       python benchmark.py snapshot [--number 2000]
+       python benchmark.py mcts [--number 20]
+       python benchmark.py suite [--number 1000] --save baseline.json
+       python benchmark.py suite [--number 1000] --compare baseline.json [--tolerance 0.1]
+"""
+
+import argparse
+import contextlib
+import copy
+import gc
+import io
+import json
+import os
+import platform
+import random
+import runpy
+import sys
+import tempfile
+import time
+import tracemalloc
+from functools import partial
+
+from battleship import (ActionWasNotDone, AlreadyShot, BitBoard, Board, BoardRenderer, Dot, DotNames, Game,
+                        PlayerComputer, Rules, Ship, ShotResult)
+from mcts import PlayerComputerMCTS, TreeSearch
+from metrics import METRICS
+from placement import FleetDoesNotFit, PlacementIndex
+from records import RecordReader, RecordWriter
+from replay import Replay, replay_seed
+from simulation import HeadlessPlayerComputer, run_games
+from strategies import PlayerComputerHeatmap
+from transport import ConsoleTransport, NullTransport
+
+CLASSIC_FLEET = (4, 3, 3, 2, 2, 2, 1, 1, 1, 1)   # fleet of 10x10 board, bigger boards have more of them
+SCALING_RULES = [Rules(),
+                 Rules(10, CLASSIC_FLEET),
+                 Rules(20, CLASSIC_FLEET * 4),
+                 Rules(100, CLASSIC_FLEET * 100)]
+
+
+def rate(function, number: int):
+    """Call function number times, return (calls per second, amount of calls which returned False)"""
+
+    failures = 0
+    start = time.perf_counter()
+    for _ in range(number):
+        if function() is False:
+            failures += 1
+    return number / (time.perf_counter() - start), failures
+
+
+def bench_placement(number: int):
+    """Layouts per second of the fleets table against the backtracking search and the old placement with prints"""
+
+    random.seed(1)
+    rng = random.Random(1)
+    start = time.perf_counter()
+    index = PlacementIndex.get()
+    print(f"fleets table: {index.fleets_amount()} legal fleets enumerated "
+          f"in {time.perf_counter() - start:.2f} s")
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        from show_how_comp_add_ships import PlayerComputerWithLogs
+
+    def logs_fill():
+        """The old placement has no way out of a dead end: it fails with TypeError or RecursionError"""
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            try:
+                PlayerComputerWithLogs()
+            except (TypeError, RecursionError):
+                return False
+
+    cases = [("fleets table, positions only", lambda: index.random_fleet(rng)),
+             ("PlayerComputer, Board", lambda: PlayerComputer(Board, rng)),
+             ("PlayerComputer, BitBoard", lambda: PlayerComputer(BitBoard, rng)),
+             ("backtracking search, positions only", lambda: index.search_fleet(rng)),
+             ("PlayerComputerWithLogs", logs_fill)]
+    for name, function in cases:
+        speed, failures = rate(function, number)
+        print(f"{name:32} {speed:10.0f} layouts/s, failed: {failures}")
+
+
+def sink_fleet(player, board):
+    """Shoot by computer player until the fleet on the board is killed"""
+
+    while board.lives_left:
+        player.comp_fire(board)
+
+
+def bench_scaling(number: int):
+    """Time of placement and of one shot on boards from 6x6 to 100x100"""
+
+    rng = random.Random(1)
+    print(f"{'board':>8} {'ships':>6} {'placement':>12} {'Board.shoot':>12} {'BitBoard.shoot':>15} "
+          f"{'random AI move':>15} {'heatmap move':>13}")
+    for rules in SCALING_RULES:
+        PlacementIndex.get(rules.size, rules.fleet).random_fleet(rng)   # don't count creation of the index
+        start = time.perf_counter()
+        for _ in range(number):
+            PlayerComputer(Board, rng, rules)
+        placement = (time.perf_counter() - start) / number
+
+        dots = [Dot(x, y) for x in range(rules.size) for y in range(rules.size)]
+        shots = {}
+        for board_class in (Board, BitBoard):
+            seconds = 0.0
+            for _ in range(number):
+                board = PlayerComputer(board_class, rng, rules).board
+                rng.shuffle(dots)
+                start = time.perf_counter()
+                for dot in dots:
+                    try:
+                        board.shoot(dot)
+                    except (ActionWasNotDone, AlreadyShot):
+                        pass
+                seconds += time.perf_counter() - start
+            shots[board_class] = seconds / number / len(dots)
+
+        moves = {}
+        for strategy in (PlayerComputer, PlayerComputerHeatmap):
+            seconds = 0.0
+            amount = 0
+            for _ in range(max(1, number // 5)):
+                player, target = strategy(Board, rng, rules), PlayerComputer(Board, rng, rules)
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    sink_fleet(player, target.board)
+                seconds += time.perf_counter() - start
+                amount += target.board.shots_amount()
+            moves[strategy] = seconds / amount
+
+        print(f"{rules.size:>4}x{rules.size:<3} {rules.ships_amount:>6} {placement * 1e3:>9.2f} ms "
+              f"{shots[Board] * 1e6:>9.2f} us {shots[BitBoard] * 1e6:>12.2f} us "
+              f"{moves[PlayerComputer] * 1e6:>12.1f} us {moves[PlayerComputerHeatmap] * 1e6:>10.1f} us")
+
+
+class NullOutput:
+    """Stdout which throws away everything"""
+
+    def write(self, text):
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+def bench_memory(number: int):
+    """
+    Memory of number boards with fleets alive at once (measured by tracemalloc),
+    and the peak of memory allocated while one turn is played: a shot and printing of the board
+    """
+
+    rng = random.Random(1)
+    index = PlacementIndex.get()
+    fleets = [index.random_fleet(rng) for _ in range(number)]
+    dots = [Dot(x, y) for x in range(index.size) for y in range(index.size)]
+    for board_class in (Board, BitBoard):
+        tracemalloc.start()
+        start = time.perf_counter()
+        boards = []
+        for fleet in fleets:
+            board = board_class(hidden=True)
+            for begin, end in fleet:
+                board.add_ship(Ship(Dot(*begin), Dot(*end)))
+            board.delete_contour()
+            boards.append(board)
+        seconds = time.perf_counter() - start
+        memory = tracemalloc.get_traced_memory()[0]
+
+        # one turn: shot in random dot and printing of the board, the way Game does it;
+        # printed text is thrown away, so the buffer of stdout isn't counted
+        shot_peak = render_peak = 0
+        turns = 0
+        with contextlib.redirect_stdout(NullOutput()):
+            for board in boards[:1000]:
+                for dot in rng.sample(dots, 10):
+                    tracemalloc.reset_peak()
+                    before = tracemalloc.get_traced_memory()[0]
+                    try:
+                        board.shoot(dot)
+                    except (ActionWasNotDone, AlreadyShot):
+                        pass
+                    shot_peak += tracemalloc.get_traced_memory()[1] - before
+                    tracemalloc.reset_peak()
+                    before = tracemalloc.get_traced_memory()[0]
+                    board.show_board()
+                    render_peak += tracemalloc.get_traced_memory()[1] - before
+                    turns += 1
+        tracemalloc.stop()
+        del boards
+        print(f"{board_class.__name__:8} {number} boards: {memory / 2 ** 20:8.1f} MB, "
+              f"{memory / number:6.0f} bytes per board, created in {seconds:.2f} s under tracemalloc; "
+              f"peak allocated per shot {shot_peak / turns:.0f} bytes, per printing {render_peak / turns:.0f} bytes")
+
+
+class CountingOutput:
+    """Stdout which counts calls of write and written bytes, the text is thrown away"""
+
+    def __init__(self):
+        self.writes = 0
+        self.bytes = 0
+
+    def write(self, text):
+        self.writes += 1
+        self.bytes += len(text.encode())
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+def print_board_by_cells(board: Board):
+    """The old way to print the board: print() for every cell"""
+
+    __sep = " | "
+    print(*board.rules.column_labels, sep=__sep, end=__sep + "\n")
+    for i in range(board.rules.size):
+        print(board.rules.line_labels[i], end=__sep)
+        for j in range(board.rules.size):
+            state = board.cell_state(i, j)
+            if board.hidden and state == DotNames.ship:
+                state = DotNames.empty
+            print(board.rules.cell_texts[state], end=__sep)
+        print("")
+
+
+def bench_render(number: int):
+    """
+    Writes, bytes and time of one turn (shot in every board and printing of it) in number games:
+    print() for every cell against the frame of BoardRenderer and against ANSI redraw in place.
+    Before it check that frames are the same as the old output after every shot
+    """
+
+    rng = random.Random(1)
+    for board_class in (Board, BitBoard):
+        for hidden in (False, True):
+            board = PlayerComputer(board_class, rng).board
+            board.hidden = hidden
+            for dot in rng.sample([Dot(x, y) for x in range(6) for y in range(6)], 36):
+                try:
+                    board.shoot(dot)
+                except (ActionWasNotDone, AlreadyShot):
+                    pass
+                old = io.StringIO()
+                with contextlib.redirect_stdout(old):
+                    print_board_by_cells(board)
+                assert board.text() == old.getvalue(), (board_class.__name__, hidden, dot.x, dot.y)
+    print("frames are the same as the output of print() for every cell")
+
+    def show_ansi(board):
+        if board.renderer is None:
+            board.renderer = BoardRenderer(board, ansi=True)
+        board.show_board()
+
+    cases = [("print() for every cell", print_board_by_cells),
+             ("BoardRenderer frame", Board.show_board),
+             ("BoardRenderer ANSI in place", show_ansi)]
+    for name, show in cases:
+        rng = random.Random(1)
+        output = CountingOutput()
+        seconds = 0.0
+        turns = 0
+        for _ in range(number):
+            boards = [PlayerComputer(Board, rng).board, PlayerComputer(Board, rng).board]
+            boards[0].hidden = False
+            dots = [[Dot(x, y) for x in range(6) for y in range(6)] for _ in boards]
+            for board_dots in dots:
+                rng.shuffle(board_dots)
+            while all(board.lives_left for board in boards):
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(output):
+                    for board, board_dots in zip(boards, dots):
+                        try:
+                            board.shoot(board_dots.pop())
+                        except (ActionWasNotDone, AlreadyShot):
+                            pass
+                        show(board)
+                seconds += time.perf_counter() - start
+                turns += 1
+        print(f"{name:28} {output.writes / turns:6.1f} writes, {output.bytes / turns:6.0f} bytes, "
+              f"{seconds / turns * 1e6:6.1f} us per turn")
+
+
+def bench_shots(number: int):
+    """
+    Shots per second of Board.shoot, which raises on hits and repeated shots, against Board.fire,
+    which returns ShotResult; and moves per second of PlayerComputer.comp_shoot against comp_fire.
+    Every case shoots the same dots in the same boards
+    """
+
+    rng = random.Random(1)
+    for board_class in (Board, BitBoard):
+        fleets = [PlacementIndex.get().random_fleet(rng) for _ in range(number)]
+        # random dots with repeats, like shots of the random AI
+        shots = [[Dot(rng.randrange(6), rng.randrange(6)) for _ in range(72)] for _ in range(number)]
+
+        def boards():
+            for fleet in fleets:
+                board = board_class(hidden=True)
+                for begin, end in fleet:
+                    board.add_ship(Ship(Dot(*begin), Dot(*end)))
+                board.delete_contour()
+                yield board
+
+        def by_shoot(board, dots):
+            for dot in dots:
+                try:
+                    board.shoot(dot)
+                except (ActionWasNotDone, AlreadyShot):
+                    pass
+
+        def by_fire(board, dots):
+            for dot in dots:
+                board.fire(dot)
+
+        for name, shoot in (("shoot, exceptions", by_shoot), ("fire, ShotResult", by_fire)):
+            seconds = 0.0
+            for board, dots in zip(boards(), shots):
+                start = time.perf_counter()
+                shoot(board, dots)
+                seconds += time.perf_counter() - start
+            print(f"{board_class.__name__:8} {name:24} {number * 72 / seconds:10.0f} shots/s")
+
+        def by_comp_shoot(player, board):
+            while board.lives_left:
+                try:
+                    player.comp_shoot(board)
+                except (ActionWasNotDone, AlreadyShot):
+                    pass
+
+        for name, sink in (("comp_shoot, exceptions", by_comp_shoot), ("comp_fire, ShotResult", sink_fleet)):
+            player = PlayerComputer(board_class, random.Random(1), transport=NullTransport())
+            seconds = 0.0
+            moves = 0
+            for board in boards():
+                player.reset_targets()
+                start = time.perf_counter()
+                sink(player, board)
+                seconds += time.perf_counter() - start
+                moves += board.shots_amount()
+            print(f"{board_class.__name__:8} {name:24} {moves / seconds:10.0f} moves/s, "
+                  f"{moves / number:.2f} shots to sink the fleet")
+
+
+def bench_records(number: int):
+    """
+    Games per second of the simulation without records and with RecordWriter to a temporary file,
+    size of the file, records per second read one by one and by random numbers
+    """
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "games.bsr")
+        plain = recorded = 0.0
+        for _ in range(3):      # the best of three runs, runs with and without records go in turn
+            if os.path.exists(path):
+                os.remove(path)
+            stats = run_games(HeadlessPlayerComputer, HeadlessPlayerComputer, number, BitBoard, seed=1)
+            plain = max(plain, stats.games_per_second)
+            with RecordWriter(path) as writer:
+                stats = run_games(HeadlessPlayerComputer, HeadlessPlayerComputer, number, BitBoard, seed=1,
+                                  records=writer)
+            recorded = max(recorded, stats.games_per_second)
+        print(f"simulation without records {plain:8.0f} games/s, with records {recorded:8.0f} games/s, "
+              f"{os.path.getsize(path) / number:.1f} bytes per game")
+
+        with RecordReader(path) as reader:
+            start = time.perf_counter()
+            shots = sum(len(record.shots) for record in reader)
+            seconds = time.perf_counter() - start
+            print(f"reading one by one {number / seconds:10.0f} records/s, {shots / number:.2f} shots per game")
+            rng = random.Random(1)
+            numbers = [rng.randrange(number) for _ in range(number)]
+            start = time.perf_counter()
+            for game in numbers:
+                reader[game]
+            print(f"reading by random numbers {number / (time.perf_counter() - start):10.0f} records/s")
+
+
+def bench_replay(number: int):
+    """
+    Time of one recorded game of random AI: the position after all shots applied at once,
+    shots one by one with the check of results, and the game played again from its seed
+    """
+
+    records = []
+    run_games(HeadlessPlayerComputer, HeadlessPlayerComputer, number, BitBoard, seed=1, records=records)
+    shots = sum(len(record.shots) for record in records) / number
+    replays = [Replay(record) for record in records]
+    cases = [("position by BitBoard.apply_shots", lambda replay: replay.boards()),
+             ("position of Board by fire", lambda replay: Replay(replay.record, board_class=Board).boards()),
+             ("shots one by one with check", Replay.check),
+             ("game again from its seed",
+              lambda replay: replay_seed(replay.record, HeadlessPlayerComputer, HeadlessPlayerComputer))]
+    for name, function in cases:
+        start = time.perf_counter()
+        for replay in replays:
+            function(replay)
+        print(f"{name:34} {(time.perf_counter() - start) / number * 1e6:8.1f} us per game of {shots:.1f} shots")
+
+
+def bench_metrics(number: int):
+    """Games per second of the simulation with metrics never enabled, enabled and disabled again"""
+
+    speeds = {"never enabled": 0.0, "enabled": 0.0, "disabled again": 0.0}
+    for _ in range(3):      # the best of three runs
+        for name in speeds:
+            if name == "enabled":
+                METRICS.enable()
+            stats = run_games(HeadlessPlayerComputer, HeadlessPlayerComputer, number, BitBoard, seed=1)
+            METRICS.disable()
+            speeds[name] = max(speeds[name], stats.games_per_second)
+    for name, speed in speeds.items():
+        print(f"metrics {name:16} {speed:8.0f} games/s")
+    print(METRICS.report())
+
+    calls = console_game_metrics()
+    missing = [phase for phase in ("shot", "add_ship", "human_input", "computer_move", "render")
+               if not calls.get(phase)]
+    print(f"console game (python battleship.py --metrics): {sum(calls.values())} calls in phases "
+          f"{', '.join(sorted(calls))}; phases without calls: {', '.join(missing) or 'none'}")
+
+
+def console_game_metrics():
+    """
+    Play the console game by GAME_SCRIPT the way 'python battleship.py --metrics file' does (battleship.py is
+    __main__), without pauses; return {phase: calls} from the written file
+    """
+
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "battleship.py")
+    argv, stdin, pause = sys.argv, sys.stdin, ConsoleTransport.pause
+    random.seed(5)
+    with tempfile.TemporaryDirectory() as directory:
+        output = os.path.join(directory, "metrics.json")
+        sys.argv, sys.stdin = [path, "--metrics", output], io.StringIO(GAME_SCRIPT)
+        ConsoleTransport.pause = ScriptedTransport.pause
+        METRICS.reset()
+        try:
+            with contextlib.redirect_stdout(NullOutput()):
+                runpy.run_path(path, run_name="__main__")
+        finally:
+            sys.argv, sys.stdin, ConsoleTransport.pause = argv, stdin, pause
+            METRICS.disable()
+        with open(output) as file:
+            data = json.load(file)
+    calls = {}
+    for histogram in data["histograms"]:
+        calls[histogram["phase"]] = calls.get(histogram["phase"], 0) + histogram["count"]
+    return calls
+
+
+def bench_targets(number: int):
+    """
+    Shots to sink the fleet and shots in target mode per killed ship (from the first hit of the ship
+    to its kill) of computer strategies in number seeded games on boards 6x6 and 10x10
+    """
+
+    for rules in (Rules(), Rules(10, CLASSIC_FLEET)):
+        for strategy in (PlayerComputer, PlayerComputerHeatmap):
+            rng = random.Random(7)
+            shots = target_shots = kills = 0
+            seconds = 0.0
+            for _ in range(number):
+                board = PlayerComputer(BitBoard, rng, rules, NullTransport()).board
+                player = strategy(BitBoard, rng, rules)
+                player.transport = NullTransport()
+                damaged = False
+                start = time.perf_counter()
+                while board.lives_left:
+                    result = player.comp_fire(board)[0]
+                    shots += 1
+                    if result is ShotResult.hit:
+                        damaged = True
+                    target_shots += damaged or result is ShotResult.kill
+                    if result is ShotResult.kill:
+                        kills += 1
+                        damaged = False
+                seconds += time.perf_counter() - start
+            print(f"{rules.size:>2}x{rules.size:<2} {strategy.__name__:22} {shots / number:7.2f} shots to sink, "
+                  f"{target_shots / kills:6.3f} target shots per kill, {seconds / shots * 1e6:7.1f} us per shot")
+
+
+def dense_fleet(size: int, density: float):
+    """
+    Ships of the classic fleet in turn from the longest, while their area (see PlacementIndex.area_fits)
+    is not more than given part of the area of the board bigger by one line and one column
+    """
+
+    fleet = []
+    area = 0
+    while True:
+        length = CLASSIC_FLEET[len(fleet) % len(CLASSIC_FLEET)]
+        if area + 2 * (length + 1) > density * (size + 1) ** 2:
+            return tuple(fleet)
+        fleet.append(length)
+        area += 2 * (length + 1)
+
+
+def bench_density(number: int):
+    """
+    Mean and worst time of the search of a random fleet, backtracks and restarts per layout
+    on boards 10x10 and 20x20 from sparse to dense fleets; fleets which aren't found are counted
+    """
+
+    for size in (10, 20):
+        for density in (0.3, 0.4, 0.5, 0.6, 0.7, 0.75, 0.8):
+            fleet = dense_fleet(size, density)
+            index = PlacementIndex(size, fleet)
+            rng = random.Random(1)
+            index.search_fleet(rng)     # don't count the lists of contours
+            METRICS.reset()
+            METRICS.enable()
+            times = []
+            failures = 0
+            for _ in range(number):
+                start = time.perf_counter()
+                try:
+                    index.search_fleet(rng)
+                except FleetDoesNotFit:
+                    failures += 1
+                times.append(time.perf_counter() - start)
+            METRICS.disable()
+            backtracks = sum(value for (name, _), value in METRICS.counters.items() if name == "placement_backtracks")
+            restarts = METRICS.counters.get(("placement_restarts", "search"), 0)
+            METRICS.reset()
+            print(f"{size}x{size} density {density:.2f} {len(fleet):4} ships: "
+                  f"mean {sum(times) / number * 1e3:8.2f} ms, worst {max(times) * 1e3:8.2f} ms, "
+                  f"{backtracks / number:7.1f} backtracks, {restarts / number:6.1f} restarts per layout, "
+                  f"not found: {failures}")
+
+
+def board_state(board):
+    """Everything of the board which snapshot must keep: states of dots, ships, counters, the index and the text"""
+
+    size = board.rules.size
+    return ([board.cell_state(x, y) for x in range(size) for y in range(size)],
+            [(ship.lives, [dot.state for dot in ship.all_dots]) for ship in board.ship_list],
+            board.lives_left, dict(board.ships_placed), dict(board.ships_alive),
+            board.available and list(board.available), board.available_position and list(board.available_position),
+            board.last_shot, board.text())
+
+
+def bench_snapshot(number: int):
+    """
+    Snapshot and restore of boards in the middle of the game against copy.deepcopy: time of the copy,
+    time of one tried shot (copy, shot, back to the copy) and memory of number copies.
+    Every restored board is compared with the board before the shots
+    """
+
+    for board_class in (Board, BitBoard):
+        for rules in (Rules(), Rules(10, CLASSIC_FLEET)):
+            rng = random.Random(1)
+            dots = [Dot(x, y) for x in range(rules.size) for y in range(rules.size)]
+            boards = []
+            for game in range(number):
+                board = PlayerComputer(board_class, rng, rules, NullTransport()).board
+                for dot in rng.sample(dots, len(dots) // 2):
+                    board.fire(dot)
+                if game % 2:
+                    board.available_dots()
+                boards.append(board)
+
+            mismatches = 0
+            for board in boards:
+                expected = board_state(board)
+                state = board.snapshot()
+                for dot in rng.sample(dots, len(dots) // 4):
+                    board.fire(dot)
+                board.text()
+                board.restore(state)
+                mismatches += board_state(board) != expected
+
+            shots = [rng.choice(dots) for _ in boards]
+            times = {}
+            start = time.perf_counter()
+            for board in boards:
+                copy.deepcopy(board)
+            times["deepcopy"] = time.perf_counter() - start
+            start = time.perf_counter()
+            for board, dot in zip(boards, shots):
+                copy.deepcopy(board).fire(dot)
+            times["deepcopy, shot"] = time.perf_counter() - start
+            start = time.perf_counter()
+            for board in boards:
+                board.restore(board.snapshot())
+            times["snapshot, restore"] = time.perf_counter() - start
+            start = time.perf_counter()
+            for board, dot in zip(boards, shots):
+                state = board.snapshot()
+                board.fire(dot)
+                board.restore(state)
+            times["snapshot, shot, restore"] = time.perf_counter() - start
+
+            memory = {}
+            for name, make in (("deepcopy", copy.deepcopy), ("snapshot", board_class.snapshot)):
+                tracemalloc.start()
+                copies = [make(board) for board in boards]
+                memory[name] = tracemalloc.get_traced_memory()[0] / number
+                tracemalloc.stop()
+                del copies
+
+            print(f"{board_class.__name__:8} {rules.size:>2}x{rules.size:<2} "
+                  + ", ".join(f"{name} {seconds / number * 1e6:7.1f} us" for name, seconds in times.items())
+                  + f"; {memory['deepcopy']:7.0f} bytes per deepcopy, {memory['snapshot']:5.0f} per snapshot"
+                  + f"; restored boards which differ: {mismatches}")
+
+
+def bench_mcts(number: int):
+    """
+    Shots to sink number random fleets on the 6x6 board by the tree search with budgets of time
+    from interactive to batch ones (every budget starts with the empty table), against PlayerComputer
+    and the heatmap on the same fleets; latency of moves and iterations per move of the search
+    """
+
+    rng = random.Random(5)
+    fleets = [PlacementIndex.get().random_fleet(rng) for _ in range(number)]
+
+    def boards():
+        for fleet in fleets:
+            board = BitBoard(hidden=True)
+            for begin, end in fleet:
+                board.add_ship(Ship(Dot(*begin), Dot(*end)))
+            board.delete_contour()
+            yield board
+
+    cases = [("PlayerComputer", PlayerComputer, None), ("heatmap", PlayerComputerHeatmap, None)]
+    cases += [(f"mcts {budget * 1e3:g} ms", partial(PlayerComputerMCTS, budget=budget), TreeSearch(Rules()))
+              for budget in (0.002, 0.01, 0.05, 0.2)]
+    for name, strategy, search in cases:
+        rng = random.Random(1)
+        shots = 0
+        times = []
+        for board in boards():
+            player = strategy(BitBoard, rng, Rules(), NullTransport())
+            if search is not None:
+                player.search = search
+            while board.lives_left:
+                start = time.perf_counter()
+                player.comp_fire(board)
+                times.append(time.perf_counter() - start)
+                shots += 1
+        times.sort()
+        line = (f"{name:16} {shots / number:6.2f} shots to sink, move mean {sum(times) / len(times) * 1e3:7.2f} ms, "
+                f"p99 {times[int(len(times) * 0.99)] * 1e3:7.2f} ms")
+        if search is not None:
+            line += (f", {search.iterations / len(times):6.0f} iterations per move, "
+                     f"{len(search.table)} positions in the table")
+        print(line)
+
+
+class ScriptedTransport(ConsoleTransport):
+    """Console transport without pauses, for the game which reads stdin replaced by the script"""
+
+    def pause(self, seconds: float):
+        pass
+
+
+# the human's ships, every dot of the board shot in order, and no more games
+GAME_SCRIPT = "A1A3\nB5B6\nD1D2\nF1\nF3\nF5\nD5\n" + "".join(
+    f"{line}{column}\n" for line in "ABCDEF" for column in range(1, 7)) + "NO\n"
+
+
+def suite_fill_board(board_class):
+    """PlayerComputer.fill_board by the fleets table"""
+
+    def run(number):
+        rng = random.Random(1)
+        start = time.perf_counter()
+        for _ in range(number):
+            PlayerComputer(board_class, rng, transport=NullTransport())
+        return number, time.perf_counter() - start
+
+    return run
+
+
+# 10x10 board with the classic fleet and eight more one-decker ships, near the densest fleets which fit
+DENSE_FLEET = CLASSIC_FLEET + (1,) * 8
+
+
+def suite_search(number):
+    """Layouts of the dense fleet found by PlacementIndex.search_fleet"""
+
+    index = PlacementIndex.get(10, DENSE_FLEET)
+    rng = random.Random(1)
+    start = time.perf_counter()
+    for _ in range(number):
+        index.search_fleet(rng)
+    return number, time.perf_counter() - start
+
+
+def search_faults(number: int):
+    """Backtracks and restarts of the search of the dense fleet per layout, counted by METRICS"""
+
+    METRICS.reset()
+    METRICS.enable()
+    try:
+        suite_search(number)
+    finally:
+        METRICS.disable()
+    backtracks = sum(value for (name, _), value in METRICS.counters.items() if name == "placement_backtracks")
+    restarts = METRICS.counters.get(("placement_restarts", "search"), 0)
+    METRICS.reset()
+    return backtracks / number, restarts / number
+
+
+def suite_fleets(number: int):
+    """The same random fleets for every run of add_ship and shoot cases"""
+
+    rng = random.Random(1)
+    index = PlacementIndex.get()
+    return [[Ship(Dot(*begin), Dot(*end)) for begin, end in index.random_fleet(rng)] for _ in range(number)]
+
+
+def suite_add_ship(board_class):
+    """Board.add_ship with add_contour of every ship, then delete_contour"""
+
+    def run(number):
+        fleets = suite_fleets(number)
+        boards = [board_class(hidden=True) for _ in fleets]
+        start = time.perf_counter()
+        for board, fleet in zip(boards, fleets):
+            for ship in fleet:
+                board.add_ship(ship)
+            board.delete_contour()
+        return number * len(fleets[0]), time.perf_counter() - start
+
+    return run
+
+
+def suite_shoot(board_class, path: str):
+    """
+    Board.shoot on the path: "miss" shoots every empty dot, "hit" every dot of ships but the last one,
+    "kill" the last dot of every ship after the other dots are hit. Shots before the path aren't timed
+    """
+
+    def run(number):
+        shots = {"miss": [], "hit": [], "kill": []}
+        boards = []
+        for fleet in suite_fleets(number):
+            board = board_class(hidden=True)
+            for ship in fleet:
+                board.add_ship(ship)
+            board.delete_contour()
+            boards.append(board)
+            ship_dots = {(dot.x, dot.y) for ship in fleet for dot in ship.all_dots}
+            shots["miss"].append([Dot(x, y) for x in range(board.rules.size) for y in range(board.rules.size)
+                                  if (x, y) not in ship_dots])
+            shots["hit"].append([dot for ship in fleet for dot in ship.all_dots[:-1]])
+            shots["kill"].append([ship.all_dots[-1] for ship in fleet])
+
+        amount = 0
+        seconds = 0.0
+        for kind in ("miss", "hit", "kill"):
+            timed = kind == path
+            start = time.perf_counter()
+            for board, dots in zip(boards, shots[kind]):
+                for dot in dots:
+                    try:
+                        board.shoot(dot)
+                    except ActionWasNotDone:
+                        pass
+                amount += len(dots) if timed else 0
+            if timed:
+                seconds = time.perf_counter() - start
+                break
+        return amount, seconds
+
+    return run
+
+
+def suite_show_board(number):
+    """Board.show_board of boards in the middle of the game, printed to stdout which throws the text away"""
+
+    rng = random.Random(1)
+    boards = []
+    for _ in range(number):
+        board = PlayerComputer(Board, rng, transport=NullTransport()).board
+        for dot in rng.sample([Dot(x, y) for x in range(6) for y in range(6)], 18):
+            board.fire(dot)
+        boards.append(board)
+    start = time.perf_counter()
+    for board in boards:
+        board.show_board()
+    return number, time.perf_counter() - start
+
+
+def suite_simulation(board_class):
+    """Headless games of two random AIs"""
+
+    def run(number):
+        stats = run_games(HeadlessPlayerComputer, HeadlessPlayerComputer, number, board_class, seed=1)
+        return number, stats.seconds
+
+    return run
+
+
+def suite_console_game(number):
+    """Game against the computer in the console, stdin is the script, stdout throws the text away"""
+
+    stdin = sys.stdin
+    start = time.perf_counter()
+    try:
+        for game in range(number):
+            sys.stdin = io.StringIO(GAME_SCRIPT)
+            Game(Board, random.Random(game), transport=ScriptedTransport()).start()
+    finally:
+        sys.stdin = stdin
+    return number, time.perf_counter() - start
+
+
+# name -> (function of number which returns (amount of operations, seconds), unit, part of the number)
+SUITE = {"fill_board Board": (suite_fill_board(Board), "layouts/s", 1),
+         "fill_board BitBoard": (suite_fill_board(BitBoard), "layouts/s", 1),
+         "search_fleet dense 10x10": (suite_search, "layouts/s", 0.2),
+         "add_ship Board": (suite_add_ship(Board), "ships/s", 1),
+         "add_ship BitBoard": (suite_add_ship(BitBoard), "ships/s", 1),
+         "shoot miss Board": (suite_shoot(Board, "miss"), "shots/s", 1),
+         "shoot hit Board": (suite_shoot(Board, "hit"), "shots/s", 1),
+         "shoot kill Board": (suite_shoot(Board, "kill"), "shots/s", 1),
+         "shoot miss BitBoard": (suite_shoot(BitBoard, "miss"), "shots/s", 1),
+         "shoot hit BitBoard": (suite_shoot(BitBoard, "hit"), "shots/s", 1),
+         "shoot kill BitBoard": (suite_shoot(BitBoard, "kill"), "shots/s", 1),
+         "show_board": (suite_show_board, "frames/s", 1),
+         "simulation Board": (suite_simulation(Board), "games/s", 1),
+         "simulation BitBoard": (suite_simulation(BitBoard), "games/s", 1),
+         "console game": (suite_console_game, "games/s", 0.1)}
+
+
+def bench_suite(number: int):
+    """
+    Every case of SUITE with fixed seeds, the best of five runs without the garbage collector;
+    stdin is empty and stdout throws the text away, so nothing waits for the player.
+    Return results for --save and --compare
+    """
+
+    PlacementIndex.get().random_fleet()     # don't count creation of the fleets table
+    best = dict.fromkeys(SUITE, 0.0)
+    stdin = sys.stdin
+    sys.stdin = io.StringIO()
+    try:
+        for _ in range(5):      # cases go in turn, so a slow moment of the machine doesn't spoil all runs of one case
+            for name, (function, unit, part) in SUITE.items():
+                random.seed(1)
+                gc.collect()
+                gc.disable()
+                try:
+                    with contextlib.redirect_stdout(NullOutput()):
+                        operations, seconds = function(max(1, int(number * part)))
+                finally:
+                    gc.enable()
+                best[name] = max(best[name], operations / seconds)
+    finally:
+        sys.stdin = stdin
+    results = {}
+    for name, (function, unit, part) in SUITE.items():
+        results[name] = {"value": best[name], "unit": unit, "higher_is_better": True}
+        print(f"{name:32} {best[name]:12.0f} {unit}")
+    for name, value in zip(("search_fleet backtracks", "search_fleet restarts"), search_faults(number // 5)):
+        results[name] = {"value": value, "unit": "per layout", "higher_is_better": False}
+        print(f"{name:32} {value:12.3f} per layout")
+    return results
+
+
+def save_results(path: str, results: dict, number: int):
+    """Write results of the suite to the baseline JSON file"""
+
+    with open(path, "w") as file:
+        json.dump({"python": platform.python_version(), "machine": platform.machine(),
+                   "number": number, "results": results}, file, indent=1)
+
+
+def compare_results(path: str, results: dict, tolerance: float):
+    """
+    Print the change of every result against the baseline file,
+    return names of results which got worse more than the tolerance (part of the baseline value)
+    """
+
+    with open(path) as file:
+        baseline = json.load(file)["results"]
+    worse = []
+    for name, result in results.items():
+        if name not in baseline:
+            print(f"{name:32} new")
+            continue
+        old, new = baseline[name]["value"], result["value"]
+        change = (new - old) / old if old else 0.0
+        if not result["higher_is_better"]:
+            change = -change
+        mark = ""
+        if change < -tolerance:
+            mark = "  WORSE"
+            worse.append(name)
+        elif change > tolerance:
+            mark = "  better"
+        print(f"{name:32} {old:12.3f} -> {new:12.3f} {result['unit']:16} {change:+7.1%}{mark}")
+    return worse
+
+
+BENCHMARKS = {"placement": bench_placement,
+              "scaling": bench_scaling,
+              "memory": bench_memory,
+              "render": bench_render,
+              "shots": bench_shots,
+              "records": bench_records,
+              "replay": bench_replay,
+              "metrics": bench_metrics,
+              "density": bench_density,
+              "targets": bench_targets,
+              "snapshot": bench_snapshot,
+              "mcts": bench_mcts,
+              "suite": bench_suite}
+
+
+def main():
+    """Run chosen benchmark"""
+
+    parser = argparse.ArgumentParser(description="Benchmarks of the game engine")
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS))
+    parser.add_argument("--number", type=int, default=10000)
+    parser.add_argument("--save", default=None, help="write results of the suite to this JSON file")
+    parser.add_argument("--compare", default=None, help="compare results of the suite with this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="allowed part of the change for worse")
+    args = parser.parse_args()
+    if (args.save or args.compare) and args.benchmark != "suite":
+        parser.error("only results of the suite can be saved and compared")
+    results = BENCHMARKS[args.benchmark](args.number)
+    if args.save:
+        save_results(args.save, results, args.number)
+    if args.compare:
+        worse = compare_results(args.compare, results, args.tolerance)
+        if worse:
+            sys.exit(f"worse than the baseline: {', '.join(worse)}")
+
+
+if __name__ == '__main__':
+    main()
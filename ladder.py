@@ -0,0 +1,357 @@
+"""Ladder of computer strategies: matches are played headless, ratings are kept in SQLite and updated after every match.
+Classes: Ladder
+Functions: elo_expected
+           glicko_update
+           play_match
+
+Strategies are the ones of simulation.STRATEGIES, the ladder knows them by names; a strategy added there
+joins the ladder with the initial rating. The next matches are scheduled between the strategies which have
+the fewest games (then the most uncertain ratings), the opponent is the one met the least, then the nearest
+by rating. A match is some games with seeds of the match's seed, so it can be played again the same way.
+
+Every match is saved in one transaction: its games are inserted in a batch, Elo of both strategies
+is updated after every game, Glicko (rating and its deviation) after the whole match as one rating period,
+and the counters of the pair are added to the win matrix, so the matrix is read without scanning the games.
+Rating periods are numbered by matches: the variance of a strategy's rating grows by GLICKO_C² per period
+since its last match, up to the initial deviation, so a rating which wasn't checked for long is uncertain again.
+The match is written as pending before it's played, so an interrupted ladder plays pending matches first
+when it's started again; pending matches of strategies which aren't in STRATEGIES any more are skipped.
+The database is in WAL mode; SQL of the ladder is in constants with parameters,
+so sqlite3 compiles every statement once and keeps it in its cache.
+
+Usage: python ladder.py ladder.db --matches 100 --match-games 20 --workers 4
+       python ladder.py ladder.db --strategies random heatmap mcts --matches 30
+       python ladder.py ladder.db --standings --matrix
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import sqlite3
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+from battleship import DEFAULT_RULES, BitBoard, Rules
+from placement import FleetDoesNotFit, PlacementIndex
+from simulation import STRATEGIES, check_strategies, play_game
+
+ELO_START = 1500.0
+ELO_K = 16.0                # change of Elo by one game at most
+GLICKO_START = (1500.0, 350.0)
+GLICKO_Q = math.log(10) / 400
+GLICKO_C = 11.0             # deviation 50 grows back to the initial 350 in about 1000 periods without games
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS strategies (
+    name TEXT PRIMARY KEY, elo REAL NOT NULL, rating REAL NOT NULL, deviation REAL NOT NULL,
+    games INTEGER NOT NULL DEFAULT 0, wins INTEGER NOT NULL DEFAULT 0, period INTEGER NOT NULL DEFAULT 0);
+CREATE TABLE IF NOT EXISTS matches (
+    id INTEGER PRIMARY KEY, first TEXT NOT NULL, second TEXT NOT NULL, games INTEGER NOT NULL,
+    seed INTEGER NOT NULL, done INTEGER NOT NULL DEFAULT 0);
+CREATE INDEX IF NOT EXISTS pending_matches ON matches (done, id);
+CREATE TABLE IF NOT EXISTS games (
+    match INTEGER NOT NULL, game INTEGER NOT NULL, seed TEXT NOT NULL, winner TEXT NOT NULL, shots INTEGER NOT NULL,
+    PRIMARY KEY (match, game));
+CREATE TABLE IF NOT EXISTS pairs (
+    first TEXT NOT NULL, second TEXT NOT NULL, games INTEGER NOT NULL, wins INTEGER NOT NULL, shots INTEGER NOT NULL,
+    PRIMARY KEY (first, second));
+"""
+SELECT_META = "SELECT value FROM meta WHERE key = ?"
+INSERT_META = "INSERT OR IGNORE INTO meta (key, value) VALUES (?, ?)"
+INSERT_STRATEGY = "INSERT OR IGNORE INTO strategies (name, elo, rating, deviation) VALUES (?, ?, ?, ?)"
+SELECT_STRATEGIES = "SELECT name, elo, rating, deviation, games, wins FROM strategies"
+SELECT_PERIODS = "SELECT name, period FROM strategies"
+UPDATE_STRATEGY = ("UPDATE strategies SET elo = ?, rating = ?, deviation = ?, games = games + ?, wins = wins + ?, "
+                   "period = ? WHERE name = ?")
+# ladders created before rating periods: the period of a strategy is its last saved match
+ADD_PERIOD = "ALTER TABLE strategies ADD COLUMN period INTEGER NOT NULL DEFAULT 0"
+SET_PERIODS = ("UPDATE strategies SET period = (SELECT COALESCE(MAX(id), 0) FROM matches "
+               "WHERE done = 1 AND (first = strategies.name OR second = strategies.name))")
+SELECT_LAST_MATCH = "SELECT COALESCE(MAX(id), 0) FROM matches"
+INSERT_MATCH = "INSERT INTO matches (id, first, second, games, seed) VALUES (?, ?, ?, ?, ?)"
+SELECT_PENDING = "SELECT id, first, second, games, seed FROM matches WHERE done = 0 ORDER BY id"
+FINISH_MATCH = "UPDATE matches SET done = 1 WHERE id = ?"
+INSERT_GAME = "INSERT INTO games (match, game, seed, winner, shots) VALUES (?, ?, ?, ?, ?)"
+UPDATE_PAIR = ("INSERT INTO pairs (first, second, games, wins, shots) VALUES (?, ?, ?, ?, ?) "
+               "ON CONFLICT (first, second) DO UPDATE SET games = games + excluded.games, "
+               "wins = wins + excluded.wins, shots = shots + excluded.shots")
+SELECT_PAIRS = "SELECT first, second, games, wins, shots FROM pairs"
+
+
+def elo_expected(rating: float, other: float):
+    """Expected score of the player with rating against the player with other rating"""
+
+    return 1 / (1 + 10 ** ((other - rating) / 400))
+
+
+def glicko_update(rating: float, deviation: float, results):
+    """
+    New (rating, deviation) by Glicko after the rating period,
+    results are (rating of the opponent, deviation of the opponent, score 1 or 0) of every game of the period
+    """
+
+    if not results:
+        return rating, deviation
+    variance = 0.0
+    change = 0.0
+    for other, other_deviation, score in results:
+        g = 1 / math.sqrt(1 + 3 * (GLICKO_Q * other_deviation / math.pi) ** 2)
+        expected = 1 / (1 + 10 ** (-g * (rating - other) / 400))
+        variance += g * g * expected * (1 - expected)
+        change += g * (score - expected)
+    precision = 1 / deviation ** 2 + GLICKO_Q ** 2 * variance
+    return rating + GLICKO_Q / precision * change, math.sqrt(1 / precision)
+
+
+def glicko_inflate(deviation: float, periods: int):
+    """Deviation of the rating after given amount of rating periods without games, the initial one at most"""
+
+    return min(math.sqrt(deviation ** 2 + GLICKO_C ** 2 * periods), GLICKO_START[1])
+
+
+def play_match(first: str, second: str, games: int, seed: int, size: int, fleet):
+    """
+    Play the match of strategies by their names in the worker process, return (seed of the game, winner's name,
+    winner's shots) of every game. Every game gets its own seed from the seed of the match, like in run_games
+    """
+
+    rules = Rules(size, fleet)
+    strategies = (STRATEGIES[first], STRATEGIES[second])
+    rng = random.Random(seed)
+    results = []
+    for _ in range(games):
+        game_seed = rng.getrandbits(64)
+        winner, shots = play_game(*strategies, BitBoard, random.Random(game_seed), rules)
+        results.append((game_seed, (first, second)[winner], shots))
+    return results
+
+
+class Ladder:
+    """Ratings of strategies, matches and their games in the SQLite database"""
+
+    def __init__(self, path: str, rules=DEFAULT_RULES, seed=0):
+        """
+        Open the ladder, create it with given rules and seed if the database is new;
+        the ladder keeps its rules and seed, others are ignored then
+        """
+
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA synchronous = NORMAL")     # WAL keeps the database whole with it
+        with self.connection:
+            self.connection.executescript(SCHEMA)
+            if "period" not in {column[1] for column in self.connection.execute("PRAGMA table_info(strategies)")}:
+                self.connection.execute(ADD_PERIOD)
+                self.connection.execute(SET_PERIODS)
+            self.connection.executemany(INSERT_META, [("size", str(rules.size)),
+                                                      ("fleet", json.dumps(list(rules.fleet))),
+                                                      ("seed", str(seed))])
+        self.rules = Rules(int(self.meta("size")), json.loads(self.meta("fleet")))
+        self.seed = int(self.meta("seed"))
+
+    def meta(self, key: str):
+        """Value of the ladder's setting"""
+
+        return self.connection.execute(SELECT_META, (key,)).fetchone()[0]
+
+    def close(self):
+        self.connection.close()
+
+    def register(self, names):
+        """Add strategies which aren't in the ladder yet with initial ratings"""
+
+        with self.connection:
+            self.connection.executemany(INSERT_STRATEGY, [(name, ELO_START, *GLICKO_START) for name in names])
+
+    def standings(self):
+        """{name: (elo, rating, deviation, games, wins)} of all strategies of the ladder"""
+
+        return {name: rest for name, *rest in self.connection.execute(SELECT_STRATEGIES)}
+
+    def matrix(self):
+        """{(first, second): (games, wins of first, shots of first's wins)}, every pair is there in both orders"""
+
+        return {(first, second): rest for first, second, *rest in self.connection.execute(SELECT_PAIRS)}
+
+    def pending(self):
+        """(id, first, second, games, seed) of matches which are scheduled but not saved"""
+
+        return self.connection.execute(SELECT_PENDING).fetchall()
+
+    def schedule(self, names, amount: int, games: int):
+        """
+        Write amount of new matches of given strategies as pending, return them like pending().
+        The first strategy of the match has the fewest games and then the biggest deviation,
+        the second one has the fewest games with it and then the nearest rating.
+        Scheduled games are counted at once, so the matches of one call are different
+        """
+
+        standings = self.standings()
+        played = {name: standings[name][3] for name in names}
+        met = {pair: rest[0] for pair, rest in self.matrix().items()}
+        last = self.connection.execute(SELECT_LAST_MATCH).fetchone()[0]
+        matches = []
+        for number in range(last + 1, last + amount + 1):
+            first = min(names, key=lambda name: (played[name], -standings[name][2], name))
+            second = min((name for name in names if name != first),
+                         key=lambda name: (met.get((first, name), 0), abs(standings[name][1] - standings[first][1]),
+                                           name))
+            seed = random.Random(f"{self.seed}:{number}").getrandbits(63)
+            matches.append((number, first, second, games, seed))
+            played[first] += games
+            played[second] += games
+            for pair in ((first, second), (second, first)):
+                met[pair] = met.get(pair, 0) + games
+        with self.connection:
+            self.connection.executemany(INSERT_MATCH, matches)
+        return matches
+
+    def save(self, match, results):
+        """
+        Save games of the played match (see play_match) and update ratings of both strategies and their pair.
+        It's one transaction, so an interrupted ladder has either the whole match or the pending one
+        """
+
+        number, first, second, _, _ = match
+        standings = self.standings()
+        periods = dict(self.connection.execute(SELECT_PERIODS).fetchall())
+        deviations = {name: glicko_inflate(standings[name][2], number - periods[name]) for name in (first, second)}
+        elo = {first: standings[first][0], second: standings[second][0]}
+        wins = {first: 0, second: 0}
+        shots = {first: 0, second: 0}
+        for _, winner, winner_shots in results:
+            loser = second if winner == first else first
+            change = ELO_K * (1 - elo_expected(elo[winner], elo[loser]))
+            elo[winner] += change
+            elo[loser] -= change
+            wins[winner] += 1
+            shots[winner] += winner_shots
+
+        rows = []
+        for name, other in ((first, second), (second, first)):
+            period = [(standings[other][1], deviations[other], winner == name) for _, winner, _ in results]
+            rating, deviation = glicko_update(standings[name][1], deviations[name], period)
+            rows.append((elo[name], rating, deviation, len(results), wins[name], number, name))
+        with self.connection:
+            self.connection.executemany(INSERT_GAME, [(number, game, str(seed), winner, winner_shots)
+                                                      for game, (seed, winner, winner_shots) in enumerate(results)])
+            self.connection.executemany(UPDATE_STRATEGY, rows)
+            self.connection.executemany(UPDATE_PAIR, [(first, second, len(results), wins[first], shots[first]),
+                                                      (second, first, len(results), wins[second], shots[second])])
+            self.connection.execute(FINISH_MATCH, (number,))
+
+    def run(self, names, matches: int, games=20, workers=1, report=None):
+        """
+        Play pending matches and then new ones until given amount of matches is saved, return the amount.
+        With workers matches are played in so many processes, a round has a match for every worker.
+        report(match, results) is called after every saved match
+        """
+
+        names = sorted(names)
+        if len(names) < 2:
+            raise ValueError("The ladder needs two strategies at least")
+        self.register(names)
+        size, fleet = self.rules.size, tuple(self.rules.fleet)
+        saved = 0
+        skipped = set()     # pending matches of strategies removed from STRATEGIES, they stay pending
+        for number, first, second, _, _ in self.pending():
+            missing = [name for name in (first, second) if name not in STRATEGIES]
+            if missing:
+                warnings.warn(f"Pending match {number} of {first} and {second} is skipped: "
+                              f"{' and '.join(missing)} isn't in STRATEGIES")
+                skipped.add(number)
+        executor = ProcessPoolExecutor(workers) if workers > 1 else None
+        try:
+            while saved < matches:
+                # pending matches of other strategies are played too, they are in the ladder already
+                pending = [match for match in self.pending() if match[0] not in skipped]
+                round_matches = pending[:matches - saved] or self.schedule(names, min(workers, matches - saved), games)
+                if executor is None:
+                    played = [play_match(*match[1:], size, fleet) for match in round_matches]
+                else:
+                    played = list(executor.map(play_match, *zip(*(match[1:] for match in round_matches)),
+                                               [size] * len(round_matches), [fleet] * len(round_matches)))
+                for match, results in zip(round_matches, played):
+                    self.save(match, results)
+                    saved += 1
+                    if report is not None:
+                        report(match, results)
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+        return saved
+
+    def standings_text(self):
+        """Table of strategies by Glicko rating"""
+
+        lines = [f"{'strategy':12} {'elo':>7} {'glicko':>7} {'rd':>6} {'games':>7} {'wins':>7}"]
+        for name, (elo, rating, deviation, games, wins) in sorted(self.standings().items(),
+                                                                  key=lambda item: -item[1][1]):
+            lines.append(f"{name:12} {elo:7.0f} {rating:7.0f} {deviation:6.1f} {games:7} "
+                         f"{wins / games if games else 0:7.1%}")
+        return "\n".join(lines)
+
+    def matrix_text(self):
+        """Win rates of strategies of rows against strategies of columns"""
+
+        matrix = self.matrix()
+        names = sorted(self.standings())
+        lines = [" " * 12 + "".join(f"{name:>12}" for name in names)]
+        for first in names:
+            cells = []
+            for second in names:
+                games, wins, _ = matrix.get((first, second), (0, 0, 0))
+                cells.append(f"{wins / games:12.1%}" if games else f"{'-':>12}")
+            lines.append(f"{first:12}" + "".join(cells))
+        return "\n".join(lines)
+
+
+def main():
+    """Run the ladder from command line and print its standings"""
+
+    parser = argparse.ArgumentParser(description="Ratings of computer strategies by matches between them")
+    parser.add_argument("database")
+    parser.add_argument("--strategies", nargs="+", choices=sorted(STRATEGIES), default=sorted(STRATEGIES))
+    parser.add_argument("--matches", type=int, default=0, help="matches to play, pending ones are played first")
+    parser.add_argument("--match-games", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=1, help="0 for all cores")
+    parser.add_argument("--seed", type=int, default=0, help="seed of a new ladder")
+    parser.add_argument("--size", type=int, default=DEFAULT_RULES.size, help="size of a new ladder's board")
+    parser.add_argument("--fleet", type=int, nargs="+", default=DEFAULT_RULES.fleet, help="lengths of ships")
+    parser.add_argument("--standings", action="store_true", help="print ratings of strategies")
+    parser.add_argument("--matrix", action="store_true", help="print win rates of every pair")
+    args = parser.parse_args()
+
+    ladder = Ladder(args.database, Rules(args.size, args.fleet), args.seed)
+    try:
+        try:
+            PlacementIndex.get(ladder.rules.size, ladder.rules.fleet).random_fleet()
+            check_strategies([STRATEGIES[name] for name in args.strategies], ladder.rules)
+        except (FleetDoesNotFit, ValueError) as error:
+            parser.error(str(error))
+
+        def report(match, results):
+            number, first, second, _, _ = match
+            wins = sum(winner == first for _, winner, _ in results)
+            print(f"match {number}: {first} {wins}:{len(results) - wins} {second}")
+
+        if args.matches:
+            try:
+                ladder.run(args.strategies, args.matches, args.match_games, args.workers or os.cpu_count(), report)
+            except ValueError as error:
+                parser.error(str(error))
+            except KeyboardInterrupt:
+                print("Stopped, pending matches are played when the ladder is run again")
+        if args.standings or args.matches:
+            print(ladder.standings_text())
+        if args.matrix:
+            print(ladder.matrix_text())
+    finally:
+        ladder.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+"""Load test of the server: many simulated players play with the computer or with each other at once.
+Functions: fleet_lines
+           play
+           run
+           free_port
+           start_server
+
+Every simulated player places a random legal fleet and shoots in all dots in random order.
+With --humans part of players choose HUMAN and the server pairs them in the lobby, others play with the computer.
+The latency of the move is the time from sending the shot to the next question of the server,
+so it includes the computer's answer when the player misses. The next question after the miss
+in the match of humans waits for the opponent's move, so only moves answered at once (hits) count there.
+Players think before every move random time from 0 to 2 * think seconds; with --think 0
+they shoot as fast as they can, then the test shows the limit of the server.
+The server is started on --host in other process with --pace 0, or the running one is used with --port.
+
+Usage: python loadtest.py --players 1000 5000 10000 --think 5 [--humans 0.5]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+
+from battleship import DEFAULT_RULES, Rules
+from placement import PlacementIndex
+from server import PROMPT, raise_open_files_limit
+
+
+def fleet_lines(rules: Rules, rng):
+    """Lines which place random legal fleet, like 'A1C1'"""
+
+    def name(x, y):
+        return f"{Rules.line_name(x)}{y + 1}"
+
+    return [name(*begin) + name(*end) for begin, end in PlacementIndex.get(rules.size, rules.fleet).random_fleet(rng)]
+
+
+async def play(host: str, port: int, rules: Rules, rng, latencies: list, connecting, think=0.0, human=False):
+    """
+    One simulated player: one game with the computer, or with other human if human,
+    latencies of moves are added to the list
+    """
+
+    prompt = PROMPT.encode()
+    async with connecting:
+        reader, writer = await asyncio.open_connection(host, port)
+
+    async def answer(line: str):
+        writer.write(line.encode() + b"\n")
+        await writer.drain()
+        return (await reader.readuntil(prompt)).decode()
+
+    await reader.readuntil(prompt)
+    await answer("HUMAN" if human else "COMPUTER")     # the human waits here for other one
+    for line in fleet_lines(rules, rng):
+        await answer(line)
+
+    dots = [f"{Rules.line_name(x)}{y + 1}" for x in range(rules.size) for y in range(rules.size)]
+    rng.shuffle(dots)
+    for dot in dots:
+        if think:
+            await asyncio.sleep(rng.uniform(0, 2 * think))
+        start = time.perf_counter()
+        text = await answer(dot)
+        if not human or "Your opponent shot" not in text:
+            latencies.append(time.perf_counter() - start)
+        if "one more time" in text:
+            break
+    writer.write(b"NO\n")
+    await writer.drain()
+    writer.close()
+
+
+async def run(players: int, host: str, port: int, rules: Rules, seed: int, think=0.0, humans=0.0):
+    """
+    Play all players at once, humans is the part of them which play with each other (rounded down to pairs).
+    Return ({"COMPUTER" or "HUMAN": latencies of moves}, seconds)
+    """
+
+    rng = random.Random(seed)
+    pairs = int(players * humans) // 2
+    latencies = {"COMPUTER": [], "HUMAN": []}
+    connecting = asyncio.Semaphore(200)     # don't overflow the backlog of the server
+    start = time.perf_counter()
+    results = await asyncio.gather(*[play(host, port, rules, random.Random(rng.getrandbits(64)),
+                                          latencies["HUMAN" if number < 2 * pairs else "COMPUTER"],
+                                          connecting, think, human=number < 2 * pairs)
+                                     for number in range(players)], return_exceptions=True)
+    seconds = time.perf_counter() - start
+    errors = [result for result in results if isinstance(result, BaseException)]
+    if errors:
+        print(f"{len(errors)} players failed, first error: {errors[0]!r}")
+    return latencies, seconds
+
+
+def free_port(host: str):
+    """Number of the port of the host which nobody listens now"""
+
+    with socket.socket() as probe:
+        probe.bind((host, 0))
+        return probe.getsockname()[1]
+
+
+def start_server(host: str, port: int):
+    """Start the server without pauses in other process, wait until it accepts players"""
+
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "server.py")
+    process = subprocess.Popen([sys.executable, path, "--host", host, "--port", str(port), "--pace", "0"],
+                               stdout=subprocess.DEVNULL)
+    for _ in range(100):
+        try:
+            socket.create_connection((host, port)).close()
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("Server didn't start")
+
+
+def main():
+    """Run the load test for every amount of players, print percentiles of latency"""
+
+    parser = argparse.ArgumentParser(description="Load test of the Battleship server")
+    parser.add_argument("--players", type=int, nargs="+", default=[1000, 5000, 10000])
+    parser.add_argument("--host", default="localhost", help="host of the server, the started one listens on it")
+    parser.add_argument("--port", type=int, default=None, help="port of running server, else start one")
+    parser.add_argument("--humans", type=float, default=0.0, help="part of players which play with each other")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--think", type=float, default=0.0, help="mean pause of the player before the move, seconds")
+    args = parser.parse_args()
+
+    raise_open_files_limit()
+    PlacementIndex.get(DEFAULT_RULES.size, DEFAULT_RULES.fleet).random_fleet()
+    process = None
+    port = args.port
+    if port is None:
+        port = free_port(args.host)
+        process = start_server(args.host, port)
+    try:
+        for players in args.players:
+            modes, seconds = asyncio.run(run(players, args.host, port, DEFAULT_RULES, args.seed, args.think,
+                                             args.humans))
+            for mode, latencies in modes.items():
+                latencies.sort()
+                if not latencies:
+                    continue
+                print(f"{players:6} players, {mode:8}: {len(latencies)} moves in {seconds:.1f} s, "
+                      f"{len(latencies) / seconds:.0f} moves/s, "
+                      f"latency p50 {latencies[len(latencies) // 2] * 1000:.1f} ms, "
+                      f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f} ms")
+    finally:
+        if process is not None:
+            process.terminate()
+
+
+if __name__ == '__main__':
+    main()
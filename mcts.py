@@ -0,0 +1,452 @@
+"""Computer strategy which chooses every shot by Monte Carlo tree search in a budget of time.
+Classes: TranspositionTable
+         TreeSearch
+         PlayerComputerMCTS(PlayerComputer)
+Functions: search_worker
+
+The player knows only the observation grid of the opponent's board (Board.observation) and its ships afloat.
+Every move it samples fleets which can be there (determinizations), makes BitBoards with them and takes
+their snapshots. Then iterations go until the time is over: one of the boards is restored, shots go down
+the tree by UCB among the best candidate dots of every position, the first new shot is played out
+by the hunt and target of PlayerComputer, and the amount of shots to sink the fleet goes back up the path.
+Positions are keyed by the Zobrist hash of shots with their results (XOR of random keys of (dot, result)),
+so the same shots in other order are the same position. The statistics of a position depend only on
+what is seen, so the table keeps them for later moves and games; its size is bounded,
+the least recently used position is dropped. With workers, other processes search the same move
+with their own tables, and what they found at the root is added to the table of the player.
+
+Usage: python mcts.py --budget 0.1 --games 20
+       python mcts.py --budget 1 --games 200 --workers 4
+       python mcts.py --play --budget 0.3
+"""
+
+import argparse
+import random
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from math import log, sqrt
+
+from battleship import (DEFAULT_RULES, SEEN_CONTOUR, SEEN_HIT, SEEN_KILLED, SEEN_UNKNOWN, BitBoard, Board, Dot, Game,
+                        PlayerComputer, Rules, ShotResult)
+from placement import PlacementIndex
+from records import fleet_board, fleet_ships
+from transport import NullTransport
+
+RESULT_KEYS = {ShotResult.miss: 0, ShotResult.hit: 1, ShotResult.kill: 2}     # place of the key among keys of the dot
+
+
+class TranspositionTable:
+    """
+    Entries of positions by their Zobrist hash, at most capacity of them:
+    the least recently used one is dropped when the new one doesn't fit
+    """
+
+    def __init__(self, capacity=50000):
+        """Empty table"""
+
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key: int):
+        """Return the entry of the position, None if there is no one; the entry becomes the most recently used"""
+
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key: int, entry: list):
+        """Add the entry of the position, drop the least recently used one if the table is full"""
+
+        self.entries[key] = entry
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+
+class TreeSearch:
+    """
+    Search of the shot in the opponent's board with given rules. The entry of the position in the table is
+    [visits, candidate dots best first, visits of every candidate, sum of rewards of every candidate],
+    the reward of the iteration is 1 - shots to sink the fleet / dots of the board
+    """
+
+    _cache = {}
+
+    def __init__(self, rules=DEFAULT_RULES, determinizations=16, width=8, exploration=0.05, capacity=50000):
+        """
+        Search with the empty table: determinizations are boards sampled every move, width is the amount
+        of candidate dots of the position, exploration is the constant of UCB
+        """
+
+        self.rules = rules
+        self.size = rules.size
+        self.index = PlacementIndex.get(rules.size, rules.fleet)
+        self.determinizations = determinizations
+        self.width = width
+        self.exploration = exploration
+        self.table = TranspositionTable(capacity)
+        # keys are the same in every process, so hashes of positions are the same too
+        keys = random.Random(repr(rules))
+        self.keys = [tuple(keys.getrandbits(64) for _ in RESULT_KEYS) for _ in range(self.size * self.size)]
+        self.player = PlayerComputer(BitBoard, random.Random(0), rules, NullTransport())    # plays positions out
+        self.iterations = 0
+
+    @classmethod
+    def get(cls, rules=DEFAULT_RULES):
+        """Return the search for given rules, its table is kept for all players of the process"""
+
+        if rules not in cls._cache:
+            cls._cache[rules] = cls(rules)
+        return cls._cache[rules]
+
+    def key(self, position: int, number: int, result: ShotResult):
+        """Hash of the position after the shot in the dot with given number"""
+
+        return position ^ self.keys[number][RESULT_KEYS[result]]
+
+    def sample_fleet(self, hits: int, killed: int, empty: int, afloat: dict, rng, tries=20):
+        """
+        Mask of a random fleet which can be on the board: killed ships where they are, a ship afloat through
+        every damaged part, other ships afloat where they fit; ships don't cover empty dots (shot or contour).
+        Ships are placed in turn without backtracking, None if no fleet is found in given tries
+        """
+
+        parts = []
+        for (x, y), (end_x, end_y) in fleet_ships(hits, self.size):
+            parts.append(sum(1 << (i * self.size + j) for i in range(x, end_x + 1) for j in range(y, end_y + 1)))
+        masks = {length: self.index.masks(length) for length in afloat}
+        exclusions = {length: self.index.exclusions(length) for length in afloat}
+        for _ in range(tries):
+            lengths = sorted((length for length, amount in afloat.items() for _ in range(amount)), reverse=True)
+            fleet = killed
+            blocked = empty | killed
+            for part in rng.sample(parts, len(parts)):
+                if fleet & part:
+                    continue        # the ship of other part goes through this one too
+                first = (part & -part).bit_length() - 1
+                options = [(length, mask, exclusion) for length in set(lengths)
+                           for position in self.index.covering[length][first]
+                           for mask, exclusion in [(masks[length][position], exclusions[length][position])]
+                           if mask & part == part and mask & ~hits and not mask & blocked
+                           and not exclusion & hits & ~mask]
+                if not options:
+                    break
+                length, mask, exclusion = rng.choice(options)
+                lengths.remove(length)
+                fleet |= mask
+                blocked |= exclusion
+            else:
+                for length in lengths:
+                    options = [(mask, exclusion) for mask, exclusion in zip(masks[length], exclusions[length])
+                               if not mask & (blocked | hits)]
+                    if not options:
+                        break
+                    mask, exclusion = rng.choice(options)
+                    fleet |= mask
+                    blocked |= exclusion
+                else:
+                    return fleet
+        return None
+
+    def determinize(self, seen, afloat: dict, rng):
+        """Return (board, its snapshot) of every sampled fleet, shots of the observation seen are made in boards"""
+
+        hits = killed = empty = 0
+        shots = []
+        for number, code in enumerate(seen):
+            if code == SEEN_UNKNOWN:
+                continue
+            if code == SEEN_HIT:
+                hits |= 1 << number
+            elif code == SEEN_KILLED:
+                killed |= 1 << number
+            else:
+                empty |= 1 << number        # miss or contour
+            if code != SEEN_CONTOUR:
+                shots.append(number)
+        boards = []
+        for _ in range(self.determinizations):
+            fleet = self.sample_fleet(hits, killed, empty, afloat, rng)
+            if fleet is None:
+                continue
+            board = fleet_board(fleet_ships(fleet, self.size), self.rules, BitBoard)
+            board.apply_shots(shots)
+            board.available_dots()
+            boards.append((board, board.snapshot()))
+        return boards
+
+    def load_targets(self, board: BitBoard):
+        """Make the player see damaged ships and ships afloat of the board"""
+
+        player = self.player
+        player.afloat = dict(board.ships_alive)
+        player.target = []
+        damaged = board.hits & ~board.killed
+        while damaged:
+            bit = damaged & -damaged
+            player.target.append(divmod(bit.bit_length() - 1, self.size))
+            damaged ^= bit
+
+    def hunt_scores(self, board: BitBoard, afloat: dict):
+        """Amount of positions of ships afloat through every dot, positions are in dots not shot and not contour"""
+
+        taken = board.hits | board.misses | board.contour
+        scores = {}
+        for length, amount in afloat.items():
+            if not amount:
+                continue
+            for mask, dots in zip(self.index.masks(length), self.index.dots[length]):
+                if not mask & taken:
+                    for number in dots:
+                        scores[number] = scores.get(number, 0) + amount
+        return scores
+
+    def candidates(self, board: BitBoard):
+        """Numbers of dots to try in the position of the board, best first, at most width of them"""
+
+        self.load_targets(board)
+        player = self.player
+        scores = {}
+        if player.target:
+            scores = {x * self.size + y: score for (x, y), score in player.target_scores(board).items()}
+        if not scores:
+            scores = self.hunt_scores(board, player.afloat) or dict.fromkeys(board.available_dots(), 1)
+        return sorted(scores, key=scores.get, reverse=True)[:self.width]
+
+    def select(self, entry: list):
+        """Place of the candidate to shoot: the first one not tried yet, else the best by UCB"""
+
+        visits, candidates, counts, rewards = entry
+        if 0 in counts:
+            return counts.index(0)
+        scale = self.exploration * sqrt(log(visits))
+        return max(range(len(candidates)), key=lambda i: rewards[i] / counts[i] + scale / sqrt(counts[i]))
+
+    def play_out(self, board: BitBoard):
+        """Shots of the hunt and target of PlayerComputer until the fleet of the board is killed, return their amount"""
+
+        self.load_targets(board)
+        shots = 0
+        while board.lives_left:
+            self.player.comp_fire(board)
+            shots += 1
+        return shots
+
+    def iterate(self, board: BitBoard, state: tuple, position: int):
+        """One iteration from the position on the board restored from the state"""
+
+        board.restore(state)
+        path = []
+        shots = 0
+        while board.lives_left:
+            entry = self.table.get(position)
+            if entry is None:
+                candidates = self.candidates(board)
+                entry = [0, candidates, [0] * len(candidates), [0.0] * len(candidates)]
+                self.table.put(position, entry)
+            i = self.select(entry)
+            number = entry[1][i]
+            result = board.fire(Dot(*divmod(number, self.size)))[0]
+            shots += 1
+            path.append((entry, i))
+            if not entry[2][i]:
+                break
+            position = self.key(position, number, result)
+        shots += self.play_out(board)
+        reward = 1 - shots / (self.size * self.size)
+        for entry, i in path:
+            entry[0] += 1
+            entry[2][i] += 1
+            entry[3][i] += reward
+
+    def search(self, seen, afloat: dict, position: int, rng, seconds=None, iterations=None):
+        """
+        Iterations from the position (hash of its shots) with the observation seen and ships afloat, for given
+        seconds or given amount of iterations. Return what they added to the root: {dot: (visits, rewards)}
+        """
+
+        deadline = time.perf_counter() + (seconds or 0)
+        self.player.rng = rng
+        boards = self.determinize(seen, afloat, rng)
+        entry = self.table.get(position)
+        before = dict(zip(entry[1], zip(entry[2], entry[3]))) if entry else {}
+        done = 0
+        while boards and (done < iterations if iterations is not None
+                          else not done or time.perf_counter() < deadline):
+            board, state = boards[done % len(boards)]
+            self.iterate(board, state, position)
+            done += 1
+        self.iterations += done
+        entry = self.table.get(position)
+        if entry is None:
+            return {}
+        return {number: (count - before.get(number, (0, 0.0))[0], reward - before.get(number, (0, 0.0))[1])
+                for number, count, reward in zip(entry[1], entry[2], entry[3])}
+
+    def merge(self, position: int, stats: dict):
+        """Add statistics of the root found by other search to the entry of the position"""
+
+        entry = self.table.get(position)
+        if entry is None:
+            entry = [0, list(stats), [0] * len(stats), [0.0] * len(stats)]
+            self.table.put(position, entry)
+        for number, (count, reward) in stats.items():
+            if number in entry[1]:
+                i = entry[1].index(number)
+                entry[0] += count
+                entry[2][i] += count
+                entry[3][i] += reward
+
+
+def search_worker(rules: Rules, seen: bytes, afloat: dict, position: int, seed: int, seconds=None, iterations=None):
+    """Search of the move in the worker process, see TreeSearch.search; the table of the process stays for next moves"""
+
+    return TreeSearch.get(rules).search(seen, afloat, position, random.Random(seed), seconds, iterations)
+
+
+class PlayerComputerMCTS(PlayerComputer):
+    """
+    Computer player which chooses every shot by the tree search in budget seconds, or by given amount of iterations.
+    The search of the rules is shared by all players of the process if shared, else the player has its own one
+    with the empty table (with iterations and without sharing games with the same seed are the same).
+    With workers the move is searched by so many processes at once
+    """
+
+    def __init__(self, board_class=Board, rng=random, rules=DEFAULT_RULES, transport=None,
+                 budget=0.05, iterations=None, workers=1, shared=True):
+        """Create the board with ships and take the search"""
+
+        super().__init__(board_class, rng, rules, transport)
+        self.budget = budget
+        self.iterations = iterations
+        self.workers = workers
+        self.search = TreeSearch.get(rules) if shared else TreeSearch(rules)
+        self.executor = None
+        self.move_times = []        # seconds of every move
+
+    def reset_targets(self):
+        """Forget the opponent's board, the position is the board without shots"""
+
+        super().reset_targets()
+        self.position = 0       # Zobrist hash of shots in the opponent's board
+
+    def comp_fire(self, board: Board):
+        """Shoot in the dot the search found, return (ShotResult, ship)"""
+
+        start = time.perf_counter()
+        number = self.choose_target(board)
+        self.move_times.append(time.perf_counter() - start)
+        if number is not None:
+            dot = Dot(*divmod(number, self.rules.size))
+        else:
+            dot = self.target_dot(board) if self.target else None
+            if dot is None:
+                dot = Dot(*board.random_available(self.rng))
+
+        result = board.fire(dot)         # SHOOT
+        self.observe(board, dot, result[0])
+        if result[0] is not ShotResult.miss:
+            self.comp_hit_the_target(board)
+        return result
+
+    def observe(self, board: Board, dot: Dot, result: ShotResult):
+        """Learn the result of the shot like PlayerComputer, the position gets the key of the shot"""
+
+        super().observe(board, dot, result)
+        if result is not ShotResult.already:
+            self.position = self.search.key(self.position, dot.x * self.rules.size + dot.y, result)
+
+    def choose_target(self, board: Board):
+        """Number of the dot which the search tried most, None if no fleet could be sampled"""
+
+        seen = bytes(board.observation)
+        futures = []
+        if self.workers > 1:
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(self.workers - 1)
+            futures = [self.executor.submit(search_worker, self.rules, seen, self.afloat, self.position,
+                                            self.rng.getrandbits(64), self.budget, self.iterations)
+                       for _ in range(self.workers - 1)]
+        self.search.search(seen, self.afloat, self.position, self.rng, self.budget, self.iterations)
+        for future in futures:
+            self.search.merge(self.position, future.result())
+
+        entry = self.search.table.get(self.position)
+        if entry is None or not entry[0]:
+            return None
+        _, candidates, counts, rewards = entry
+        best = max(range(len(candidates)), key=lambda i: (counts[i], rewards[i] / max(counts[i], 1)))
+        return candidates[best]
+
+    def close(self):
+        """Stop worker processes, the game calls it when it's over"""
+
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def latency_report(self):
+        """Mean, 99th percentile and max time of one move in milliseconds"""
+
+        if not self.move_times:
+            return "no moves"
+        times = sorted(self.move_times)
+        return (f"move latency: mean {1000 * sum(times) / len(times):.1f} ms, "
+                f"p99 {1000 * times[min(len(times) - 1, int(len(times) * 0.99))]:.1f} ms, "
+                f"max {1000 * times[-1]:.1f} ms")
+
+
+def main():
+    """Sink random fleets by the search and print shots and latency of moves, or play with the human"""
+
+    parser = argparse.ArgumentParser(description="Monte Carlo tree search player")
+    parser.add_argument("--budget", type=float, default=0.1, help="seconds of the search of one move")
+    parser.add_argument("--iterations", type=int, default=None, help="iterations of one move instead of the budget")
+    parser.add_argument("--workers", type=int, default=1, help="processes which search every move")
+    parser.add_argument("--games", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--size", type=int, default=DEFAULT_RULES.size)
+    parser.add_argument("--fleet", type=int, nargs="+", default=list(DEFAULT_RULES.fleet))
+    parser.add_argument("--play", action="store_true", help="play with the search in the console")
+    args = parser.parse_args()
+
+    rules = Rules(args.size, args.fleet)
+    rng = random.Random(args.seed)
+    computer_class = partial(PlayerComputerMCTS, budget=args.budget, iterations=args.iterations,
+                             workers=args.workers)
+    if args.play:
+        Game(rng=rng, rules=rules, computer_class=computer_class).start()
+        return
+
+    player = computer_class(BitBoard, rng, rules, NullTransport())
+    shots = 0
+    try:
+        for _ in range(args.games):
+            board = PlayerComputer(BitBoard, rng, rules, NullTransport()).board
+            player.reset_targets()
+            while board.lives_left:
+                player.comp_fire(board)
+                shots += 1
+    finally:
+        player.close()
+    table = player.search.table
+    print(f"mean shots to sink the fleet: {shots / args.games:.2f}")
+    print(player.latency_report())
+    print(f"{player.search.iterations / len(player.move_times):.0f} iterations per move, "
+          f"{len(table)} positions in the table, {table.hits / max(table.hits + table.misses, 1):.1%} found")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,250 @@
+"""Counters and timing histograms of the game engine, off by default.
+Classes: Histogram
+         Metrics
+Functions: write_metrics
+
+When metrics are enabled, methods of engine phases (placement, shots, moves of the computer,
+rendering, input) are wrapped: every call is timed into the histogram of its phase,
+every exception raised out of it is counted by its type. Disabling puts the original methods back,
+so disabled metrics cost nothing. A few rare events inside methods (backtracks and restarts
+of placement, the computer losing its target) are counted only if METRICS.enabled is True.
+Strategies from other modules are wrapped if they are imported before enable().
+When battleship.py is run as the script, the classes of its __main__ module are wrapped, the game uses them.
+Metrics of worker processes are sent back as snapshot() and added by merge().
+
+Usage: METRICS.enable(); Game().start(); print(METRICS.prometheus())
+       python simulation.py random heatmap --games 10000 --metrics metrics.prom
+       python battleship.py --metrics metrics.json
+"""
+
+import json
+import os
+import sys
+import time
+from bisect import bisect_left
+from functools import wraps
+
+# upper bounds of buckets of histograms in seconds, the last bucket is +Inf
+BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 1e-2, 0.1, 1.0, 10.0)
+
+
+class Histogram:
+    """Amounts of observed times in buckets, their sum and their amount"""
+
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        """Empty histogram"""
+
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float):
+        """Add one time"""
+
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def cumulative(self):
+        """Amounts of times not greater than every bound (the last one is +Inf), like Prometheus buckets"""
+
+        total = 0
+        result = []
+        for count in self.counts:
+            total += count
+            result.append(total)
+        return result
+
+    def percentile(self, part: float):
+        """Upper bound of the bucket where given part of times is reached, inf if it's the last bucket"""
+
+        limit = part * self.count
+        for bound, total in zip(BUCKETS + (float("inf"),), self.cumulative()):
+            if total >= limit:
+                return bound
+        return float("inf")
+
+
+class Metrics:
+    """
+    Counters of events and histograms of phases. Keys of both are (name, label): the phase "shot"
+    has label "Board" or "BitBoard", the counter "exceptions" has label "shot:AlreadyShot" and so on
+    """
+
+    def __init__(self):
+        """Disabled metrics without data"""
+
+        self.enabled = False
+        self.counters = {}
+        self.histograms = {}
+        self.wrapped = []       # (class, name of the method, original function)
+
+    def count(self, name: str, label="", amount=1):
+        """Add amount to the counter"""
+
+        key = (name, label)
+        self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, phase: str, label: str, seconds: float):
+        """Add time of one call of the phase"""
+
+        key = (phase, label)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        histogram.observe(seconds)
+
+    def reset(self):
+        """Forget all data"""
+
+        self.counters = {}
+        self.histograms = {}
+
+    @staticmethod
+    def engine():
+        """
+        Module of the engine: __main__ if battleship.py is run as the script, else battleship.
+        Importing battleship from the script makes the second copy of it, the game doesn't use its classes
+        """
+
+        main = sys.modules.get("__main__")
+        if os.path.basename(getattr(main, "__file__", None) or "") == "battleship.py":
+            return main
+        import battleship
+        return battleship
+
+    @staticmethod
+    def phases():
+        """(classes, name of the method, phase) of the engine, subclasses found now are included"""
+
+        from placement import PlacementIndex
+
+        engine = Metrics.engine()
+        Board, BoardRenderer = engine.Board, engine.BoardRenderer
+        PlayerComputer, PlayerHuman = engine.PlayerComputer, engine.PlayerHuman
+
+        def family(cls):
+            classes = [cls]
+            for known in classes:
+                classes.extend(sub for sub in known.__subclasses__() if sub not in classes)
+            return classes
+
+        return [(family(PlayerComputer), "fill_board", "placement"),
+                ([PlacementIndex], "random_fleet", "random_fleet"),
+                (family(Board), "add_ship", "add_ship"),
+                (family(Board), "fire", "shot"),
+                (family(Board), "shoot", "shoot"),
+                (family(PlayerComputer), "comp_fire", "computer_move"),
+                (family(PlayerComputer), "comp_shoot", "computer_shoot"),
+                (family(PlayerHuman), "human_shoot", "human_input"),
+                ([BoardRenderer], "frame", "render"),
+                ([BoardRenderer], "text", "render")]
+
+    def enable(self):
+        """Wrap methods of engine phases by timing and counting ones"""
+
+        if self.enabled:
+            return
+        for classes, name, phase in Metrics.phases():
+            for cls in classes:
+                if name in cls.__dict__:
+                    original = cls.__dict__[name]
+                    setattr(cls, name, self.timed(original, phase, cls.__name__))
+                    self.wrapped.append((cls, name, original))
+        self.enabled = True
+
+    def disable(self):
+        """Put original methods back, the data is kept"""
+
+        for cls, name, original in reversed(self.wrapped):
+            setattr(cls, name, original)
+        self.wrapped = []
+        self.enabled = False
+
+    def timed(self, function, phase: str, label: str):
+        """Return the function which times every call of given one and counts exceptions raised by it"""
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            except Exception as error:
+                self.count("exceptions", f"{phase}:{type(error).__name__}")
+                raise
+            finally:
+                self.observe(phase, label, time.perf_counter() - start)
+
+        return wrapper
+
+    def snapshot(self):
+        """Data as a dictionary, it can be dumped to JSON or added to other metrics by merge"""
+
+        return {"counters": [[name, label, value] for (name, label), value in sorted(self.counters.items())],
+                "histograms": [{"phase": phase, "label": label, "count": histogram.count,
+                                "sum": histogram.sum, "buckets": histogram.counts}
+                               for (phase, label), histogram in sorted(self.histograms.items())]}
+
+    def merge(self, snapshot: dict):
+        """Add the data of the snapshot (for example from other process)"""
+
+        for name, label, value in snapshot["counters"]:
+            self.count(name, label, value)
+        for data in snapshot["histograms"]:
+            key = (data["phase"], data["label"])
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.counts = [mine + other for mine, other in zip(histogram.counts, data["buckets"])]
+            histogram.sum += data["sum"]
+            histogram.count += data["count"]
+
+    def json(self):
+        """Snapshot as JSON text"""
+
+        return json.dumps(self.snapshot(), indent=1)
+
+    def prometheus(self):
+        """Data in the text format of Prometheus"""
+
+        lines = []
+        names = sorted({name for name, _ in self.counters})
+        for name in names:
+            lines.append(f"# TYPE battleship_{name}_total counter")
+            for (counter, label), value in sorted(self.counters.items()):
+                if counter == name:
+                    lines.append(f'battleship_{name}_total{{label="{label}"}} {value}')
+        if self.histograms:
+            lines.append("# TYPE battleship_phase_seconds histogram")
+        for (phase, label), histogram in sorted(self.histograms.items()):
+            labels = f'phase="{phase}",label="{label}"'
+            for bound, total in zip(BUCKETS + ("+Inf",), histogram.cumulative()):
+                lines.append(f'battleship_phase_seconds_bucket{{{labels},le="{bound}"}} {total}')
+            lines.append(f"battleship_phase_seconds_sum{{{labels}}} {histogram.sum}")
+            lines.append(f"battleship_phase_seconds_count{{{labels}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def report(self):
+        """Short text: calls, mean and 99th percentile of every phase, then counters"""
+
+        lines = []
+        for (phase, label), histogram in sorted(self.histograms.items()):
+            if histogram.count:
+                lines.append(f"{phase:16} {label:24} {histogram.count:10} calls, "
+                             f"mean {histogram.sum / histogram.count * 1e6:9.1f} us, "
+                             f"p99 <= {histogram.percentile(0.99) * 1e6:9.0f} us")
+        for (name, label), value in sorted(self.counters.items()):
+            lines.append(f"{name:16} {label:24} {value:10}")
+        return "\n".join(lines)
+
+
+METRICS = Metrics()
+
+
+def write_metrics(path: str, metrics=METRICS):
+    """Write metrics to the file: Prometheus text if its name ends with .prom, else JSON"""
+
+    with open(path, "w") as file:
+        file.write(metrics.prometheus() if path.endswith(".prom") else metrics.json())
@@ -0,0 +1,390 @@
+"""Precomputed positions of ships and random fleets without retries.
+Classes: FleetDoesNotFit(ValueError)
+         PlacementIndex
+         FleetSearch
+Functions: luby
+
+Dot (x, y) has number x * size + y and is the bit with this number in the masks.
+On small boards every legal fleet is enumerated once, so a random fleet is just a random row
+of the table. Bigger boards have too many fleets for the table, there ships are placed one by one
+by the backtracking search, which reports fleets that don't fit instead of trying forever.
+"""
+
+import random
+from array import array
+
+from metrics import METRICS
+
+FLEET = (3, 2, 2, 1, 1, 1, 1)
+TABLE_MAX_DOTS = 36     # boards up to 6x6 have the table of all fleets
+
+
+class FleetDoesNotFit(ValueError):
+    """There is no legal layout of the fleet on the board (proven), or the search gave up (not proven)"""
+
+    def __init__(self, message: str, proven=True):
+        super().__init__(message)
+        self.proven = proven
+
+
+class PlacementIndex:
+    """
+    Every legal position of every ship on the board:
+    the beginning and the end of the ship, numbers of its dots,
+    the mask of its dots and the exclusion mask (the ship with its contour), where other ships can't be
+    """
+
+    _cache = {}
+
+    def __init__(self, size=6, fleet=FLEET):
+        """Find all positions for every length of ships in the fleet"""
+
+        self.size = size
+        self.fleet = tuple(sorted(fleet, reverse=True))
+        self.positions = {}
+        self.dots = {}
+        for length in set(self.fleet):
+            self.positions[length], self.dots[length] = self.find_positions(length)
+        # numbers of positions covering every dot
+        self.covering = {length: [[] for _ in range(size * size)] for length in self.positions}
+        for length, dots in self.dots.items():
+            for number, position_dots in enumerate(dots):
+                for dot in position_dots:
+                    self.covering[length][dot].append(number)
+        self._masks = {}
+        self._exclusions = {}
+        self._contours = {}
+        self._images = None
+        self._cover = None
+        self._fleets = None
+
+    @classmethod
+    def get(cls, size=6, fleet=FLEET):
+        """Return the index for given board and fleet, create it only once"""
+
+        key = (size, tuple(sorted(fleet, reverse=True)))
+        if key not in cls._cache:
+            cls._cache[key] = cls(size, fleet)
+        return cls._cache[key]
+
+    def find_positions(self, length: int):
+        """Return list of (begin, end) and list of tuples of dots' numbers of the ships with given length"""
+
+        directions = [(0, 1), (1, 0)] if length > 1 else [(0, 1)]
+        positions = []
+        dots = []
+        for x in range(self.size):
+            for y in range(self.size):
+                for dx, dy in directions:
+                    end = (x + dx * (length - 1), y + dy * (length - 1))
+                    if end[0] >= self.size or end[1] >= self.size:
+                        continue
+                    positions.append(((x, y), end))
+                    dots.append(tuple((x + dx * i) * self.size + y + dy * i for i in range(length)))
+        return positions, dots
+
+    def masks(self, length: int):
+        """List of masks of all positions of the ship with given length"""
+
+        if length not in self._masks:
+            self._masks[length] = [self.mask(dots) for dots in self.dots[length]]
+        return self._masks[length]
+
+    def exclusions(self, length: int):
+        """List of exclusion masks of all positions of the ship with given length"""
+
+        if length not in self._exclusions:
+            self._exclusions[length] = [self.mask(self.contour(dots)) for dots in self.dots[length]]
+        return self._exclusions[length]
+
+    @staticmethod
+    def mask(dots):
+        """Return mask of given dots' numbers"""
+
+        result = 0
+        for number in dots:
+            result |= 1 << number
+        return result
+
+    def contour(self, dots):
+        """Return numbers of dots of the ship with all dots around it"""
+
+        return {i * self.size + j for number in dots
+                for x, y in [divmod(number, self.size)]
+                for i in range(max(x - 1, 0), min(x + 2, self.size))
+                for j in range(max(y - 1, 0), min(y + 2, self.size))}
+
+    def fleets(self):
+        """
+        Return the table of all legal fleets: array with the number of position of every ship,
+        len(fleet) numbers for one fleet. Ships of the same length go in increasing order,
+        so every fleet is there once. The table is enumerated only once
+        """
+
+        if self._fleets is not None:
+            return self._fleets
+        if self.size * self.size > TABLE_MAX_DOTS:
+            raise ValueError(f"Too many fleets on the board {self.size}x{self.size} for the table")
+
+        masks = {length: self.masks(length) for length in self.positions}
+        exclusions = {length: self.exclusions(length) for length in self.positions}
+        largest = max(len(positions) for positions in self.positions.values())
+        table = array("B" if largest <= 0xFF else "H")
+        last = len(self.fleet) - 1
+        # instead of recursion: stack of (number of ship, first position to try, excluded dots, chosen positions)
+        stack = [(0, 0, 0, ())]
+        while stack:
+            ship, start, excluded, chosen = stack.pop()
+            length = self.fleet[ship]
+            same_next = ship < last and self.fleet[ship + 1] == length
+            for number in range(start, len(self.positions[length])):
+                if masks[length][number] & excluded:
+                    continue
+                if ship == last:
+                    table.extend(chosen)
+                    table.append(number)
+                else:
+                    stack.append((ship + 1, number + 1 if same_next else 0,
+                                  excluded | exclusions[length][number], chosen + (number,)))
+
+        self._fleets = table
+        return table
+
+    def fleets_amount(self):
+        """Amount of legal fleets"""
+
+        return len(self.fleets()) // len(self.fleet)
+
+    def fleet_by_number(self, number: int):
+        """Return list of (begin, end) of all ships of the fleet with given number"""
+
+        row = self.fleets()[number * len(self.fleet):(number + 1) * len(self.fleet)]
+        return [self.positions[length][position] for length, position in zip(self.fleet, row)]
+
+    def random_fleet(self, rng=random):
+        """Return random legal fleet: list of (begin, end) of all ships"""
+
+        if self.size * self.size <= TABLE_MAX_DOTS:
+            if not self.fleets_amount():
+                raise FleetDoesNotFit(f"The fleet {self.fleet} doesn't fit on the board {self.size}x{self.size}")
+            return self.fleet_by_number(rng.randrange(self.fleets_amount()))
+        return self.search_fleet(rng)
+
+    def area_fits(self):
+        """
+        Check the area: every ship with the dots to the right of it and below it is a rectangle 2 x (length + 1)
+        on the board bigger by one line and one column, these rectangles don't overlap
+        """
+
+        return sum(2 * (length + 1) for length in self.fleet) <= (self.size + 1) ** 2
+
+    def blocks(self):
+        """
+        For every dot, number of the square 2 x 2 of the board with it: dots of one square touch each other,
+        so every square has dots of one ship at most, and the ship of given length takes (length + 1) // 2 squares
+        """
+
+        half = (self.size + 1) // 2
+        return [x // 2 * half + y // 2 for x in range(self.size) for y in range(self.size)]
+
+    def packing_fits(self):
+        """Check the packing: the ships take different squares 2 x 2 (see blocks), there are ceil(size / 2) ** 2"""
+
+        return sum((length + 1) // 2 for length in self.fleet) <= ((self.size + 1) // 2) ** 2
+
+    def contours(self, length: int):
+        """List of tuples of dots' numbers of the contours (with the ship) of all positions of the ship"""
+
+        if length not in self._contours:
+            self._contours[length] = [tuple(self.contour(dots)) for dots in self.dots[length]]
+        return self._contours[length]
+
+    def images(self):
+        """
+        For every dot, the cells of the board bigger by one line and one column which the dot covers,
+        if the ship in it is stretched by one to the right and one down: (x, y), (x + 1, y), (x, y + 1), (x + 1, y + 1)
+        """
+
+        if self._images is None:
+            side = self.size + 1
+            self._images = [(x * side + y, (x + 1) * side + y, x * side + y + 1, (x + 1) * side + y + 1)
+                            for x in range(self.size) for y in range(self.size)]
+        return self._images
+
+    def cover(self):
+        """Amount of dots which cover every cell of the bigger board, see images"""
+
+        if self._cover is None:
+            self._cover = bytearray((self.size + 1) ** 2)
+            for images in self.images():
+                for cell in images:
+                    self._cover[cell] += 1
+        return self._cover
+
+    def search_fleet(self, rng=random, tries=20, attempts=100000):
+        """Random legal fleet found by FleetSearch, raise FleetDoesNotFit if there is none or the search gave up"""
+
+        if not self.area_fits() or not self.packing_fits():
+            raise FleetDoesNotFit(f"The fleet {self.fleet} doesn't fit on the board {self.size}x{self.size}")
+        return FleetSearch(self).run(rng, tries, attempts)
+
+
+def luby(number: int):
+    """Number-th member (from 1) of the Luby sequence: 1, 1, 2, 1, 1, 2, 4, 1, 1, 2, 1, 1, 2, 4, 8, ..."""
+
+    while True:
+        power = 1
+        while power * 2 - 1 < number:
+            power *= 2
+        if number == power * 2 - 1:
+            return power
+        number -= power - 1
+
+
+class FleetSearch:
+    """
+    Backtracking search of the random fleet on the board of the index, ships go from the longest.
+    A placed ship blocks its dots and its contour. Every remaining ship stretched by one to the right
+    and one down is a rectangle 2 x (length + 1) on the board bigger by one line and one column,
+    these rectangles don't overlap and lie on cells covered by free dots. Also every remaining ship takes
+    its own squares 2 x 2 of the board (see PlacementIndex.blocks) which have free dots. So if such cells
+    or such squares are fewer than remaining ships need, the last placed ship is taken back at once
+    """
+
+    def __init__(self, index: PlacementIndex):
+        """Empty board: no dot is blocked, every cell of the bigger board is covered"""
+
+        self.index = index
+        self.images = index.images()
+        self.blocked = bytearray(index.size * index.size)      # amount of placed ships which block every dot
+        self.cover = bytearray(index.cover())                  # amount of free dots which cover every cell
+        self.usable = len(self.cover)   # covered cells
+        self.needed = [0]      # area of rectangles of ships from every one to the last one
+        for length in reversed(index.fleet):
+            self.needed.append(self.needed[-1] + 2 * (length + 1))
+        self.needed.reverse()
+        self.blocks = index.blocks()
+        self.block_free = bytearray(max(self.blocks) + 1)     # amount of free dots in every square
+        for block in self.blocks:
+            self.block_free[block] += 1
+        self.free_blocks = len(self.block_free)     # squares with free dots
+        self.needed_blocks = [0]   # squares of ships from every one to the last one
+        for length in reversed(index.fleet):
+            self.needed_blocks.append(self.needed_blocks[-1] + (length + 1) // 2)
+        self.needed_blocks.reverse()
+
+    def block(self, contour):
+        """Block dots of the ship and its contour"""
+
+        blocked, cover, block_free = self.blocked, self.cover, self.block_free
+        for dot in contour:
+            if not blocked[dot]:
+                for cell in self.images[dot]:
+                    cover[cell] -= 1
+                    if not cover[cell]:
+                        self.usable -= 1
+                block = self.blocks[dot]
+                block_free[block] -= 1
+                if not block_free[block]:
+                    self.free_blocks -= 1
+            blocked[dot] += 1
+
+    def unblock(self, contour):
+        """Take the ship and its contour back"""
+
+        blocked, cover, block_free = self.blocked, self.cover, self.block_free
+        for dot in contour:
+            blocked[dot] -= 1
+            if not blocked[dot]:
+                for cell in self.images[dot]:
+                    if not cover[cell]:
+                        self.usable += 1
+                    cover[cell] += 1
+                block = self.blocks[dot]
+                if not block_free[block]:
+                    self.free_blocks += 1
+                block_free[block] += 1
+
+    def free_positions(self, length: int):
+        """Numbers of positions of the ship with given length where no dot is blocked"""
+
+        blocked = self.blocked
+        return [number for number, position_dots in enumerate(self.index.dots[length])
+                if not any(blocked[dot] for dot in position_dots)]
+
+    def run(self, rng=random, tries=20, attempts=100000, backtracks=4):
+        """
+        Place the fleet. The ship tries a few random positions first, if all of them are blocked,
+        it takes the list of all free positions and tries them in random order;
+        when there are no more, the previous ship moves to its next position.
+        After some backtracks all ships are taken back and the search starts again with other random
+        positions: a bad position of the first ships is left faster this way than by trying every position
+        of the last ones. Allowed backtracks are given amount times the Luby sequence 1, 1, 2, 1, 1, 2, 4, ...,
+        they grow slowly, so in the end the search tries everything and a fleet which doesn't fit is reported.
+        Return list of (begin, end) of all ships. Raise FleetDoesNotFit if the fleet can't be placed (proven)
+        or isn't found after given amount of attempts (placed ships, not proven)
+        """
+
+        index = self.index
+        fleet = index.fleet
+        placed = []         # (number of the position, free positions left) of placed ships
+        pending = None      # free positions left for the ship being placed, None before its random tries
+        made = restarts = 0
+        left = backtracks   # backtracks left before the search starts again
+        while len(placed) < len(fleet):
+            length = fleet[len(placed)]
+            number = None
+            if pending is None:
+                dots = index.dots[length]
+                for _ in range(tries):
+                    guess = rng.randrange(len(dots))
+                    if not any(self.blocked[dot] for dot in dots[guess]):
+                        number = guess
+                        break
+                else:
+                    if METRICS.enabled:
+                        METRICS.count("placement_scans", str(length))
+                    pending = self.free_positions(length)
+            if number is None:
+                if not pending:
+                    if not placed:
+                        raise FleetDoesNotFit(f"The fleet {fleet} doesn't fit on the board {index.size}x{index.size}: "
+                                              f"the search tried every layout")
+                    if not left:
+                        if METRICS.enabled:
+                            METRICS.count("placement_restarts", "search")
+                        while placed:
+                            number, _ = placed.pop()
+                            self.unblock(index.contours(fleet[len(placed)])[number])
+                        pending = None
+                        restarts += 1
+                        left = backtracks * luby(restarts + 1)
+                        continue
+                    if METRICS.enabled:
+                        METRICS.count("placement_backtracks", str(length))
+                    left -= 1
+                    number, pending = placed.pop()
+                    self.unblock(index.contours(fleet[len(placed)])[number])
+                    if pending is None:
+                        pending = self.free_positions(fleet[len(placed)])
+                        pending.remove(number)
+                    continue
+                i = rng.randrange(len(pending))
+                pending[i], pending[-1] = pending[-1], pending[i]
+                number = pending.pop()
+
+            made += 1
+            if made > attempts:
+                raise FleetDoesNotFit(f"The fleet {fleet} isn't found on the board {index.size}x{index.size} "
+                                      f"in {attempts} attempts, the search gave up: it may fit", proven=False)
+            self.block(index.contours(length)[number])
+            if self.usable < self.needed[len(placed) + 1] or self.free_blocks < self.needed_blocks[len(placed) + 1]:
+                self.unblock(index.contours(length)[number])
+                if pending is None:
+                    pending = self.free_positions(length)
+                    pending.remove(number)
+                continue
+            placed.append((number, pending))
+            pending = None
+
+        return [index.positions[length][number] for length, (number, _) in zip(fleet, placed)]
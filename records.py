@@ -0,0 +1,343 @@
+"""Records of games in a compact binary file: fleets, shots and their results, the seed of the game.
+Classes: GameRecord
+         RecordWriter
+         RecordReader
+Functions: fleet_mask
+           fleet_ships
+           fleet_board
+           show_game
+
+Dot (x, y) has number x * size + y and is the bit with this number in the masks.
+File: header (magic, size of the board, lengths of ships), then chunks of records.
+Chunk: amount of records, length of the payload, offsets of records in the payload, the payload.
+Record: seed, who shot first, who won and if the seed replays the game, amount of shots, fleet masks of both players,
+numbers of shot dots (one byte each, two bytes on boards with more than 256 dots)
+and results of the shots (two bits each).
+The writer only appends whole chunks, the reader maps the file and decodes only the records it's asked for.
+
+Games of the human with the computer (python battleship.py --record games.bsr) can't be played again
+from the seed, their records are marked as not replayable.
+
+Usage: python simulation.py random heatmap --games 100000 --record games.bsr
+       python records.py games.bsr
+       python records.py games.bsr --game 42
+"""
+
+import argparse
+import mmap
+import os
+import struct
+from bisect import bisect_right
+
+from battleship import DEFAULT_RULES, Board, Dot, Rules, Ship, ShotResult
+
+MAGIC = b"BSHIPREC"
+HEADER = struct.Struct("<8sBH")      # magic, size of the board, amount of ships; lengths of ships follow
+CHUNK = struct.Struct("<II")         # amount of records, length of the payload
+RECORD = struct.Struct("<QBI")       # seed, first player | winner << 1 | not replayable << 2, amount of shots
+RESULTS = (ShotResult.miss, ShotResult.hit, ShotResult.kill, ShotResult.already)
+RESULT_CODES = {result: code for code, result in enumerate(RESULTS)}
+
+
+class GameRecord:
+    """
+    One game: seed, first (0 or 1) is the player who shot first, winner (0 or 1),
+    fleets are masks of ships of both players, shots are numbers of dots, results are ShotResult of them;
+    replayable is False if the seed doesn't make the same game (a human played it)
+    """
+
+    __slots__ = ("seed", "first", "winner", "fleets", "shots", "results", "replayable")
+
+    def __init__(self, seed=0, first=0, winner=0, fleets=(0, 0), shots=None, results=None, replayable=True):
+        """Record of the game, shots are added while the game goes"""
+
+        self.replayable = replayable
+        self.seed = seed
+        self.first = first
+        self.winner = winner
+        self.fleets = fleets
+        self.shots = shots if shots is not None else []
+        self.results = results if results is not None else []
+
+    def add_shot(self, dot: Dot, size: int, result: ShotResult):
+        """Add the shot in the dot of the board with given size"""
+
+        self.shots.append(dot.x * size + dot.y)
+        self.results.append(result)
+
+    def shooters(self):
+        """Player (0 or 1) who made every shot: the turn passes after every miss"""
+
+        turn = self.first
+        players = []
+        for result in self.results:
+            players.append(turn)
+            if result is ShotResult.miss:
+                turn = 1 - turn
+        return players
+
+    def encode(self, rules=DEFAULT_RULES):
+        """Return bytes of the record"""
+
+        dots = rules.size * rules.size
+        mask_bytes = (dots + 7) // 8
+        packed = bytearray((len(self.results) + 3) // 4)
+        for i, result in enumerate(self.results):
+            packed[i >> 2] |= RESULT_CODES[result] << 2 * (i & 3)
+        shots = bytes(self.shots) if dots <= 256 else struct.pack(f"<{len(self.shots)}H", *self.shots)
+        flags = self.first | self.winner << 1 | (not self.replayable) << 2
+        return b"".join((RECORD.pack(self.seed, flags, len(self.shots)),
+                         self.fleets[0].to_bytes(mask_bytes, "little"),
+                         self.fleets[1].to_bytes(mask_bytes, "little"),
+                         shots, packed))
+
+    @classmethod
+    def decode(cls, data, rules=DEFAULT_RULES):
+        """Return the record from its bytes (or memoryview)"""
+
+        seed, flags, amount = RECORD.unpack_from(data)
+        dots = rules.size * rules.size
+        mask_bytes = (dots + 7) // 8
+        start = RECORD.size
+        fleets = (int.from_bytes(data[start:start + mask_bytes], "little"),
+                  int.from_bytes(data[start + mask_bytes:start + 2 * mask_bytes], "little"))
+        start += 2 * mask_bytes
+        if dots <= 256:
+            shots = list(data[start:start + amount])
+            start += amount
+        else:
+            shots = list(struct.unpack_from(f"<{amount}H", data, start))
+            start += 2 * amount
+        packed = data[start:start + (amount + 3) // 4]
+        results = [RESULTS[packed[i >> 2] >> 2 * (i & 3) & 3] for i in range(amount)]
+        return cls(seed, flags & 1, flags >> 1 & 1, fleets, shots, results, not flags >> 2 & 1)
+
+
+class RecordWriter:
+    """
+    Appends records to the file. Encoded records are kept in memory and written
+    as one chunk when there are chunk_size of them, and on close
+    """
+
+    def __init__(self, path: str, rules=DEFAULT_RULES, chunk_size=4096):
+        """
+        Open the file for appending, write the header if the file is new.
+        If the last chunk of the existing file was cut by a crash, it's dropped
+        """
+
+        if rules.size > 255:
+            raise ValueError("Records keep boards up to 255x255")
+        self.rules = rules
+        self.chunk_size = chunk_size
+        self.pending = []
+        self.written = 0
+        if os.path.exists(path) and os.path.getsize(path):
+            with RecordReader(path) as reader:
+                if reader.rules != rules:
+                    raise ValueError(f"{path} has records of other rules")
+                end = reader.end
+            os.truncate(path, end)
+            self.file = open(path, "ab")
+        else:
+            self.file = open(path, "ab")
+            self.file.write(HEADER.pack(MAGIC, rules.size, len(rules.fleet)) + bytes(rules.fleet))
+
+    def append(self, record: GameRecord):
+        """Add the record"""
+
+        self.append_encoded(record.encode(self.rules))
+
+    def append_encoded(self, data: bytes):
+        """Add the record encoded by GameRecord.encode with the same rules, for example in other process"""
+
+        self.pending.append(data)
+        if len(self.pending) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """Write pending records as one chunk"""
+
+        if not self.pending:
+            return
+        offsets = [0]
+        for data in self.pending[:-1]:
+            offsets.append(offsets[-1] + len(data))
+        payload = b"".join(self.pending)
+        self.file.write(CHUNK.pack(len(self.pending), len(payload))
+                        + struct.pack(f"<{len(offsets)}I", *offsets) + payload)
+        self.written += len(self.pending)
+        self.pending = []
+
+    def close(self):
+        """Write pending records and close the file"""
+
+        self.flush()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class RecordReader:
+    """
+    Records of the file by number or one by one; the file is memory-mapped,
+    only headers of chunks are read on opening. A chunk cut by a crash of the writer is ignored
+    """
+
+    def __init__(self, path: str):
+        """Map the file, read the rules and find chunks"""
+
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, size, ships = HEADER.unpack_from(self.map)
+        if magic != MAGIC:
+            raise ValueError(f"{path} isn't a file of records")
+        self.rules = Rules(size, tuple(self.map[HEADER.size:HEADER.size + ships]))
+        self.chunks = []    # (offset of the offsets table, amount of records, end of the payload)
+        self.firsts = []    # number of the first record of every chunk
+        records = 0
+        position = HEADER.size + ships
+        while position + CHUNK.size <= len(self.map):
+            amount, length = CHUNK.unpack_from(self.map, position)
+            end = position + CHUNK.size + 4 * amount + length
+            if end > len(self.map):
+                break
+            self.chunks.append((position + CHUNK.size, amount, end))
+            self.firsts.append(records)
+            records += amount
+            position = end
+        self.records = records
+        self.end = position     # end of the last whole chunk
+
+    def __len__(self):
+        return self.records
+
+    def raw(self, number: int):
+        """Return memoryview of the encoded record with given number"""
+
+        if number < 0:
+            number += self.records
+        if not 0 <= number < self.records:
+            raise IndexError("There is no record with this number")
+        chunk = bisect_right(self.firsts, number) - 1
+        table, amount, end = self.chunks[chunk]
+        i = number - self.firsts[chunk]
+        payload = table + 4 * amount
+        start = payload + struct.unpack_from("<I", self.map, table + 4 * i)[0]
+        stop = payload + struct.unpack_from("<I", self.map, table + 4 * i + 4)[0] if i + 1 < amount else end
+        return memoryview(self.map)[start:stop]
+
+    def __getitem__(self, number: int):
+        """Return GameRecord with given number"""
+
+        with self.raw(number) as data:
+            return GameRecord.decode(data, self.rules)
+
+    def __iter__(self):
+        """Records one by one, chunk by chunk"""
+
+        view = memoryview(self.map)
+        try:
+            for table, amount, end in self.chunks:
+                payload = table + 4 * amount
+                offsets = struct.unpack_from(f"<{amount}I", self.map, table) + (end - payload,)
+                for i in range(amount):
+                    yield GameRecord.decode(view[payload + offsets[i]:payload + offsets[i + 1]], self.rules)
+        finally:
+            view.release()
+
+    def close(self):
+        """Unmap and close the file"""
+
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def fleet_mask(board: Board):
+    """Mask of dots of all ships on the board"""
+
+    size = board.rules.size
+    return sum(1 << (dot.x * size + dot.y) for ship in board.ship_list for dot in ship.all_dots)
+
+
+def fleet_ships(mask: int, size: int):
+    """
+    Beginnings and ends of ships of the fleet mask: ships don't touch each other,
+    so every ship is a line of neighbouring dots, it begins in its first dot
+    """
+
+    ships = []
+    while mask:
+        number = (mask & -mask).bit_length() - 1      # the first dot of the first remaining ship
+        x, y = divmod(number, size)
+        step = 1 if y + 1 < size and mask >> number + 1 & 1 else size
+        end = number
+        while end + step < size * size and mask >> end + step & 1 and (step == size or (end + step) % size):
+            end += step
+        for dot in range(number, end + 1, step):
+            mask &= ~(1 << dot)
+        ships.append(((x, y), divmod(end, size)))
+    return ships
+
+
+def fleet_board(ships: list, rules=DEFAULT_RULES, board_class=Board):
+    """New board with ships (beginnings and ends from fleet_ships), ships are shown"""
+
+    board = board_class(hidden=False, rules=rules)
+    for begin, end in ships:
+        board.add_ship(Ship(Dot(*begin), Dot(*end), rules=rules))
+    board.delete_contour()
+    return board
+
+
+def show_game(record: GameRecord, rules=DEFAULT_RULES):
+    """Print shots of the recorded game and boards of both players after it"""
+
+    boards = [fleet_board(fleet_ships(mask, rules.size), rules) for mask in record.fleets]
+    seed = f"seed {record.seed}" if record.replayable else "not replayable"
+    print(f"{seed}, player {record.first + 1} shoots first, player {record.winner + 1} wins")
+    for number, (shooter, dot, result) in enumerate(zip(record.shooters(), record.shots, record.results), 1):
+        x, y = divmod(dot, rules.size)
+        replayed = boards[1 - shooter].fire(Dot(x, y))[0]
+        if replayed is not result:
+            raise ValueError(f"Shot {number} was {result.value} in the record, but it's {replayed.value} on the board")
+        print(f"{number:4}. player {shooter + 1}: {Rules.line_name(x)}{y + 1} {result.value}")
+    for player, board in enumerate(boards, 1):
+        print(f"Board of player {player}:")
+        board.show_board()
+
+
+def main():
+    """Print the summary of the file or one game of it"""
+
+    parser = argparse.ArgumentParser(description="Records of games")
+    parser.add_argument("path")
+    parser.add_argument("--game", type=int, default=None, help="number of the game to show")
+    args = parser.parse_args()
+
+    with RecordReader(args.path) as reader:
+        if args.game is not None:
+            show_game(reader[args.game], reader.rules)
+            return
+        games = wins = shots = 0
+        for record in reader:
+            games += 1
+            wins += record.winner == 0
+            shots += len(record.shots)
+        print(f"{args.path}: {games} games, size {reader.rules.size}, fleet {reader.rules.fleet}, "
+              f"{os.path.getsize(args.path) / max(games, 1):.1f} bytes per game")
+        if games:
+            print(f"player 1 wins {wins / games:.2%}, {shots / games:.2f} shots per game")
+
+
+if __name__ == '__main__':
+    main()
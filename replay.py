@@ -0,0 +1,186 @@
+"""Replay of recorded games without input and pauses: the position after any shot,
+the game again from its seed, and other strategies playing it on from any shot.
+Classes: Replay
+Functions: replay_seed
+           first_divergence
+           check_records
+
+The position is made by applying all shots of every player at once (BitBoard.apply_shots),
+not move by move through the turn loop, so it's cheap enough to look through every game of a big file.
+Records made by older code can be checked against the strategies of the new code:
+the game is played again from its seed and the first shot which is different is reported.
+
+Usage: python replay.py games.bsr --game 42 --shots 10
+       python replay.py games.bsr --game 42 --shots 10 --branch heatmap random --seed 1
+       python replay.py games.bsr --check random heatmap
+"""
+
+import argparse
+import random
+import time
+
+from battleship import DEFAULT_RULES, BitBoard, Dot, Rules, ShotResult
+from records import GameRecord, RecordReader, fleet_board, fleet_ships
+from simulation import STRATEGIES, check_strategies, play_game, play_out
+from transport import NullTransport
+
+
+class Replay:
+    """Recorded game: boards of both players after any amount of shots and games which go on from there"""
+
+    def __init__(self, record: GameRecord, rules=DEFAULT_RULES, board_class=BitBoard):
+        """Replay of the record made with given rules"""
+
+        self.record = record
+        self.rules = rules
+        self.board_class = board_class
+        self.shooters = record.shooters()
+        self.fleets = [fleet_ships(mask, rules.size) for mask in record.fleets]
+
+    def __len__(self):
+        return len(self.record.shots)
+
+    def boards(self, shots=None):
+        """Boards of both players after given amount of first shots (after all shots if None)"""
+
+        shots = len(self) if shots is None else shots
+        boards = [fleet_board(ships, self.rules, self.board_class) for ships in self.fleets]
+        for player in (0, 1):
+            boards[1 - player].apply_shots([dot for dot, shooter in zip(self.record.shots[:shots], self.shooters)
+                                            if shooter == player])
+        return boards
+
+    def turn(self, shots: int):
+        """Player (0 or 1) who shoots after given amount of shots"""
+
+        if shots < len(self):
+            return self.shooters[shots]
+        if not shots:
+            return self.record.first
+        last = self.shooters[shots - 1]
+        return 1 - last if self.record.results[shots - 1] is ShotResult.miss else last
+
+    def check(self):
+        """Make shots one by one, return the number of the first shot which result isn't the recorded one, else None"""
+
+        boards = [fleet_board(ships, self.rules, self.board_class) for ships in self.fleets]
+        for number, (shooter, dot, result) in enumerate(zip(self.shooters, self.record.shots, self.record.results)):
+            if boards[1 - shooter].fire(Dot(*divmod(dot, self.rules.size)))[0] is not result:
+                return number
+        return None
+
+    def branch(self, shots: int, strategy_1, strategy_2, rng=random):
+        """
+        The game goes as recorded for given amount of shots, then strategy_1 and strategy_2
+        play it to the end with fleets of the record. Players learn their shots made before by observe.
+        Return GameRecord of the new game
+        """
+
+        boards = self.boards(shots)
+        players = [strategy_1(self.board_class, rng, self.rules, NullTransport()),
+                   strategy_2(self.board_class, rng, self.rules, NullTransport())]
+        for player, board in zip(players, boards):
+            player.board = board
+        size = self.rules.size
+        for shooter, dot, result in zip(self.shooters[:shots], self.record.shots, self.record.results):
+            players[shooter].observe(boards[1 - shooter], Dot(*divmod(dot, size)), result)
+
+        record = GameRecord(self.record.seed, self.record.first, self.record.winner, self.record.fleets,
+                            self.record.shots[:shots], self.record.results[:shots])
+        if boards[0].lives_left and boards[1].lives_left:
+            record.winner = play_out(players, self.turn(shots), self.rules, record)[0]
+        return record
+
+
+def replay_seed(record: GameRecord, strategy_1, strategy_2, rules=DEFAULT_RULES, board_class=BitBoard):
+    """Play the game of the record again from its seed, return the new GameRecord"""
+
+    if not record.replayable:
+        raise ValueError("The game of the record can't be played again from its seed")
+    new = GameRecord(record.seed)
+    play_game(strategy_1, strategy_2, board_class, random.Random(record.seed), rules, new)
+    return new
+
+
+def first_divergence(record: GameRecord, other: GameRecord):
+    """
+    Number of the first shot which is different in two records,
+    0 if fleets are different, None if they are the same
+    """
+
+    if record.fleets != other.fleets or record.first != other.first:
+        return 0
+    for number, (shot, other_shot) in enumerate(zip(zip(record.shots, record.results),
+                                                   zip(other.shots, other.results))):
+        if shot != other_shot:
+            return number
+    if len(record.shots) != len(other.shots):
+        return min(len(record.shots), len(other.shots))
+    return None
+
+
+def check_records(reader: RecordReader, strategy_1, strategy_2, board_class=BitBoard):
+    """
+    Play every game of the file again from its seed, games which aren't replayable are skipped,
+    return [(number of the game, number of the shot)] of changed games
+    """
+
+    changed = []
+    for number, record in enumerate(reader):
+        if not record.replayable:
+            continue
+        shot = first_divergence(record, replay_seed(record, strategy_1, strategy_2, reader.rules, board_class))
+        if shot is not None:
+            changed.append((number, shot))
+    return changed
+
+
+def main():
+    """Show the position of the recorded game, play it on with other strategies, or check the file"""
+
+    parser = argparse.ArgumentParser(description="Replay of recorded games")
+    parser.add_argument("path")
+    parser.add_argument("--game", type=int, default=0)
+    parser.add_argument("--shots", type=int, default=None, help="amount of shots made, all by default")
+    parser.add_argument("--branch", nargs=2, choices=sorted(STRATEGIES), default=None,
+                        help="strategies which play the game on after the shots")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--check", nargs=2, choices=sorted(STRATEGIES), default=None,
+                        help="strategies which played games of the file")
+    args = parser.parse_args()
+
+    with RecordReader(args.path) as reader:
+        try:
+            check_strategies([STRATEGIES[name] for name in (args.check or []) + (args.branch or [])], reader.rules)
+        except ValueError as error:
+            parser.error(str(error))
+        if args.check:
+            start = time.perf_counter()
+            changed = check_records(reader, STRATEGIES[args.check[0]], STRATEGIES[args.check[1]])
+            print(f"{len(reader)} games checked in {time.perf_counter() - start:.1f} s, {len(changed)} changed")
+            for number, shot in changed[:10]:
+                print(f"game {number}: shot {shot + 1} is different")
+            return
+
+        replay = Replay(reader[args.game], reader.rules)
+        shots = len(replay) if args.shots is None else min(args.shots, len(replay))
+        if args.branch:
+            record = replay.branch(shots, STRATEGIES[args.branch[0]], STRATEGIES[args.branch[1]],
+                                   random.Random(args.seed))
+            print(f"recorded game: player {replay.record.winner + 1} wins after {len(replay)} shots")
+            print(f"{args.branch[0]} and {args.branch[1]} after shot {shots}: "
+                  f"player {record.winner + 1} wins after {len(record.shots)} shots")
+            replay = Replay(record, reader.rules)
+            shots = len(replay)
+
+        for player, board in enumerate(replay.boards(shots), 1):
+            print(f"Board of player {player}:")
+            board.show_board()
+        if shots < len(replay):
+            x, y = divmod(replay.record.shots[shots], reader.rules.size)
+            print(f"next shot: player {replay.turn(shots) + 1}: {Rules.line_name(x)}{y + 1} "
+                  f"{replay.record.results[shots].value}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,390 @@
+"""Server of the Battleship: many players in one process, every player is a telnet connection.
+Classes: PlayerLeft(ConnectionError)
+         Session
+         SessionTransport(Display)
+         GameServer
+
+The player plays with the computer or waits for other human. Ships and shots are entered
+the same way as in the console game ('A1A3', 'AGAIN'), Board and Ship check them.
+Pauses of the computer are asyncio.sleep, so they don't stop other games.
+Messages of the computer player go to the player through SessionTransport.
+
+Usage: python server.py --port 8023 --pace 1
+       telnet localhost 8023
+"""
+
+import argparse
+import asyncio
+import random
+import resource
+
+from battleship import (DEFAULT_RULES, ActionWasNotDone, AlreadyShot, BitBoard, BoardRenderer, IncorrectShip,
+                        InputRecognitionError, OutOfBoard, PlayerComputer, PlayerHuman, Rules, Ship, ShotResult)
+from placement import FleetDoesNotFit, PlacementIndex
+from transport import Display
+
+PROMPT = "> "   # end of every question, clients can wait for it
+
+
+class PlayerLeft(ConnectionError):
+    """The player closed the connection"""
+
+    def __init__(self, session):
+        super().__init__("Player left")
+        self.session = session
+
+
+class Session:
+    """Connected player: lines from the player, text to the player, the board and its views"""
+
+    def __init__(self, reader, writer, rules=DEFAULT_RULES):
+        """New player without the board"""
+
+        self.reader = reader
+        self.writer = writer
+        self.rules = rules
+        self.pending = []           # text which isn't sent yet
+        self.board = None
+        self.own_view = None        # renderer of the board with ships
+        self.enemy_view = None      # renderer of the board for the opponent, ships are hidden
+
+    def send(self, text: str):
+        """Add the text to the pending one, it's sent at once with the next question or flush"""
+
+        self.pending.append(text)
+
+    async def flush(self):
+        """Send the pending text, wait if the player reads slowly"""
+
+        if not self.pending:
+            return
+        text, self.pending = "".join(self.pending), []
+        try:
+            self.writer.write(text.encode())
+            await self.writer.drain()
+        except ConnectionError:
+            raise PlayerLeft(self)
+
+    async def ask(self, question: str):
+        """Send the question, return the answer without marks and spaces in upper case"""
+
+        self.send(question + "\n" + PROMPT)
+        await self.flush()
+        try:
+            line = await self.reader.readline()
+        except ConnectionError:
+            line = b""
+        if not line:
+            raise PlayerLeft(self)
+        return PlayerHuman.clean_input(line.decode(errors="replace").strip())
+
+    async def wait_for_leave(self):
+        """Drop lines of the player who waits for nothing, raise PlayerLeft when the connection is closed"""
+
+        while True:
+            try:
+                line = await self.reader.readline()
+            except ConnectionError:
+                line = b""
+            if not line:
+                raise PlayerLeft(self)
+
+    async def fill_board(self, board_class=BitBoard):
+        """Add ships by the player's lines like PlayerHuman.fill_board"""
+
+        self.send(self.rules.text()[0])
+        board = board_class(hidden=False, rules=self.rules)
+        while len(board.ship_list) < self.rules.ships_amount:
+            coord = await self.ask(board.text() + "add your ship, enter 'AGAIN' if you want to start again")
+            if coord == "AGAIN":
+                board = board_class(hidden=False, rules=self.rules)
+                continue
+
+            try:
+                dots = self.rules.parse_dots(coord)
+                board.add_ship(Ship(dots[0], dots[-1], rules=self.rules))
+            except InputRecognitionError as error:
+                self.send(f"{error}\nPlease try again\n")
+            except (ActionWasNotDone, IncorrectShip) as error:
+                self.send(f"{error}\n")
+
+        board.delete_contour()
+        self.set_board(board)
+        self.send(self.own_view.text())
+
+    def set_board(self, board):
+        """Take the board and make its views"""
+
+        self.board = board
+        self.own_view = BoardRenderer(board, hidden=False)
+        self.enemy_view = BoardRenderer(board, hidden=True)
+
+    async def shoot(self, target):
+        """
+        Ask coordinates until the shot is done in target Session (its board).
+        Return message of the hit if the player shoots again, else None
+        """
+
+        while True:
+            move = await self.ask("Your turn")
+            try:
+                dots = self.rules.parse_dots(move)
+                if len(dots) != 1:
+                    raise InputRecognitionError("Sorry, I don't understand")
+                if not target.board.is_dot_on_board(dots[0]):
+                    raise OutOfBoard("The dot(s) is out of board")
+                target.board.shoot(dots[0])
+            except (InputRecognitionError, OutOfBoard, AlreadyShot) as error:
+                self.send(f"{error}\n")
+            except ActionWasNotDone as error:   # YouHitTheTarget
+                return str(error)
+            else:
+                return None
+
+
+class SessionTransport(Display):
+    """
+    Display of the engine's messages in the session, they are sent with its next question.
+    The session asks the player only in coroutines, so it isn't the Transport of Game
+    """
+
+    def __init__(self, session: Session):
+        self.session = session
+
+    def write(self, text: str):
+        self.session.send(text + "\n")
+
+    def show(self, board):
+        self.session.send(board.text())
+
+    def pause(self, seconds: float):
+        pass
+
+
+class GameServer:
+    """
+    Games of connected players: with the computer or with other human.
+    Pace is the pause in seconds before every computer's shot
+    """
+
+    def __init__(self, rules=DEFAULT_RULES, board_class=BitBoard, pace=1.0, rng=random):
+        """Server without players"""
+
+        self.rules = rules
+        self.board_class = board_class
+        self.pace = pace
+        self.rng = rng
+        # (session, future of the match, task which watches the connection) of players waiting for other human
+        self.lobby = []
+        self.sessions = 0       # connected players
+        self.games = 0          # finished games of every player, a game of two humans counts twice
+
+    async def handle(self, reader, writer):
+        """Talk to one connected player until the player says NO or leaves"""
+
+        session = Session(reader, writer, self.rules)
+        self.sessions += 1
+        try:
+            while True:
+                mode = await session.ask("Play with COMPUTER or with HUMAN?")
+                if mode == "COMPUTER":
+                    await self.play_with_computer(session)
+                elif mode == "HUMAN":
+                    await self.play_with_human(session)
+                else:
+                    session.send("Sorry, I don't understand\n")
+                    continue
+                self.games += 1
+                if not await self.play_again(session):
+                    break
+            await session.flush()
+        except PlayerLeft:
+            pass
+        finally:
+            self.sessions -= 1
+            writer.close()
+
+    @staticmethod
+    async def play_again(session):
+        """Ask player about repeat, return True for YES"""
+
+        while True:
+            answer = await session.ask("Maybe one more time?\nYES or NO")
+            if answer == "YES":
+                return True
+            if answer == "NO":
+                session.send("Ok, bye! Have a nice day\n")
+                return False
+            session.send("Sorry, I don't understand\n")
+
+    async def play_with_computer(self, session):
+        """The game of the player with PlayerComputer"""
+
+        await session.fill_board(self.board_class)
+        await asyncio.sleep(2 * self.pace)
+        computer = PlayerComputer(self.board_class, self.rng, self.rules, SessionTransport(session))
+        computer_session = Session(None, None, self.rules)
+        computer_session.set_board(computer.board)
+
+        session.send("I'm ready too\nMy board:\n" + computer_session.enemy_view.text() + self.rules.text()[1])
+        human_turn = self.rng.randrange(2)
+        session.send("You go first\n" if human_turn else "I go first\n")
+        while True:
+            if human_turn:
+                if await self.human_move(session, computer_session, watching=False):
+                    session.send("You win!\n")
+                    return
+            elif await self.computer_move(computer, session):
+                session.send("You loose\n")
+                return
+            human_turn = not human_turn
+
+    @staticmethod
+    async def human_move(shooter, target, watching=True):
+        """
+        Shots of the shooter Session in the target Session until the miss,
+        if watching, target sees its board after every shot. Return True if all target's ships are killed
+        """
+
+        while True:
+            shooter.send("Board of your opponent:\n" + target.enemy_view.text())
+            message = await shooter.shoot(target)
+            if watching:
+                target.send("Your opponent shot\nYour board:\n" + target.own_view.text())
+                await target.flush()
+            if not target.board.lives_left:
+                shooter.send(target.enemy_view.text())
+                return True
+            if message is None:
+                shooter.send(target.enemy_view.text())
+                return False
+            shooter.send(message + "\n")
+
+    async def computer_move(self, computer, target):
+        """Shots of PlayerComputer in the target Session until the miss, return True if all ships are killed"""
+
+        while True:
+            await asyncio.sleep(self.pace)
+            if computer.comp_fire(target.board)[0] is not ShotResult.miss:
+                if not target.board.lives_left:
+                    return True
+                if self.pace:
+                    await target.flush()    # the player sees every shot during the pause
+                continue
+            target.send(f"My turn\nYour board:\n{target.own_view.text()}")
+            return False
+
+    async def play_with_human(self, session):
+        """Wait for other human in the lobby, or take the waiting one and play the match"""
+
+        while self.lobby:
+            other, match, watch = self.lobby.pop(0)
+            watch.cancel()      # the match reads lines of the other player now
+            left, = await asyncio.gather(watch, return_exceptions=True)
+            if not isinstance(left, PlayerLeft) and not match.done():
+                break
+        else:
+            await self.wait_in_lobby(session)
+            return
+
+        try:
+            await self.match(other, session)
+        except PlayerLeft as error:
+            remaining = session if error.session is other else other
+            remaining.send("Your opponent left, you win!\n")
+            if error.session is not other:
+                raise
+            match.set_exception(error)      # the other's handler ends with it
+        finally:
+            if not match.done():
+                match.set_result(None)
+
+    async def wait_in_lobby(self, session):
+        """
+        Wait until other human takes the player from the lobby and the match is over;
+        if the player leaves while waiting, remove the player from the lobby and raise PlayerLeft
+        """
+
+        entry = (session, asyncio.get_running_loop().create_future(), asyncio.ensure_future(session.wait_for_leave()))
+        _, match, watch = entry
+        self.lobby.append(entry)
+        try:
+            session.send("Waiting for other player...\n")
+            await session.flush()
+            await asyncio.wait([match, watch], return_when=asyncio.FIRST_COMPLETED)
+            if watch.done() and not watch.cancelled():
+                watch.result()      # PlayerLeft, nobody took the player
+            await match     # the other player's handler plays the match, PlayerLeft if this one left
+        finally:
+            if entry in self.lobby:
+                self.lobby.remove(entry)
+            watch.cancel()
+
+    async def match(self, first, second):
+        """Game of two humans, both fill boards at once, then they shoot in turn"""
+
+        first.send("Other player is here!\n")
+        fills = [asyncio.ensure_future(player.fill_board(self.board_class)) for player in (first, second)]
+        try:
+            await asyncio.gather(*fills)
+        finally:
+            for fill in fills:
+                fill.cancel()
+            await asyncio.gather(*fills, return_exceptions=True)    # the other player's reading is stopped
+
+        players = [first, second]
+        turn = self.rng.randrange(2)
+        players[1 - turn].send("Your opponent goes first\n")
+        await players[1 - turn].flush()
+        while True:
+            shooter, target = players[turn], players[1 - turn]
+            if await self.human_move(shooter, target):
+                shooter.send("You win!\n")
+                target.send("You loose\n")
+                return
+            target.send("Your turn now\n")
+            turn = 1 - turn
+
+    async def serve(self, host="localhost", port=8023):
+        """Accept players forever"""
+
+        server = await asyncio.start_server(self.handle, host, port, backlog=4096)
+        async with server:
+            await server.serve_forever()
+
+
+def raise_open_files_limit():
+    """Every player is an open socket, let the process have as many as the system allows"""
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def main():
+    """Run the server"""
+
+    parser = argparse.ArgumentParser(description="Server of the Battleship for telnet players")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8023)
+    parser.add_argument("--pace", type=float, default=1.0, help="pause before computer's shot, seconds")
+    parser.add_argument("--size", type=int, default=DEFAULT_RULES.size)
+    parser.add_argument("--fleet", type=int, nargs="+", default=list(DEFAULT_RULES.fleet))
+    args = parser.parse_args()
+
+    raise_open_files_limit()
+    rules = Rules(args.size, args.fleet)
+    try:
+        PlacementIndex.get(rules.size, rules.fleet).random_fleet()     # make the table of fleets before players come
+    except FleetDoesNotFit as error:
+        parser.error(str(error))
+    server = GameServer(rules, pace=args.pace)
+    print(f"Battleship server on {args.host}:{args.port}")
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,296 @@
+"""Headless games computer against computer: no printing, no sleeping, no input.
+Classes: HeadlessPlayerComputer(PlayerComputer)
+         SimulationStats
+Functions: check_strategies
+           play_game
+           play_out
+           run_games
+           run_chunk
+           run_tournament
+
+Every game gets its own seed from the seed of the run, so the run is repeatable.
+The tournament splits games into chunks with seeds derived from the master seed,
+so the result doesn't depend on the amount of worker processes.
+
+With --record every game is appended to the file of records (see records.py),
+with --metrics counters and times of engine phases are written to the file (see metrics.py).
+
+Usage: python simulation.py heatmap random --games 10000 --workers 4 --seed 1 --record games.bsr
+"""
+
+import argparse
+import os
+import random
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor, wait
+from functools import partial
+
+from battleship import DEFAULT_RULES, BitBoard, Board, Game, PlayerComputer, Rules, ShotResult
+from mcts import PlayerComputerMCTS
+from metrics import METRICS, write_metrics
+from placement import TABLE_MAX_DOTS, FleetDoesNotFit, PlacementIndex
+from records import GameRecord, RecordWriter, fleet_mask
+from solver import FleetTable, PlayerComputerSolver
+from strategies import PlayerComputerHeatmap
+from transport import NullTransport
+
+
+class HeadlessPlayerComputer(PlayerComputer):
+    """Computer player which shoots like PlayerComputer but doesn't print anything"""
+
+    def __init__(self, board_class=Board, rng=random, rules=DEFAULT_RULES, transport=None):
+        """PlayerComputer with NullTransport if other transport isn't given"""
+
+        super().__init__(board_class, rng, rules, transport or NullTransport())
+
+
+class SimulationStats:
+    """Aggregated results of many games: wins of the first strategy and shots to win"""
+
+    def __init__(self):
+        """Empty stats"""
+
+        self.games = 0
+        self.wins = 0               # games won by the first strategy
+        self.shots = Counter()      # shots to win -> amount of games
+        self.seconds = 0.0
+
+    def add_game(self, winner: int, shots: int):
+        """Add result of one game, winner is 0 for the first strategy and 1 for the second"""
+
+        self.games += 1
+        if winner == 0:
+            self.wins += 1
+        self.shots[shots] += 1
+
+    def merge(self, other):
+        """Add results of other stats to these"""
+
+        self.games += other.games
+        self.wins += other.wins
+        self.shots.update(other.shots)
+        self.seconds += other.seconds
+
+    @property
+    def win_rate(self):
+        """Part of games won by the first strategy"""
+
+        return self.wins / self.games if self.games else 0.0
+
+    @property
+    def mean_shots(self):
+        """Mean amount of shots to win"""
+
+        return sum(shots * amount for shots, amount in self.shots.items()) / self.games if self.games else 0.0
+
+    @property
+    def games_per_second(self):
+        """Speed of simulation"""
+
+        return self.games / self.seconds if self.seconds else 0.0
+
+    def shots_percentile(self, part: float):
+        """Amount of shots to win which wasn't exceeded in given part of games"""
+
+        limit = part * self.games
+        passed = 0
+        for shots in sorted(self.shots):
+            passed += self.shots[shots]
+            if passed >= limit:
+                return shots
+        return 0
+
+    def __str__(self):
+        """Short report"""
+
+        return (f"games: {self.games}, first strategy wins: {self.win_rate:.2%}\n"
+                f"shots to win: mean {self.mean_shots:.2f}, min {min(self.shots, default=0)}, "
+                f"median {self.shots_percentile(0.5)}, p90 {self.shots_percentile(0.9)}, "
+                f"max {max(self.shots, default=0)}\n"
+                f"speed: {self.games_per_second:.0f} games per second")
+
+
+def check_strategies(strategies, rules=DEFAULT_RULES):
+    """Raise ValueError if some of the strategies can't play by the rules"""
+
+    if PlayerComputerSolver in strategies and not FleetTable.fits(PlacementIndex.get(rules.size, rules.fleet)):
+        raise ValueError(f"solver plays only on boards up to {TABLE_MAX_DOTS} dots, "
+                         f"the board {rules.size}x{rules.size} is bigger")
+
+
+def play_game(strategy_1, strategy_2, board_class=BitBoard, rng=random, rules=DEFAULT_RULES, record=None):
+    """
+    Play one game of two computer strategies,
+    return the index of the winner (0 or 1) and the amount of the winner's shots.
+    If record (GameRecord) is given, fleets, shots and the result are written in it
+    """
+
+    players = [strategy_1(board_class, rng, rules, NullTransport()),
+               strategy_2(board_class, rng, rules, NullTransport())]
+    turn = rng.randrange(2)
+    if record is not None:
+        record.first = turn
+        record.fleets = (fleet_mask(players[0].board), fleet_mask(players[1].board))
+    return play_out(players, turn, rules, record)
+
+
+def play_out(players, turn: int, rules=DEFAULT_RULES, record=None):
+    """
+    Play the game of two computer players from the move of the player turn (0 or 1) to the end,
+    return the index of the winner and the amount of the winner's shots; shots are added to record if it's given
+    """
+
+    while True:
+        shooter, target = players[turn], players[1 - turn]
+        result = shooter.comp_fire(target.board)[0]
+        if record is not None:
+            record.add_shot(target.board.last_shot, rules.size, result)
+        if result is ShotResult.miss:
+            turn = 1 - turn
+        elif not Game.lives_amount(target):   # hit, so shoot again if there are ships
+            if record is not None:
+                record.winner = turn
+            return turn, target.board.shots_amount()
+
+
+def run_games(strategy_1, strategy_2, games: int, board_class=BitBoard, seed=None, rules=DEFAULT_RULES,
+              records=None):
+    """
+    Play given amount of games, return SimulationStats.
+    If records (RecordWriter or list) is given, GameRecord of every game is appended to it
+    """
+
+    rng = random.Random(seed)
+    stats = SimulationStats()
+    start = time.perf_counter()
+    for _ in range(games):
+        game_seed = rng.getrandbits(64)
+        record = GameRecord(game_seed) if records is not None else None
+        stats.add_game(*play_game(strategy_1, strategy_2, board_class, random.Random(game_seed), rules, record))
+        if record is not None:
+            records.append(record)
+    stats.seconds = time.perf_counter() - start
+    return stats
+
+
+def run_chunk(strategy_1, strategy_2, games: int, board_class=BitBoard, seed=None, rules=DEFAULT_RULES,
+              record=False, measure=False):
+    """
+    run_games for the worker process: return SimulationStats, encoded records of the games if record,
+    and the snapshot of metrics of these games if measure, else None
+    """
+
+    records = [] if record else None
+    if measure:
+        METRICS.reset()
+        METRICS.enable()
+    stats = run_games(strategy_1, strategy_2, games, board_class, seed, rules, records)
+    snapshot = None
+    if measure:
+        METRICS.disable()
+        snapshot = METRICS.snapshot()
+    return stats, [item.encode(rules) for item in records] if record else None, snapshot
+
+
+def run_tournament(strategy_1, strategy_2, games: int, workers=None, seed=0,
+                   chunk_size=1000, board_class=BitBoard, rules=DEFAULT_RULES, writer=None):
+    """
+    Play given amount of games in worker processes, return SimulationStats.
+    Games are sent to workers in chunks, every chunk gets the next seed of the master seed;
+    only a few chunks are waited at once. Done chunks are merged in the order they were sent,
+    a chunk which is done before the earlier ones waits for them.
+    If writer (RecordWriter) is given, workers encode records of games and the writer appends them,
+    so records are in the order of games whatever the amount of workers.
+    If METRICS are enabled, workers measure their games and metrics are added to METRICS.
+    With one worker chunks are played in this process, with the same seeds
+    """
+
+    workers = workers or os.cpu_count()
+    master_rng = random.Random(seed)
+    stats = SimulationStats()
+    start = time.perf_counter()
+
+    def merge(result):
+        chunk_stats, records, snapshot = result
+        stats.merge(chunk_stats)
+        for data in records or ():
+            writer.append_encoded(data)
+        if snapshot is not None:
+            METRICS.merge(snapshot)
+
+    if workers == 1:
+        for first_game in range(0, games, chunk_size):
+            stats.merge(run_games(strategy_1, strategy_2, min(chunk_size, games - first_game), board_class,
+                                  master_rng.getrandbits(64), rules, writer))
+        stats.seconds = time.perf_counter() - start
+        return stats
+
+    with ProcessPoolExecutor(workers) as executor:
+        pending = deque()   # futures of chunks in the order they were sent
+        for first_game in range(0, games, chunk_size):
+            chunk_games = min(chunk_size, games - first_game)
+            pending.append(executor.submit(run_chunk, strategy_1, strategy_2, chunk_games,
+                                           board_class, master_rng.getrandbits(64), rules,
+                                           writer is not None, METRICS.enabled))
+            if len(pending) >= 2 * workers:
+                wait([pending[0]])
+                while pending and pending[0].done():
+                    merge(pending.popleft().result())
+        for future in pending:
+            merge(future.result())
+
+    stats.seconds = time.perf_counter() - start
+    return stats
+
+
+STRATEGIES = {"random": HeadlessPlayerComputer,
+              "heatmap": PlayerComputerHeatmap,
+              "solver": PlayerComputerSolver,
+              # iterations instead of the budget of time and own search, so games with the same seed are the same
+              "mcts": partial(PlayerComputerMCTS, iterations=100, shared=False)}
+
+
+def main():
+    """Run games from command line and print the report"""
+
+    parser = argparse.ArgumentParser(description="Play computer against computer without output")
+    parser.add_argument("first", nargs="?", choices=sorted(STRATEGIES), default="random")
+    parser.add_argument("second", nargs="?", choices=sorted(STRATEGIES), default="random")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--board", choices=["board", "bitboard"], default="bitboard")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=1, help="0 for all cores")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--size", type=int, default=DEFAULT_RULES.size)
+    parser.add_argument("--fleet", type=int, nargs="+", default=DEFAULT_RULES.fleet, help="lengths of ships")
+    parser.add_argument("--record", default=None, help="append records of games to this file")
+    parser.add_argument("--metrics", default=None, help="write metrics of the engine to this file (.json or .prom)")
+    args = parser.parse_args()
+
+    board_class = BitBoard if args.board == "bitboard" else Board
+    rules = Rules(args.size, args.fleet)
+    first, second = STRATEGIES[args.first], STRATEGIES[args.second]
+    try:
+        PlacementIndex.get(rules.size, rules.fleet).random_fleet()     # the fleet fits before games start
+        check_strategies((first, second), rules)
+    except (FleetDoesNotFit, ValueError) as error:
+        parser.error(str(error))
+    writer = RecordWriter(args.record, rules) if args.record else None
+    if args.metrics:
+        METRICS.enable()
+    try:
+        stats = run_tournament(first, second, args.games, args.workers or None, args.seed, args.chunk_size,
+                               board_class, rules, writer)
+    finally:
+        if writer is not None:
+            writer.close()
+    print(stats)
+    if args.metrics:
+        METRICS.disable()
+        write_metrics(args.metrics)
+        print(METRICS.report())
+
+
+if __name__ == '__main__':
+    main()
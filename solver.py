@@ -0,0 +1,292 @@
+"""Computer strategy which knows every legal fleet and shoots where a ship is most probable.
+Needs numpy.
+Classes: FleetTable
+         PlayerComputerSolver(PlayerComputer)
+Functions: cache_dir()
+
+Every fleet is kept as a mask of its ships' dots (dot (x, y) is the bit x * size + y),
+so the table of the 6x6 board takes about 4 MB. It is written once to a .npy file with its .json description
+in the cache directory and memory-mapped on the next loads.
+
+Usage: python solver.py --games 200 [--cache-dir DIR]
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+import numpy as np
+
+from battleship import DEFAULT_RULES, BitBoard, Board, Dot, PlayerComputer, ShotResult
+from placement import TABLE_MAX_DOTS, PlacementIndex
+from transport import NullTransport
+
+TABLE_FORMAT = 1     # layout of masks in files: dot (x, y) is the bit x * size + y
+CACHE_DIR = os.environ.get("BATTLESHIP_CACHE_DIR")     # None: the user's cache directory, see cache_dir
+
+
+def cache_dir():
+    """
+    Return the directory for tables of fleets: CACHE_DIR if it's set, else battleship in $XDG_CACHE_HOME
+    (~/.cache by default), else in the temporary directory if that one can't be written
+    """
+
+    if CACHE_DIR:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        return CACHE_DIR
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    for directory in (os.path.join(base, "battleship"), os.path.join(tempfile.gettempdir(), "battleship")):
+        try:
+            os.makedirs(directory, exist_ok=True)
+        except OSError:
+            continue
+        if os.access(directory, os.W_OK):
+            return directory
+    raise OSError("No writable directory for tables of fleets, set BATTLESHIP_CACHE_DIR")
+
+
+class FleetTable:
+    """Masks of all legal fleets of the board, loaded from the file or enumerated and saved"""
+
+    _cache = {}
+
+    def __init__(self, index: PlacementIndex, path=None):
+        """Load the table, create the file if there is no one or it isn't the table of this board"""
+
+        if not FleetTable.fits(index):
+            raise ValueError(f"Fleet table supports only boards up to {TABLE_MAX_DOTS} dots")
+        self.index = index
+        self.path = path or os.path.join(
+            cache_dir(), f"fleets_{index.size}x{index.size}_{''.join(map(str, index.fleet))}.npy")
+        self.masks = self.load()
+        if self.masks is None:
+            self.save(self.enumerate_masks())
+            self.masks = np.load(self.path, mmap_mode="r")
+
+    def load(self):
+        """
+        Return masks memory-mapped from the file, None if there is no file or it doesn't match its description:
+        the file with .json instead of .npy keeps the rules, the layout of masks and the amount of fleets
+        """
+
+        try:
+            with open(self.description_path()) as file:
+                description = json.load(file)
+            masks = np.load(self.path, mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+        if description != self.description(len(masks)) or masks.dtype != np.uint64 or masks.ndim != 1:
+            return None
+        return masks
+
+    def description(self, amount: int):
+        """What the table of the index with given amount of fleets is made for"""
+
+        return {"format": TABLE_FORMAT, "dtype": "uint64", "size": self.index.size,
+                "fleet": list(self.index.fleet), "amount": amount}
+
+    def description_path(self):
+        """Path of the description of the table"""
+
+        return os.path.splitext(self.path)[0] + ".json"
+
+    @staticmethod
+    def fits(index: PlacementIndex):
+        """True if the table can be made for the board of the index: all fleets are enumerated only on small boards"""
+
+        return index.size * index.size <= TABLE_MAX_DOTS
+
+    @classmethod
+    def get(cls, index=None):
+        """Return the table for the index (the standard one by default), load it only once"""
+
+        index = index or PlacementIndex.get()
+        key = (index.size, index.fleet)
+        if key not in cls._cache:
+            cls._cache[key] = cls(index)
+        return cls._cache[key]
+
+    def enumerate_masks(self):
+        """Return array with the mask of every legal fleet"""
+
+        rows = np.frombuffer(self.index.fleets(), dtype=np.dtype(self.index.fleets().typecode))
+        rows = rows.reshape(-1, len(self.index.fleet))
+        masks = np.zeros(len(rows), dtype=np.uint64)
+        for ship, length in enumerate(self.index.fleet):
+            position_masks = np.array(self.index.masks(length), dtype=np.uint64)
+            masks |= position_masks[rows[:, ship]]
+        return masks
+
+    def save(self, masks):
+        """
+        Write the masks and then their description, every one to the temporary file put in place of the file,
+        so nobody reads half-written file; every process has its own temporary files, workers which make
+        the table at once don't mix their writes
+        """
+
+        self.replace(self.path, lambda file: np.save(file, masks))
+        description = json.dumps(self.description(len(masks))).encode()
+        self.replace(self.description_path(), lambda file: file.write(description))
+
+    @staticmethod
+    def replace(path: str, write):
+        """Call write(file) for the temporary file in the directory of the path, then put it in place of the path"""
+
+        handle, temporary = tempfile.mkstemp(dir=os.path.dirname(path), suffix=os.path.splitext(path)[1])
+        try:
+            with os.fdopen(handle, "wb") as file:
+                write(file)
+            os.replace(temporary, path)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+
+    def __len__(self):
+        """Amount of fleets"""
+
+        return len(self.masks)
+
+
+class PlayerComputerSolver(PlayerComputer):
+    """
+    Computer player which keeps all fleets consistent with its shots
+    and shoots in the dot where a ship is in most of them.
+    If too many fleets are consistent, it counts only a random sample of them
+    """
+
+    sample_size = 20000
+
+    def __init__(self, board_class=Board, rng=random, rules=DEFAULT_RULES, transport=None, *, table=None):
+        """Create the board with ships, load the table of fleets"""
+
+        super().__init__(board_class, rng, rules, transport)
+        self.table = table or FleetTable.get(PlacementIndex.get(rules.size, rules.fleet))
+        self.size = self.table.index.size
+        self.bits = np.array([1 << number for number in range(self.size * self.size)], dtype=np.uint64)
+        self.candidates = self.table.masks     # fleets consistent with known dots
+        self.hits = 0                          # mask of hit dots
+        self.empty = 0                         # mask of dots where there can't be ships
+        self.filtered = True
+        self.move_times = []                   # seconds of every move
+
+    def comp_fire(self, board: Board):
+        """Shoot in the most probable dot, return (ShotResult, ship)"""
+
+        start = time.perf_counter()
+        number = self.choose_target()
+        self.move_times.append(time.perf_counter() - start)
+
+        dot = Dot(*divmod(number, self.size))
+        result = board.fire(dot)         # SHOOT
+        self.observe(board, dot, result[0])
+        if result[0] is not ShotResult.miss:
+            self.comp_hit_the_target(board)
+        return result
+
+    def observe(self, board: Board, dot: Dot, result: ShotResult):
+        """Remember the hit or the empty dots the result of the shot shows"""
+
+        number = dot.x * self.size + dot.y
+        if result is ShotResult.miss:
+            self.empty |= 1 << number
+        elif result is not ShotResult.already:
+            self.hits |= 1 << number
+            if result is ShotResult.kill:
+                self.empty |= self.contour(number)
+            else:
+                self.empty |= self.diagonals(dot.x, dot.y)
+        self.filtered = False
+
+    def choose_target(self):
+        """Filter consistent fleets by new known dots, return number of the most probable dot"""
+
+        if not self.filtered:
+            hits, empty = np.uint64(self.hits), np.uint64(self.empty)
+            candidates = self.candidates
+            self.candidates = candidates[((candidates & empty) == 0) & ((candidates & hits) == hits)]
+            self.filtered = True
+
+        candidates = self.candidates
+        if len(candidates) > self.sample_size:
+            candidates = candidates[np.array(self.rng.sample(range(len(candidates)), self.sample_size))]
+        counts = ((candidates[:, None] & self.bits) != 0).sum(axis=0)
+        counts[[number for number in range(self.size * self.size) if (self.hits | self.empty) >> number & 1]] = -1
+        best = counts.max()
+        return self.rng.choice([int(number) for number in np.flatnonzero(counts == best)])
+
+    def contour(self, number: int):
+        """Mask of hit dots connected with given one (the killed ship) and dots around them"""
+
+        ship = [number]
+        for dot in ship:
+            x, y = divmod(dot, self.size)
+            for i, j in ((x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1)):
+                if 0 <= i < self.size and 0 <= j < self.size and self.hits >> (i * self.size + j) & 1 \
+                        and i * self.size + j not in ship:
+                    ship.append(i * self.size + j)
+        mask = 0
+        for dot in ship:
+            x, y = divmod(dot, self.size)
+            for i in range(max(x - 1, 0), min(x + 2, self.size)):
+                for j in range(max(y - 1, 0), min(y + 2, self.size)):
+                    mask |= 1 << (i * self.size + j)
+        return mask & ~self.hits
+
+    def diagonals(self, x: int, y: int):
+        """Mask of diagonal neighbours of the hit dot: ships don't touch each other"""
+
+        mask = 0
+        for i, j in ((x - 1, y - 1), (x - 1, y + 1), (x + 1, y - 1), (x + 1, y + 1)):
+            if 0 <= i < self.size and 0 <= j < self.size:
+                mask |= 1 << (i * self.size + j)
+        return mask
+
+    def latency_report(self):
+        """Mean, median, 99th percentile and max time of one move in milliseconds"""
+
+        if not self.move_times:
+            return "no moves"
+        times = sorted(self.move_times)
+        return (f"move latency: mean {1000 * sum(times) / len(times):.2f} ms, "
+                f"p50 {1000 * times[len(times) // 2]:.2f} ms, "
+                f"p99 {1000 * times[min(len(times) - 1, int(len(times) * 0.99))]:.2f} ms, "
+                f"max {1000 * times[-1]:.2f} ms")
+
+
+def main():
+    """Sink random fleets with the solver, print shots and latency of moves"""
+
+    parser = argparse.ArgumentParser(description="Sink random fleets with the solver")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--cache-dir", default=None, help="directory for the table of fleets")
+    args = parser.parse_args()
+    if args.cache_dir:
+        global CACHE_DIR
+        CACHE_DIR = args.cache_dir
+
+    start = time.perf_counter()
+    FleetTable.get()
+    print(f"fleet table ready in {time.perf_counter() - start:.2f} s")
+
+    rng = random.Random(args.seed)
+    shots = 0
+    move_times = []
+    for _ in range(args.games):
+        solver = PlayerComputerSolver(BitBoard, rng, transport=NullTransport())
+        target = PlayerComputer(BitBoard, rng)
+        while target.board.lives_left:
+            solver.comp_fire(target.board)
+        shots += target.board.shots_amount()
+        move_times.extend(solver.move_times)
+
+    solver.move_times = move_times
+    print(f"mean shots to sink the fleet: {shots / args.games:.2f}")
+    print(solver.latency_report())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,244 @@
+"""Computer strategies which can replace PlayerComputer in Game and in simulation.
+Classes: PlayerComputerHeatmap(PlayerComputer)
+
+Dot (x, y) has number x * size + y, like in placement.
+"""
+
+import random
+from math import exp, lgamma, log
+
+from battleship import DEFAULT_RULES, Board, Dot, PlayerComputer, ShotResult
+from placement import PlacementIndex
+
+
+class PlayerComputerHeatmap(PlayerComputer):
+    """
+    Computer player which shoots in the dot where the remaining ships are most probable.
+    The probability is counted on whole fleets: every move it samples fleets which can be there
+    (ships don't touch each other, every damaged ship is afloat through its hit dots, no ship is on empty dots)
+    and shoots in the unknown dot covered by the biggest weight of them.
+    A ship through every damaged ship goes first, then other ships from the longest, every one in a random
+    position where it fits; the weight of the fleet is the product of amounts of positions it was chosen from
+    (divided by the ways to place ships of the same length in other order), so every fleet weighs the same
+    as if fleets were drawn uniformly. While there is a damaged ship, it shoots only next to it.
+    Positions which don't cross empty dots and don't touch hit dots are kept for every length with the amount
+    of them covering every dot, a shot removes only positions crossing or touching its dot, so a move costs
+    the sampling of samples fleets. On boards bigger than SAMPLED_MAX_DOTS, or if no fleet is sampled,
+    the heat is the sum over lengths of remaining ships of this length * part of kept positions covering the dot
+    """
+
+    SAMPLED_MAX_DOTS = 100
+    _conflicts = {}     # (size, fleet) -> {length: [{other length: positions touching the position}]}
+
+    def __init__(self, board_class=Board, rng=random, rules=DEFAULT_RULES, transport=None, samples=100):
+        """Create the board with ships, the opponent's board is unknown"""
+
+        super().__init__(board_class, rng, rules, transport)
+        self.index = PlacementIndex.get(rules.size, rules.fleet)
+        self.size = self.index.size
+        self.samples = samples
+        self.remaining = {length: self.index.fleet.count(length) for length in self.index.positions}
+        self.unknown = set(range(self.size * self.size))   # dots without shot and without known contour
+        self.blocked = 0        # mask of dots where no ship afloat can be: misses, killed ships and their contours
+        self.damaged = []       # hit dots of the ships which aren't killed yet
+        # positions of every length which don't cross empty dots and don't touch hit dots
+        self.free = {length: set(range(len(positions))) for length, positions in self.index.positions.items()}
+        self.cover = {length: [len(covering) for covering in self.index.covering[length]] for length in self.free}
+
+    def comp_fire(self, board: Board):
+        """Shoot in the most probable dot, return (ShotResult, ship)"""
+
+        dot = Dot(*divmod(self.choose_target(), self.size))
+        result = board.fire(dot)         # SHOOT
+        self.observe(board, dot, result[0])
+        if result[0] is not ShotResult.miss:
+            self.comp_hit_the_target(board)
+        return result
+
+    def observe(self, board: Board, dot: Dot, result: ShotResult):
+        """Remember the result of the shot"""
+
+        number = dot.x * self.size + dot.y
+        if result is ShotResult.already:
+            return
+        self.unknown.discard(number)
+        if result is ShotResult.miss:
+            self.blocked |= 1 << number
+            self.exclude(number)
+            return
+        # other ships don't touch the hit dot, the contour of the killed ship touches its hit dots
+        for near in self.index.contour([number]):
+            self.exclude(near)
+        self.damaged.append(number)
+        if result is ShotResult.kill:
+            self.ship_killed(self.ship_dots(number))
+
+    def exclude(self, number: int):
+        """Remove positions crossing the dot from the kept positions"""
+
+        for length, free in self.free.items():
+            for position in self.index.covering[length][number]:
+                if position in free:
+                    free.remove(position)
+                    for dot in self.index.dots[length][position]:
+                        self.cover[length][dot] -= 1
+
+    def conflicts(self):
+        """For every position of every length, positions of every length which touch it or cross it"""
+
+        key = (self.size, self.index.fleet)
+        if key not in PlayerComputerHeatmap._conflicts:
+            covering = self.index.covering
+            PlayerComputerHeatmap._conflicts[key] = {
+                length: [{other: frozenset(position for dot in zone for position in covering[other][dot])
+                          for other in covering} for zone in self.index.contours(length)]
+                for length in covering}
+        return PlayerComputerHeatmap._conflicts[key]
+
+    def choose_target(self):
+        """Return number of the dot for the next shoot"""
+
+        heat = self.heat()
+        if not heat:
+            return self.rng.choice(sorted(self.unknown))
+        best = max(heat.values())
+        return self.rng.choice(sorted(number for number, value in heat.items() if value == best))
+
+    def heat(self):
+        """{dot for the next shot: weight of sampled fleets with a ship in it}"""
+
+        groups = []     # (dots, positions of every length through them) of every damaged ship
+        for number in self.damaged:
+            if not any(number in dots for dots, _ in groups):
+                dots = self.ship_dots(number)
+                groups.append((dots, {}))
+        damaged = PlacementIndex.mask(self.damaged)
+        for length, count in self.remaining.items():
+            if not count:
+                continue
+            masks, exclusions = self.index.masks(length), self.index.exclusions(length)
+            for dots, through in groups:
+                if length > len(dots):     # the ship isn't killed, so it's longer than its hit dots
+                    own = PlacementIndex.mask(dots)
+                    through[length] = [number for number in self.index.covering[length][dots[0]]
+                                       if masks[number] & own == own and not masks[number] & self.blocked
+                                       and not exclusions[number] & damaged & ~own]
+
+        fleets = []     # (log of the weight, positions as (length, number))
+        if self.size * self.size <= self.SAMPLED_MAX_DOTS:
+            conflicts = self.conflicts()
+            for _ in range(self.samples):
+                fleet = self.sample(groups, conflicts)
+                if fleet is not None:
+                    fleets.append(fleet)
+        if not fleets:
+            return self.counted_heat(groups)
+        top = max(weight for weight, _ in fleets)
+        heat = dict.fromkeys(self.targets(groups), 0.0)
+        for weight, positions in fleets:
+            weight = exp(weight - top)
+            for length, number in positions:
+                for dot in self.index.dots[length][number]:
+                    if dot in heat:
+                        heat[dot] += weight
+        return heat
+
+    def targets(self, groups):
+        """
+        Unknown dots for the next shot: the damaged ship is finished first (its contour shows where other ships
+        aren't), next to its hit dots, so that a new hit is joined to them
+        """
+
+        if not groups:
+            return self.unknown
+        dots, through = groups[0]
+        near = {i * self.size + j for number in dots for x, y in [divmod(number, self.size)]
+                for i, j in ((x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1))
+                if 0 <= i < self.size and 0 <= j < self.size}
+        return {dot for length, numbers in through.items() for number in numbers
+                for dot in self.index.dots[length][number] if dot in near and dot in self.unknown}
+
+    def counted_heat(self, groups):
+        """{dot for the next shot: expected amount of remaining ships in it} if positions of ships are independent"""
+
+        weights = {length: count / max(1, len(self.free[length]) + sum(len(through.get(length, ()))
+                                                                        for _, through in groups))
+                   for length, count in self.remaining.items() if count}
+        if groups:
+            heat = dict.fromkeys(self.targets(groups), 0.0)
+            for length, numbers in groups[0][1].items():
+                for number in numbers:
+                    for dot in self.index.dots[length][number]:
+                        if dot in heat:
+                            heat[dot] += weights[length]
+            return heat
+        return {number: sum(weight * self.cover[length][number] for length, weight in weights.items())
+                for number in self.unknown}
+
+    def sample(self, groups, conflicts):
+        """
+        Random fleet of remaining ships: (log of its weight, [(length, number of the position)]),
+        None if the ships placed first leave no place for some other one
+        """
+
+        remaining = dict(self.remaining)
+        valid = dict(self.free)     # sets aren't changed, valid gets new ones
+        positions = []
+        weight = 0.0
+        for _, through in groups:
+            choices = [(length, number) for length, numbers in through.items() if remaining[length]
+                       for number in numbers
+                       if not any(number in conflicts[placed][other][length] for placed, other in positions)]
+            if not choices:
+                return None
+            length, number = self.rng.choice(choices)
+            weight += log(len(choices))
+            self.place(length, number, remaining, valid, positions, conflicts)
+        for length in sorted(remaining, reverse=True):
+            weight -= lgamma(remaining[length] + 1)     # ships of one length could go in any order
+            while remaining[length]:
+                choices = valid[length]
+                if not choices:
+                    return None
+                weight += log(len(choices))
+                self.place(length, self.rng.choice(tuple(choices)), remaining, valid, positions, conflicts)
+        return weight, positions
+
+    @staticmethod
+    def place(length: int, number: int, remaining: dict, valid: dict, positions: list, conflicts: dict):
+        """Put the ship of the sampled fleet: other ships can't cross it or touch it"""
+
+        remaining[length] -= 1
+        positions.append((length, number))
+        touching = conflicts[length][number]
+        for other, count in remaining.items():
+            if count:
+                valid[other] = valid[other] - touching[other]
+
+    def ship_dots(self, number: int):
+        """
+        Return damaged dots of the ship with given damaged dot:
+        ships don't touch each other, so these are damaged dots connected with it
+        """
+
+        dots = [number]
+        for dot in dots:
+            x, y = divmod(dot, self.size)
+            for i, j in ((x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1)):
+                neighbour = i * self.size + j
+                if 0 <= i < self.size and 0 <= j < self.size and neighbour in self.damaged \
+                        and neighbour not in dots:
+                    dots.append(neighbour)
+        return dots
+
+    def ship_killed(self, dots: list):
+        """Ship with given dots is killed: there are no more ships in its dots and its contour"""
+
+        self.remaining[len(dots)] -= 1
+        self.damaged = [number for number in self.damaged if number not in dots]
+        for number in dots:
+            x, y = divmod(number, self.size)
+            for i in range(max(x - 1, 0), min(x + 2, self.size)):
+                for j in range(max(y - 1, 0), min(y + 2, self.size)):
+                    self.blocked |= 1 << (i * self.size + j)
+                    self.unknown.discard(i * self.size + j)
@@ -0,0 +1,151 @@
+"""Input and output of the game: Game and players talk to the transport, not to print() and input().
+Classes: Display(ABC)
+         Transport(Display)
+         ConsoleTransport(Transport)
+         NullTransport(Transport)
+         QueueTransport(Transport)
+
+The display shows messages, frames of boards and results and makes pauses, that's all the computer player needs;
+the transport is the display which also asks the player, Game needs it.
+The console one works like the game always did, the null one is for simulations,
+the queue one is for a host which runs the game in other thread.
+
+Usage: Game(transport=ConsoleTransport(ansi=True)).start()
+"""
+
+import queue
+import sys
+from abc import ABC, abstractmethod
+from time import sleep
+
+
+class Display(ABC):
+    """What the engine needs to show the game: the computer player shows its moves by it"""
+
+    @abstractmethod
+    def write(self, text: str):
+        """Show the message"""
+
+    @abstractmethod
+    def show(self, board):
+        """Show the board (Board or BitBoard)"""
+
+    @abstractmethod
+    def pause(self, seconds: float):
+        """Pause between moves, so the player can follow the game"""
+
+    def result(self, text: str):
+        """Show the result of the game"""
+
+        self.write(text)
+
+    def start(self, opponent_board, own_board):
+        """The game starts with these boards"""
+
+    def finish(self):
+        """The game is over"""
+
+
+class Transport(Display):
+    """What the game needs from its front end: the display which asks the player too"""
+
+    @abstractmethod
+    def ask(self, prompt: str) -> str:
+        """Show the prompt, return the answer of the player"""
+
+
+class ConsoleTransport(Transport):
+    """
+    Terminal: print(), input() and sleep(). If ansi, both boards are drawn at the top of the screen
+    when the game starts and are redrawn there in place, messages scroll below them
+    """
+
+    def __init__(self, ansi=False):
+        """Console transport, plain or with boards in place"""
+
+        self.ansi = ansi
+
+    def write(self, text: str):
+        print(text)
+
+    def show(self, board):
+        board.show_board()
+
+    def ask(self, prompt: str) -> str:
+        return input(prompt)
+
+    def pause(self, seconds: float):
+        sleep(seconds)
+
+    def start(self, opponent_board, own_board):
+        """In ANSI mode clear the screen, draw both boards at the top of it, lines below the boards scroll"""
+
+        if not self.ansi:
+            return
+        from battleship import BoardRenderer
+
+        size = own_board.rules.size
+        messages = 2 * size + 6     # first line below the boards
+        sys.stdout.write(f"\x1b[2J\x1b[1;1HMy board:\x1b[{size + 3};1HYour board:")
+        opponent_board.renderer = BoardRenderer(opponent_board, ansi=True, top=2)
+        own_board.renderer = BoardRenderer(own_board, ansi=True, top=size + 4)
+        opponent_board.show_board()
+        own_board.show_board()
+        sys.stdout.write(f"\x1b[{messages}r\x1b[{messages};1H")
+
+    def finish(self):
+        """In ANSI mode the whole screen scrolls again"""
+
+        if self.ansi:
+            sys.stdout.write("\x1b[r")
+
+
+class NullTransport(Transport):
+    """Nobody watches: nothing is shown, no pauses. Nobody answers either, ask raises EOFError"""
+
+    def write(self, text: str):
+        pass
+
+    def show(self, board):
+        pass
+
+    def ask(self, prompt: str) -> str:
+        raise EOFError("Nobody answers")
+
+    def pause(self, seconds: float):
+        pass
+
+
+class QueueTransport(Transport):
+    """
+    The game runs in other thread than its host. Everything the game shows is put in outbox
+    as (kind, text), kind is "text", "board", "prompt" or "result"; answers are taken from inbox,
+    None there means the player left. Pauses are made only if pauses is True
+    """
+
+    def __init__(self, inbox=None, outbox=None, pauses=False):
+        """Transport on given queues or on new ones"""
+
+        self.inbox = inbox if inbox is not None else queue.Queue()
+        self.outbox = outbox if outbox is not None else queue.Queue()
+        self.pauses = pauses
+
+    def write(self, text: str):
+        self.outbox.put(("text", text))
+
+    def show(self, board):
+        self.outbox.put(("board", board.text()))
+
+    def ask(self, prompt: str) -> str:
+        self.outbox.put(("prompt", prompt))
+        answer = self.inbox.get()
+        if answer is None:
+            raise EOFError("The player left")
+        return answer
+
+    def pause(self, seconds: float):
+        if self.pauses:
+            sleep(seconds)
+
+    def result(self, text: str):
+        self.outbox.put(("result", text))